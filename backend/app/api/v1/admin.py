@@ -2,12 +2,15 @@ from typing import Optional
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 
+from app.core.cache import cache_stats
 from app.core.database import get_supabase
 from app.core.deps import get_current_user, get_optional_user, require_role
 from app.models.admin import (
     BanUserRequest,
+    EmbeddingBackfillPublic,
     FeedbackCreate,
     FeedbackPublic,
+    JobPublic,
     ReportCreate,
     ReportPublic,
     ResolveReportRequest,
@@ -21,7 +24,14 @@ from app.models.economy import (
     DepositConfirmRequest,
 )
 from app.models.novel import TagCreate, TagPublic
-from app.services import admin_service, economy_service, vip_service
+from app.services import (
+    admin_service,
+    economy_service,
+    embedding_service,
+    novel_service,
+    vip_service,
+)
+from app.workers import job_queue
 
 router = APIRouter(tags=["admin"])
 
@@ -41,6 +51,7 @@ async def list_tags(_=Depends(require_role("admin"))):
 @router.post("/admin/tags", response_model=TagPublic, status_code=status.HTTP_201_CREATED)
 async def create_tag(data: TagCreate, _=Depends(require_role("admin"))):
     result = get_supabase().table("tags").insert(data.model_dump()).execute()
+    novel_service.invalidate_tags()
     return result.data[0]
 
 
@@ -49,12 +60,72 @@ async def update_tag(tag_id: str, data: TagCreate, _=Depends(require_role("admin
     result = get_supabase().table("tags").update(data.model_dump()).eq("id", tag_id).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="Tag not found")
+    novel_service.invalidate_tags()
     return result.data[0]
 
 
 @router.delete("/admin/tags/{tag_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_tag(tag_id: str, _=Depends(require_role("admin"))):
     get_supabase().table("tags").delete().eq("id", tag_id).execute()
+    novel_service.invalidate_tags()
+
+
+# -- Cache ---------------------------------------------------------------
+
+@router.get("/admin/cache/stats")
+async def get_cache_stats(_=Depends(require_role("admin"))):
+    return cache_stats()
+
+
+# -- Jobs ----------------------------------------------------------------
+
+@router.get("/admin/jobs", response_model=list[JobPublic])
+async def list_jobs(
+    status: Optional[str] = Query(None, pattern="^(queued|running|succeeded|failed)$"),
+    job_type: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    _=Depends(require_role("admin")),
+):
+    return await job_queue.list_jobs(status=status, job_type=job_type, limit=limit)
+
+
+@router.get("/admin/jobs/{job_id}", response_model=JobPublic)
+async def get_job(job_id: str, _=Depends(require_role("admin"))):
+    job = await job_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+# -- Embedding backfill --------------------------------------------------
+
+@router.post(
+    "/admin/novels/{novel_id}/embeddings/backfill",
+    response_model=EmbeddingBackfillPublic,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def start_embedding_backfill(
+    novel_id: str,
+    restart: bool = False,
+    _=Depends(require_role("admin")),
+):
+    """Queue a novel-wide embedding backfill. A failed one resumes unless restart=true."""
+    current = embedding_service.get_backfill(novel_id)
+    if current and current["status"] == "running":
+        raise HTTPException(status_code=409, detail="Backfill already running")
+    progress = embedding_service.reset_backfill(novel_id, restart=restart)
+    await job_queue.enqueue(
+        "backfill_embeddings", {"novel_id": novel_id}, idempotency_key=f"backfill_embeddings:{novel_id}"
+    )
+    return progress
+
+
+@router.get("/admin/novels/{novel_id}/embeddings/backfill", response_model=EmbeddingBackfillPublic)
+async def get_embedding_backfill(novel_id: str, _=Depends(require_role("admin"))):
+    progress = embedding_service.get_backfill(novel_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="No backfill for this novel")
+    return progress
 
 
 # -- Crawl ---------------------------------------------------------------
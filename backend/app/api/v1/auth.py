@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.core.deps import get_current_user
 from app.models.user import UserMe
+from app.services import user_service
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -9,4 +10,8 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 @router.get("/me", response_model=UserMe)
 async def get_me(current_user: dict = Depends(get_current_user)):
     """Return the authenticated user's full profile."""
-    return current_user
+    # Read fresh: the principal cache only holds the authorization columns.
+    user = user_service.get_me(current_user["id"])
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Path
 from fastapi import status as http_status
 
 from app.core.deps import get_current_user, get_optional_user, require_role
@@ -8,15 +8,17 @@ from app.models.chapter import (
     ChapterListItem,
     ChapterUpdate,
     ReadingProgress,
+    ReadingProgressDetail,
 )
-from app.services import chapter_service, character_service, embedding_service
+from app.services import chapter_service
+from app.workers import job_queue
 
 router = APIRouter(tags=["chapters"])
 
 
 @router.get("/novels/{novel_id}/chapters", response_model=list[ChapterListItem])
 async def list_chapters(novel_id: str):
-    return chapter_service.get_chapters_for_novel(novel_id)
+    return await chapter_service.get_chapters_for_novel(novel_id)
 
 
 @router.post(
@@ -27,22 +29,11 @@ async def list_chapters(novel_id: str):
 async def create_chapter(
     novel_id: str,
     data: ChapterCreate,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(require_role("uploader", "admin")),
 ):
-    chapter = chapter_service.create_chapter(novel_id, data, current_user["id"])
+    chapter = await chapter_service.create_chapter(novel_id, data, current_user["id"])
     if data.status == "published":
-        background_tasks.add_task(
-            embedding_service.embed_chapter,
-            chapter_id=chapter["id"],
-            novel_id=novel_id,
-        )
-        background_tasks.add_task(
-            character_service.extract_characters,
-            chapter_id=chapter["id"],
-            novel_id=novel_id,
-            chapter_number=chapter["chapter_number"],
-        )
+        await job_queue.enqueue_chapter_pipeline(chapter["id"], novel_id, chapter["chapter_number"])
     return chapter
 
 
@@ -52,7 +43,7 @@ async def get_chapter(
     chapter_number: int,
     current_user: dict | None = Depends(get_optional_user),
 ):
-    return chapter_service.get_chapter_with_nav(novel_id, chapter_number, current_user)
+    return await chapter_service.get_chapter_with_nav(novel_id, chapter_number, current_user)
 
 
 @router.patch("/novels/{novel_id}/chapters/{chapter_number}", response_model=ChapterListItem)
@@ -60,25 +51,21 @@ async def update_chapter(
     novel_id: str,
     chapter_number: int,
     data: ChapterUpdate,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
 ):
-    chapter = chapter_service.get_chapter(novel_id, chapter_number)
+    chapter = await chapter_service.get_chapter(novel_id, chapter_number)
     if not chapter:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Chapter not found")
-    updated = chapter_service.update_chapter(novel_id, chapter_number, data, current_user["id"])
-    # Only trigger on status transition to published (avoids re-embedding on minor edits)
+    updated = await chapter_service.update_chapter(novel_id, chapter_number, data, current_user["id"])
+    # The full pipeline runs on the transition to published; a content edit to a
+    # chapter that is already live only needs its changed chunks re-embedded.
     if data.status == "published" and chapter.get("status") != "published":
-        background_tasks.add_task(
-            embedding_service.embed_chapter,
-            chapter_id=updated["id"],
-            novel_id=novel_id,
-        )
-        background_tasks.add_task(
-            character_service.extract_characters,
-            chapter_id=updated["id"],
-            novel_id=novel_id,
-            chapter_number=updated["chapter_number"],
+        await job_queue.enqueue_chapter_pipeline(updated["id"], novel_id, updated["chapter_number"])
+    elif updated.get("status") == "published" and updated.get("content") != chapter.get("content"):
+        await job_queue.enqueue(
+            "embed_chapter",
+            {"chapter_id": updated["id"], "novel_id": novel_id},
+            idempotency_key=f"embed_chapter:{updated['id']}",
         )
     return updated
 
@@ -89,21 +76,29 @@ async def delete_chapter(
     chapter_number: int,
     current_user: dict = Depends(get_current_user),
 ):
-    chapter = chapter_service.get_chapter(novel_id, chapter_number)
+    chapter = await chapter_service.get_chapter(novel_id, chapter_number)
     if not chapter:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Chapter not found")
-    chapter_service.soft_delete_chapter(novel_id, chapter_number, current_user["id"])
+    await chapter_service.soft_delete_chapter(novel_id, chapter_number, current_user["id"])
 
 
 @router.post("/novels/{novel_id}/chapters/{chapter_number}/read", response_model=ReadingProgress)
 async def mark_read(
     novel_id: str,
-    chapter_number: int,
+    chapter_number: int = Path(ge=0),
+    current_user: dict = Depends(get_current_user),
+):
+    return await chapter_service.mark_chapter_read(novel_id, chapter_number, current_user["id"])
+
+
+@router.get("/novels/{novel_id}/progress", response_model=ReadingProgressDetail)
+async def get_progress(
+    novel_id: str,
     current_user: dict = Depends(get_current_user),
 ):
-    return chapter_service.mark_chapter_read(novel_id, chapter_number, current_user["id"])
+    return await chapter_service.get_reading_progress(novel_id, current_user["id"])
 
 
 @router.get("/users/me/library", response_model=list[dict])
 async def get_library(current_user: dict = Depends(get_current_user)):
-    return chapter_service.get_user_library(current_user["id"])
+    return await chapter_service.get_user_library(current_user["id"])
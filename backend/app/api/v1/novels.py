@@ -11,34 +11,41 @@ router = APIRouter(prefix="/novels", tags=["novels"])
 
 @router.get("", response_model=NovelListResponse)
 async def list_novels(
-    q: str | None = Query(None),
-    tag: str | None = Query(None, description="Tag slug"),
+    q: str | None = Query(None, description="Full-text search over title, author and original title"),
+    tag: list[str] = Query([], description="Tag slug; repeat for multi-tag filtering"),
+    tag_mode: str = Query("all", pattern="^(all|any)$", description="all = every tag (AND), any = OR"),
     status: str | None = Query(None),
-    sort: str = Query("updated_at", pattern="^(updated_at|total_views|avg_rating)$"),
+    sort: str | None = Query(
+        None,
+        pattern="^(relevance|updated_at|total_views|avg_rating)$",
+        description="Defaults to relevance when searching, updated_at otherwise",
+    ),
     cursor: str | None = Query(None),
     limit: int = Query(20, ge=1, le=100),
 ):
-    return novel_service.get_novels(q=q, tag_slug=tag, status=status, sort=sort, cursor=cursor, limit=limit)
+    return await novel_service.get_novels(
+        q=q, tag_slugs=tag, tag_mode=tag_mode, status=status, sort=sort, cursor=cursor, limit=limit
+    )
 
 
 @router.get("/featured", response_model=list[NovelListItem])
 async def get_featured():
-    return novel_service.get_featured_novels()
+    return await novel_service.get_featured_novels()
 
 
 @router.get("/recently-updated", response_model=list[NovelListItem])
 async def get_recently_updated(limit: int = Query(12, ge=1, le=50)):
-    return novel_service.get_recently_updated(limit=limit)
+    return await novel_service.get_recently_updated(limit=limit)
 
 
 @router.get("/recently-completed", response_model=list[NovelListItem])
 async def get_recently_completed(limit: int = Query(12, ge=1, le=50)):
-    return novel_service.get_recently_completed(limit=limit)
+    return await novel_service.get_recently_completed(limit=limit)
 
 
 @router.get("/tags", response_model=list[dict])
 async def get_tags():
-    return novel_service.get_all_tags()
+    return await novel_service.get_all_tags()
 
 
 @router.get("/leaderboard", response_model=LeaderboardResponse)
@@ -47,7 +54,7 @@ async def get_leaderboard(
     limit: int = Query(20, ge=1, le=50),
 ):
     """Get top-nominated novels for the given period (daily/weekly/monthly)."""
-    return nomination_service.get_leaderboard(period, limit)
+    return await nomination_service.get_leaderboard(period, limit)
 
 
 @router.post("", response_model=NovelPublic, status_code=status.HTTP_201_CREATED)
@@ -55,12 +62,12 @@ async def create_novel(
     data: NovelCreate,
     current_user: dict = Depends(require_role("uploader", "admin")),
 ):
-    return novel_service.create_novel(data, current_user["id"])
+    return await novel_service.create_novel(data, current_user["id"])
 
 
 @router.get("/{novel_id}", response_model=NovelPublic)
 async def get_novel(novel_id: str):
-    novel = novel_service.get_novel_by_id(novel_id)
+    novel = await novel_service.get_novel_by_id(novel_id)
     if not novel:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Novel not found")
     return novel
@@ -72,12 +79,12 @@ async def update_novel(
     data: NovelUpdate,
     current_user: dict = Depends(get_current_user),
 ):
-    novel = novel_service.get_novel_by_id(novel_id)
+    novel = await novel_service.get_novel_by_id(novel_id)
     if not novel:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Novel not found")
     if novel["uploader_id"] != current_user["id"] and current_user["role"] != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not the owner")
-    return novel_service.update_novel(novel_id, data)
+    return await novel_service.update_novel(novel_id, data)
 
 
 @router.delete("/{novel_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -85,12 +92,12 @@ async def delete_novel(
     novel_id: str,
     current_user: dict = Depends(get_current_user),
 ):
-    novel = novel_service.get_novel_by_id(novel_id)
+    novel = await novel_service.get_novel_by_id(novel_id)
     if not novel:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Novel not found")
     if novel["uploader_id"] != current_user["id"] and current_user["role"] != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not the owner")
-    novel_service.soft_delete_novel(novel_id)
+    await novel_service.soft_delete_novel(novel_id)
 
 
 @router.get("/{novel_id}/bookmark", response_model=BookmarkStatus)
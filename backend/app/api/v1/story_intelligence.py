@@ -1,9 +1,7 @@
 """Story Intelligence API — Relationship Graph, Timeline, Q&A, Arc Summaries (M19)."""
 import logging
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
-
-logger = logging.getLogger(__name__)
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import Response, StreamingResponse
 
 from app.core.deps import get_current_user
@@ -14,6 +12,9 @@ from app.models.story_intelligence import (
     TimelineResponse,
 )
 from app.services import story_intelligence_service as svc
+from app.workers import job_queue
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ai", tags=["story-intelligence"])
 
@@ -32,14 +33,15 @@ def _require_vip_max(current_user: dict = Depends(get_current_user)) -> dict:
 @router.get("/novels/{novel_id}/relationships", response_model=RelationshipGraphResponse)
 async def get_relationships(
     novel_id: str,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(_require_vip_max),
 ) -> RelationshipGraphResponse | Response:
     """Return character relationship graph. Triggers background compute on first call."""
     data = svc.get_relationships(novel_id)
     if data.get("status") == "not_started":
         svc.set_relationships_pending(novel_id)
-        background_tasks.add_task(svc.compute_relationships_task, novel_id)
+        await job_queue.enqueue(
+            "compute_relationships", {"novel_id": novel_id}, idempotency_key=f"compute_relationships:{novel_id}"
+        )
         return Response(
             content=RelationshipGraphResponse(status="pending").model_dump_json(),
             status_code=202,
@@ -55,14 +57,15 @@ async def get_relationships(
 @router.get("/novels/{novel_id}/timeline", response_model=TimelineResponse)
 async def get_timeline(
     novel_id: str,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(_require_vip_max),
 ) -> TimelineResponse | Response:
     """Return story timeline events. Triggers background compute on first call."""
     data = svc.get_timeline(novel_id)
     if data.get("status") == "not_started":
         svc.set_timeline_pending(novel_id)
-        background_tasks.add_task(svc.compute_timeline_task, novel_id)
+        await job_queue.enqueue(
+            "compute_timeline", {"novel_id": novel_id}, idempotency_key=f"compute_timeline:{novel_id}"
+        )
         return Response(
             content=TimelineResponse(status="pending").model_dump_json(),
             status_code=202,
@@ -96,6 +99,14 @@ async def ask_question(
 # Arc summaries
 # ---------------------------------------------------------------------------
 
+def _check_arc_range(start_chapter: int, end_chapter: int) -> None:
+    if start_chapter > end_chapter:
+        raise HTTPException(
+            status_code=422,
+            detail="start_chapter must be less than or equal to end_chapter",
+        )
+
+
 @router.get("/novels/{novel_id}/arc-summary", response_model=ArcSummaryResponse)
 async def get_arc_summary(
     novel_id: str,
@@ -104,16 +115,31 @@ async def get_arc_summary(
     current_user: dict = Depends(_require_vip_max),
 ) -> ArcSummaryResponse:
     """Return AI-generated summary for a chapter range (cached in Supabase Storage)."""
-    if start_chapter > end_chapter:
-        raise HTTPException(
-            status_code=422,
-            detail="start_chapter must be less than or equal to end_chapter",
-        )
+    _check_arc_range(start_chapter, end_chapter)
     try:
-        result = svc.get_arc_summary(novel_id, start_chapter, end_chapter)
+        result = await svc.get_arc_summary(novel_id, start_chapter, end_chapter)
     except ValueError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
     except Exception as exc:
         logger.exception("get_arc_summary failed for novel %s: %s", novel_id, exc)
         raise HTTPException(status_code=500, detail="Lỗi tạo tóm tắt. Vui lòng thử lại.") from exc
     return ArcSummaryResponse(**result)
+
+
+@router.get("/novels/{novel_id}/arc-summary/stream")
+async def stream_arc_summary(
+    novel_id: str,
+    start_chapter: int = Query(..., ge=1),
+    end_chapter: int = Query(..., ge=1),
+    current_user: dict = Depends(_require_vip_max),
+) -> StreamingResponse:
+    """Stream an arc summary as SSE; concurrent requests for a range share one generation."""
+    _check_arc_range(start_chapter, end_chapter)
+    return StreamingResponse(
+        svc.stream_arc_summary(novel_id, start_chapter, end_chapter),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -1,10 +1,11 @@
 """AI Narrator TTS API endpoints (M18)."""
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import Response
 
 from app.core.deps import get_current_user
 from app.models.tts import ChapterNarrationPublic
 from app.services import tts_service
+from app.workers import job_queue
 
 router = APIRouter(prefix="/tts", tags=["tts"])
 
@@ -36,7 +37,6 @@ async def get_narration(
 @router.post("/chapters/{chapter_id}")
 async def request_narration(
     chapter_id: str,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(_require_vip_max),
 ) -> Response:
     """Request ElevenLabs narration for a chapter. VIP Max only.
@@ -51,7 +51,9 @@ async def request_narration(
         raise HTTPException(status_code=404, detail="Chapter not found")
 
     if is_new:
-        background_tasks.add_task(tts_service.generate_narration, chapter_id)
+        await job_queue.enqueue(
+            "generate_narration", {"chapter_id": chapter_id}, idempotency_key=f"generate_narration:{chapter_id}"
+        )
 
     return Response(
         content=ChapterNarrationPublic(**row).model_dump_json(),
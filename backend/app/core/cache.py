@@ -0,0 +1,197 @@
+"""In-process TTL + LRU caches for hot, rarely-changing reads.
+
+Each cache is named and registered so hit/miss counters can be inspected at
+/admin/cache/stats. Values are shared between callers and must be treated as
+read-only. get_or_load() is single-flight: concurrent misses for the same key
+await one loader call instead of all hitting the database.
+
+Caches created with shared=True add a Redis tier behind the in-process one and
+propagate invalidations to the other replicas (see app/core/shared_cache.py).
+Keys are normalised to strings so they mean the same thing on every replica.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from app.core import shared_cache
+
+_MISSING = shared_cache.MISSING
+
+
+def cache_key(key: Hashable) -> str:
+    """("recently_updated", 12) -> "recently_updated:12"."""
+    if isinstance(key, tuple):
+        return ":".join(str(part) for part in key)
+    return str(key)
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float, shared: bool = False) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()  # key -> (expires_at, value)
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._generation = 0   # bumped on invalidation so in-flight loads don't store stale values
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(cache_key(key))
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        key = cache_key(key)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    async def get_shared(self, key: Hashable, default: Any = None) -> Any:
+        """get() that falls back to the Redis tier of a shared cache, without a loader."""
+        key = cache_key(key)
+        value = self._lookup(key)
+        if value is _MISSING and self.shared and shared_cache.enabled():
+            generation = self._generation
+            value = await shared_cache.l2_get(self.name, key)
+            if value is _MISSING:
+                self.l2_misses += 1
+            else:
+                self.l2_hits += 1
+                if generation == self._generation:
+                    self.set(key, value)
+        return default if value is _MISSING else value
+
+    async def set_shared(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """set() that also writes the Redis tier of a shared cache."""
+        self.set(key, value, ttl)
+        if self.shared and shared_cache.enabled():
+            await shared_cache.l2_set(self.name, cache_key(key), value, self.ttl if ttl is None else ttl)
+
+    def invalidate(self, key: Hashable, propagate: bool = True) -> None:
+        key = cache_key(key)
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+        if self.shared and propagate:
+            shared_cache.publish(self.name, key)
+
+    def clear(self, propagate: bool = True) -> None:
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+        if self.shared and propagate:
+            shared_cache.publish(self.name, None)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float | None = None,
+    ) -> Any:
+        key = cache_key(key)
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        loop = asyncio.get_running_loop()
+        pending = self._inflight.get(key)
+        if pending is not None and pending.get_loop() is loop:
+            return await asyncio.shield(pending)
+
+        future: asyncio.Future = loop.create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            value = await self._load(key, loader, ttl, generation)
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()   # waiters re-raise it; don't log "never retrieved"
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: float | None,
+                    generation: int) -> Any:
+        use_l2 = self.shared and shared_cache.enabled()
+        if use_l2:
+            value = await shared_cache.l2_get(self.name, key)
+            if value is not _MISSING:
+                self.l2_hits += 1
+                if generation == self._generation:
+                    self.set(key, value, ttl)
+                return value
+            self.l2_misses += 1
+
+        value = await loader()
+        if generation == self._generation:
+            self.set(key, value, ttl)
+            if use_l2:
+                await shared_cache.l2_set(self.name, key, value, self.ttl if ttl is None else ttl)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "shared": self.shared,
+            "l2_hits": self.l2_hits,
+            "l2_misses": self.l2_misses,
+        }
+
+    def _lookup(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+            self.misses += 1
+            return _MISSING
+
+
+_registry: dict[str, TTLCache] = {}
+
+
+def get_cache(name: str, maxsize: int, ttl: float, shared: bool = False) -> TTLCache:
+    """Return the cache registered under `name`, creating it on first use."""
+    if name not in _registry:
+        _registry[name] = TTLCache(name, maxsize, ttl, shared)
+    return _registry[name]
+
+
+def shared_caches() -> dict[str, TTLCache]:
+    return {name: cache for name, cache in _registry.items() if cache.shared}
+
+
+def cache_stats() -> dict[str, dict]:
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def clear_all() -> None:
+    """Drop every local entry (tests, emergencies); peers are not notified."""
+    for cache in _registry.values():
+        cache.clear(propagate=False)
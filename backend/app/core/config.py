@@ -6,18 +6,71 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_service_key: str
     supabase_jwt_secret: str
+    supabase_pool_size: int = 50             # async PostgREST connections per worker
+    supabase_keepalive_seconds: float = 30.0
+    supabase_timeout_seconds: float = 10.0
 
     # App
     api_prefix: str = "/api/v1"
     cors_origins: list[str] = ["http://localhost:3000"]
     debug: bool = False
 
+    # Write-behind read counters (see app/services/view_counter_service.py)
+    view_counter_flush_seconds: float = 5.0
+    view_counter_max_pending: int = 5_000
+
+    # In-process catalog caches (see app/core/cache.py)
+    catalog_cache_ttl_seconds: float = 30.0
+    catalog_cache_max_entries: int = 2_048
+    tags_cache_ttl_seconds: float = 300.0
+    principal_cache_ttl_seconds: float = 30.0
+    principal_cache_max_entries: int = 10_000
+
+    # Rate limiter Redis sync interval (see app/core/rate_limit.py)
+    rate_limit_sync_seconds: float = 1.0
+    # Redis L2 tier + cross-replica invalidation (see app/core/shared_cache.py)
+    shared_cache_enabled: bool = True
+    shared_cache_sync_seconds: float = 1.0
+
+    # Background jobs (see app/workers/job_queue.py)
+    job_queue_backend: str = "postgres"      # "postgres" | "memory" (in-process, local dev only)
+    job_worker_embedded: bool = False        # also run a worker inside the API process
+    job_poll_seconds: float = 1.0
+    job_lease_seconds: int = 300
+    job_retry_base_seconds: float = 10.0
+    job_retry_max_seconds: float = 600.0
+    job_concurrency: dict[str, int] = {}     # per-job-type overrides of JOB_TYPES defaults
+
     # AI (optional -- no key means Gemini translation is unavailable)
     gemini_api_key: str = ""
+    gemini_max_retries: int = 5              # retries on 429 before giving up (see app/core/gemini.py)
+    # Per-chapter generate_content fan-out (timeline, relationship fallback; see gemini.fan_out)
+    gemini_generate_rpm: int = 1_000         # generate_content requests per minute per process (fan_out)
+    gemini_generate_tpm: int = 1_000_000     # estimated prompt tokens per minute per process
+    gemini_generate_concurrency: int = 8     # generate_content calls in flight per process
+    # Chapter embedding (see app/services/embedding_service.py)
+    gemini_embed_rpm: int = 1_500            # embed requests per minute per process
+    gemini_embed_batch_size: int = 100       # chunks per batch request (API maximum)
+    gemini_embed_concurrency: int = 4        # batch requests in flight per process
+    embed_backfill_page_size: int = 20       # chapters per backfill page (keeps chunk lookups < 1000 rows)
+    embed_backfill_prefetch: int = 2         # pages buffered between backfill stages
+    query_embed_cache_max_entries: int = 4_096   # RETRIEVAL_QUERY vectors for chat / Q&A questions
+    query_embed_cache_ttl_seconds: float = 86_400.0
+    relationship_page_size: int = 20             # chapters per relationship-graph page
+    relationship_window_paragraphs: int = 3      # co-occurrence window when counting pairs locally
+    timeline_progress_every: int = 20            # chapters between arc_timeline progress writes
+    arc_summary_block_size: int = 10             # chapters per cached arc-summary block (and blocks per parent)
+    arc_summary_prompt_chars: int = 100_000      # chapter text per summary prompt; longer chapters go in pieces
+    # Full-context Q&A answers (see story_intelligence_service.stream_qa)
+    qa_answer_cache_ttl_seconds: float = 21_600.0
+    qa_answer_cache_per_novel: int = 64          # recent questions matched per novel
+    qa_answer_cache_similarity: float = 0.95     # cosine similarity needed to replay an answer
 
     # Qdrant (optional -- embedding pipeline disabled if not set)
     qdrant_url: str = ""
     qdrant_api_key: str = ""
+    qdrant_collection_mode: str = "per_novel"    # "per_novel" | "shared" (see app/core/qdrant.py)
+    qdrant_shared_collection: str = "novel_chunks"
 
     # Upstash Redis (optional -- rate limiting disabled if not set)
     upstash_redis_url: str = ""
@@ -0,0 +1,98 @@
+"""Character co-occurrence counting against a novel's known roster.
+
+NameMatcher folds the roster into a trie and compiles it to one regular
+expression (shared prefixes factored out, e.g. "lý (?:minh|lan)"), so the C
+regex engine finds every mention in a single pass over a chapter however
+many characters there are. Matching is case-insensitive, whole-word, and
+leftmost-longest ("Lý Minh" wins over "Minh" at the same place).
+count_pairs then counts two characters as co-occurring when they are
+mentioned within `window` consecutive paragraphs of each other.
+"""
+import re
+from bisect import bisect_right
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterable
+
+_PARAGRAPH_BREAK = re.compile(r"\n|</p>|<br\s*/?>", re.IGNORECASE)
+
+
+def _trie_pattern(trie: dict) -> str:
+    # Longer continuations come first inside an optional group, so the regex
+    # backtracks to the shorter name only when the longer one does not match.
+    alternatives = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(trie.items()) if ch]
+    if not alternatives:
+        return ""
+    body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+    return f"(?:{body})?" if "" in trie else body
+
+
+class NameMatcher:
+    def __init__(self, names: Iterable[str]) -> None:
+        self._names: dict[str, str] = {}   # lowered -> roster spelling
+        trie: dict = {}
+        for name in names:
+            name = name.strip()
+            key = name.lower()
+            if not key:
+                continue
+            self._names.setdefault(key, name)
+            node = trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        self._pattern = re.compile(rf"(?<!\w){_trie_pattern(trie)}(?!\w)") if trie else None
+
+    def __bool__(self) -> bool:
+        return self._pattern is not None
+
+    def finditer(self, lowered: str):
+        """(offset, name) for each mention in already-lowercased text."""
+        if self._pattern is None:
+            return
+        names = self._names
+        for match in self._pattern.finditer(lowered):
+            yield match.start(), names[match.group()]
+
+    def find(self, text: str) -> list[str]:
+        """Names mentioned in `text`, in order, without overlaps."""
+        return [name for _, name in self.finditer(text.lower())]
+
+
+def _paragraph_starts(text: str) -> list[int]:
+    starts = []
+    pos = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        if not text[pos:match.start()].isspace() and match.start() > pos:
+            starts.append(pos)
+        pos = match.end()
+    if text[pos:].strip():
+        starts.append(pos)
+    return starts
+
+
+def count_pairs(matcher: NameMatcher, content: str, window: int = 3) -> list[list]:
+    """[[a, b, count], ...] for character pairs co-occurring in `content`, a < b.
+
+    A pair counts once for each paragraph that mentions one of them while
+    the other is mentioned in that paragraph or the `window - 1` before it.
+    Blank paragraphs do not count towards the window.
+    """
+    lowered = content.lower()
+    starts = _paragraph_starts(lowered)
+    mentions: defaultdict[int, set[str]] = defaultdict(set)
+    for offset, name in matcher.finditer(lowered):
+        mentions[bisect_right(starts, offset) - 1].add(name)
+
+    counts: Counter = Counter()
+    recent: deque[tuple[int, set[str]]] = deque()
+    for index in sorted(mentions):
+        names = mentions[index]
+        while recent and recent[0][0] <= index - window:
+            recent.popleft()
+        nearby = names.union(*(seen for _, seen in recent))
+        counts.update({
+            (a, b) if a < b else (b, a)
+            for a in names for b in nearby if a != b
+        })
+        recent.append((index, names))
+    return [[a, b, n] for (a, b), n in sorted(counts.items())]
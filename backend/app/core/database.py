@@ -1,6 +1,7 @@
 from functools import lru_cache
 
-from supabase import Client, create_client
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, Client, create_client
 
 from app.core.config import settings
 
@@ -8,3 +9,40 @@ from app.core.config import settings
 @lru_cache
 def get_supabase() -> Client:
     return create_client(settings.supabase_url, settings.supabase_service_key)
+
+
+@lru_cache
+def _get_async_http_client() -> httpx.AsyncClient:
+    """Pooled keep-alive HTTP client shared by every async Supabase request."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.supabase_pool_size,
+            max_keepalive_connections=settings.supabase_pool_size,
+            keepalive_expiry=settings.supabase_keepalive_seconds,
+        ),
+        timeout=httpx.Timeout(settings.supabase_timeout_seconds),
+        follow_redirects=True,
+        http2=True,
+    )
+
+
+@lru_cache
+def get_async_supabase() -> AsyncClient:
+    """Return the async Supabase client used by request handlers.
+
+    Queries are awaited (`await query.execute()`) so a slow PostgREST round trip
+    yields the event loop instead of stalling the whole uvicorn worker.
+    """
+    return AsyncClient(
+        settings.supabase_url,
+        settings.supabase_service_key,
+        options=AsyncClientOptions(httpx_client=_get_async_http_client()),
+    )
+
+
+async def close_async_supabase() -> None:
+    """Close the pooled HTTP connections (called on application shutdown)."""
+    if _get_async_http_client.cache_info().currsize:
+        await _get_async_http_client().aclose()
+        _get_async_http_client.cache_clear()
+        get_async_supabase.cache_clear()
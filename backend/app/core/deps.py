@@ -1,20 +1,53 @@
+import time
+from datetime import datetime, timezone
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from app.core.cache import get_cache
+from app.core.config import settings
 from app.core.database import get_supabase
 from app.core.security import decode_jwt
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# user id -> {"user": row, "loaded_at": epoch}. A cached row only serves tokens
+# issued before it was loaded (iat <= loaded_at), so a fresh login always re-reads.
+# Only the columns authorization needs are cached; counters such as
+# daily_nominations or chapters_read change without an invalidation, so
+# /auth/me reads the full profile itself. Role/ban/VIP writes call
+# invalidate_principal(); peers hear about it through the shared cache
+# invalidation log.
+_PRINCIPAL_COLUMNS = "id, role, is_banned, ban_until, vip_tier, vip_expires_at"
+_principal_cache = get_cache(
+    "principals", settings.principal_cache_max_entries, settings.principal_cache_ttl_seconds, shared=True
+)
+
+
+def invalidate_principal(user_id: str) -> None:
+    _principal_cache.invalidate(user_id)
+
+
+def _load_principal(user_id: str) -> dict:
+    loaded_at = time.time()
+    result = get_supabase().table("users").select(_PRINCIPAL_COLUMNS).eq("id", user_id).single().execute()
+    if not result.data:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    return {"user": result.data, "loaded_at": loaded_at}
+
+
+def _expire_vip(user_id: str) -> None:
+    get_supabase().table("users").update({"vip_tier": "none", "vip_expires_at": None}).eq("id", user_id).execute()
+
 
 async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
 ) -> dict:
     """
     Extract and validate the JWT from the Authorization header.
-    Returns the user row from the public.users table.
+    Returns the user's id, role, ban and VIP columns from public.users.
     Raises 401 if missing or invalid.
     """
     if not credentials:
@@ -29,26 +62,25 @@ async def get_current_user(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
 
-    supabase = get_supabase()
-    result = supabase.table("users").select("*").eq("id", user_id).single().execute()
-
-    if not result.data:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-
-    user = result.data
+    issued_at = payload.get("iat") or 0
+    cached = _principal_cache.get(user_id)
+    if cached is None or cached["loaded_at"] < issued_at:
+        if cached is not None:
+            _principal_cache.invalidate(user_id, propagate=False)
+        cached = await _principal_cache.get_or_load(user_id, lambda: run_in_threadpool(_load_principal, user_id))
+    user = dict(cached["user"])
 
-    # Lazy VIP expiry check
+    # Lazy VIP expiry check (also re-checked on cache hits; expiry is time-based)
     if user.get("vip_expires_at"):
-        from datetime import datetime, timezone
         expires_at = datetime.fromisoformat(user["vip_expires_at"].replace("Z", "+00:00"))
         if expires_at < datetime.now(timezone.utc):
-            supabase.table("users").update({"vip_tier": "none", "vip_expires_at": None}).eq("id", user_id).execute()
+            await run_in_threadpool(_expire_vip, user_id)
+            invalidate_principal(user_id)
             user["vip_tier"] = "none"
             user["vip_expires_at"] = None
 
     # Block banned users
     if user.get("is_banned"):
-        from datetime import datetime, timezone
         ban_until = user.get("ban_until")
         if ban_until is None:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is permanently banned")
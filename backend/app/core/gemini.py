@@ -0,0 +1,179 @@
+"""Shared Gemini plumbing: one-time client configuration, a per-process
+requests/tokens-per-minute budget, retry with backoff on quota errors
+(HTTP 429), a paced streaming call and a bounded fan-out pool for
+per-chapter generate calls.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@lru_cache(maxsize=1)
+def get_genai():
+    """Return the google.generativeai module, configured once with the API key."""
+    import google.generativeai as genai
+
+    genai.configure(api_key=settings.gemini_api_key)
+    return genai
+
+
+class RequestBudget:
+    """Sliding-window limiter: at most `rpm` calls, and optionally `tpm`
+    estimated tokens, in any 60 seconds.
+
+    acquire() blocks the calling thread until a slot is free, so worker threads
+    pace themselves instead of spending the quota and collecting 429s. A single
+    call larger than `tpm` is let through once the window is otherwise empty.
+    """
+
+    def __init__(self, rpm: int, period: float = 60.0, tpm: int | None = None) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self.period = period
+        self._calls: deque[tuple[float, int]] = deque()
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0][0] >= self.period:
+                    self._tokens -= self._calls.popleft()[1]
+                fits = self.tpm is None or not self._calls or self._tokens + tokens <= self.tpm
+                if len(self._calls) < self.rpm and fits:
+                    self._calls.append((now, tokens))
+                    self._tokens += tokens
+                    return
+                wait = self.period - (now - self._calls[0][0])
+            time.sleep(wait)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size for the TPM budget (~4 chars per token); not used for billing."""
+    return len(text) // 4 + 1
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    """True for Gemini quota errors (google.api_core ResourceExhausted / HTTP 429)."""
+    if getattr(exc, "code", None) == 429:
+        return True
+    return type(exc).__name__ == "ResourceExhausted" or "429" in str(exc)
+
+
+def call_with_backoff(
+    fn: Callable[[], T],
+    budget: RequestBudget | None = None,
+    max_retries: int | None = None,
+    base_delay: float = 1.0,
+    tokens: int = 0,
+) -> T:
+    """Call fn under the budget, retrying quota errors with exponential backoff + jitter.
+
+    Any other exception, or a quota error after max_retries retries, propagates.
+    """
+    retries = settings.gemini_max_retries if max_retries is None else max_retries
+    for attempt in range(retries + 1):
+        if budget is not None:
+            budget.acquire(tokens)
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt == retries or not is_rate_limited(exc):
+                raise
+            time.sleep(_retry_delay(attempt, retries, base_delay))
+    raise AssertionError("unreachable")
+
+
+def _retry_delay(attempt: int, retries: int, base_delay: float) -> float:
+    delay = base_delay * 2 ** attempt * (1 + random.random())
+    logger.warning("Gemini rate limited, retry %d/%d in %.1fs", attempt + 1, retries, delay)
+    return delay
+
+
+@lru_cache(maxsize=1)
+def generate_budget() -> RequestBudget:
+    """Process-wide budget shared by every generate_content call made through fan_out."""
+    return RequestBudget(settings.gemini_generate_rpm, tpm=settings.gemini_generate_tpm)
+
+
+@lru_cache(maxsize=1)
+def _generate_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=settings.gemini_generate_concurrency, thread_name_prefix="generate")
+
+
+def generate(model, prompt: str):
+    """model.generate_content(prompt) under the shared budget, with backoff on 429s."""
+    return call_with_backoff(
+        lambda: model.generate_content(prompt), budget=generate_budget(), tokens=estimate_tokens(prompt)
+    )
+
+
+async def stream_generate(model, prompt: str, max_retries: int | None = None,
+                          base_delay: float = 1.0) -> AsyncIterator:
+    """model.generate_content_async(prompt, stream=True) under the shared budget.
+
+    Quota errors are retried with backoff until the first chunk arrives.
+    After that chunks pass straight through: a retry would repeat text the
+    caller has already sent on.
+    """
+    retries = settings.gemini_max_retries if max_retries is None else max_retries
+    tokens = estimate_tokens(prompt)
+    for attempt in range(retries + 1):
+        await asyncio.to_thread(generate_budget().acquire, tokens)
+        try:
+            chunks = aiter(await model.generate_content_async(prompt, stream=True))
+            first = await anext(chunks)
+        except StopAsyncIteration:
+            return
+        except Exception as exc:
+            if attempt == retries or not is_rate_limited(exc):
+                raise
+            await asyncio.sleep(_retry_delay(attempt, retries, base_delay))
+            continue
+        yield first
+        async for chunk in chunks:
+            yield chunk
+        return
+
+
+def fan_out(fn: Callable[[T], R], items: Iterable[T]) -> Iterator[tuple[T, R | None, BaseException | None]]:
+    """Run fn over items on the shared generate pool; yield (item, result, error) as each finishes.
+
+    At most gemini_generate_concurrency calls run at once across the process,
+    and items are pulled lazily, so a caller can persist results as they
+    arrive. fn should pace its Gemini calls through generate().
+    """
+    pool = _generate_executor()
+    ahead = settings.gemini_generate_concurrency * 2
+    pending: dict[Future, T] = {}
+    items = iter(items)
+
+    def fill() -> None:
+        for item in items:
+            pending[pool.submit(fn, item)] = item
+            if len(pending) >= ahead:
+                return
+
+    fill()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            error = future.exception()
+            yield item, None if error else future.result(), error
+        fill()
@@ -1,11 +1,26 @@
-"""Lazy Qdrant client — returns None when QDRANT_URL is not configured."""
+"""Lazy Qdrant client — returns None when QDRANT_URL is not configured.
+
+Chunk vectors live either in one collection per novel (novel_{id}, the
+original layout) or, with QDRANT_COLLECTION_MODE=shared, in a single
+collection whose novel_id and chapter_number payload fields are indexed.
+The shared layout keeps one HNSW graph instead of one per novel; searches
+then carry a novel_id filter (novel_filter). Existing per-novel collections
+are copied over with `python -m app.workers.qdrant_migrate`.
+"""
 import logging
+import threading
 from functools import lru_cache
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+VECTOR_DIMENSION = 768   # text-embedding-004
+
+# Collections known to exist; Qdrant is asked once per name per process.
+_known_collections: set[str] = set()
+_known_lock = threading.Lock()
+
 
 @lru_cache(maxsize=1)
 def get_qdrant():
@@ -22,3 +37,76 @@ def get_qdrant():
     except Exception as exc:
         logger.warning("Failed to initialize Qdrant client: %s", exc)
         return None
+
+
+@lru_cache(maxsize=1)
+def get_async_qdrant():
+    """Return an AsyncQdrantClient for request handlers, or None if Qdrant is not configured.
+
+    Streaming endpoints search with it so a slow search yields the event loop
+    instead of holding a threadpool worker.
+    """
+    if not settings.qdrant_url:
+        return None
+    try:
+        from qdrant_client import AsyncQdrantClient
+        return AsyncQdrantClient(
+            url=settings.qdrant_url,
+            api_key=settings.qdrant_api_key or None,
+        )
+    except Exception as exc:
+        logger.warning("Failed to initialize async Qdrant client: %s", exc)
+        return None
+
+
+async def close_async_qdrant() -> None:
+    """Close the async client's connections (called on application shutdown)."""
+    if get_async_qdrant.cache_info().currsize:
+        client = get_async_qdrant()
+        get_async_qdrant.cache_clear()
+        if client is not None:
+            await client.close()
+
+
+def shared_mode() -> bool:
+    return settings.qdrant_collection_mode == "shared"
+
+
+def collection_for(novel_id: str) -> str:
+    """Collection holding a novel's chunk vectors."""
+    return settings.qdrant_shared_collection if shared_mode() else f"novel_{novel_id}"
+
+
+def novel_filter(novel_id: str, *conditions):
+    """Search filter for one novel: `conditions` plus, in shared mode, a novel_id match.
+
+    Returns None when there is nothing to filter on.
+    """
+    from qdrant_client.models import FieldCondition, Filter, MatchValue
+
+    must = list(conditions)
+    if shared_mode():
+        must.append(FieldCondition(key="novel_id", match=MatchValue(value=novel_id)))
+    return Filter(must=must) if must else None
+
+
+def ensure_collection(client, collection_name: str) -> None:
+    """Create the collection (and, for the shared one, its payload indexes) if missing."""
+    if collection_name in _known_collections:
+        return
+    from qdrant_client.models import Distance, PayloadSchemaType, VectorParams
+
+    with _known_lock:
+        if collection_name in _known_collections:
+            return
+        if not client.collection_exists(collection_name):
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(size=VECTOR_DIMENSION, distance=Distance.COSINE),
+            )
+            logger.info("Created Qdrant collection: %s", collection_name)
+        if collection_name == settings.qdrant_shared_collection:
+            # Idempotent; makes novel_id/chapter_number filters index lookups.
+            client.create_payload_index(collection_name, "novel_id", PayloadSchemaType.KEYWORD)
+            client.create_payload_index(collection_name, "chapter_number", PayloadSchemaType.INTEGER)
+        _known_collections.add(collection_name)
@@ -1,50 +1,174 @@
+"""Per-user/IP rate limiting: 100 cost units per minute.
+
+Decisions are made in-process against a token bucket (capacity RATE_LIMIT,
+refilled at RATE_LIMIT / WINDOW per second), so the limiter adds no network
+hop to a request. Replicas share a budget through Redis: every
+`rate_limit_sync_seconds` a background task INCRBYs each active key's
+consumption into a fixed-window counter (rl:{key}:{window}) in one pipeline
+and learns from the returned totals how much the other replicas spent, which
+is then taken out of the local bucket. A client spreading requests over N
+replicas can therefore overshoot by at most one sync interval's worth.
+
+Routes are weighted by ROUTE_COSTS so e.g. an AI answer costs more than a
+catalog read.
+"""
+import asyncio
+import logging
+import math
 import time
+from dataclasses import dataclass, field
 
 from fastapi import HTTPException, Request
 from fastapi import status as http_status
 
-from app.core.redis import get_redis
+from app.core.config import settings
+from app.core.redis import get_async_redis
+from app.core.security import decode_jwt
 
-RATE_LIMIT = 100   # requests
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = 100   # cost units
 WINDOW = 60        # seconds
+_REFILL_PER_SECOND = RATE_LIMIT / WINDOW
 
+# (method, path prefix below the API prefix, cost); first match wins, default 1.
+ROUTE_COSTS: list[tuple[str, str, int]] = [
+    ("POST", "/tts/", 20),                 # narration synthesis
+    ("POST", "/chat/sessions/", 10),       # character chat message (LLM + vector search)
+    ("POST", "/ai/", 10),                  # story Q&A
+    ("GET", "/ai/", 3),                    # relationship graph / timeline / arc summary
+]
 
-async def rate_limit(request: Request) -> None:
-    """Token bucket rate limiter: 100 req/min per user or IP."""
-    redis = get_redis()
-    if redis is None:
-        return  # Redis not configured — skip rate limiting
 
-    # Use authenticated user ID if available, otherwise fall back to IP
-    user_id = None
+@dataclass
+class _Bucket:
+    tokens: float = RATE_LIMIT
+    updated: float = field(default_factory=time.monotonic)
+    pending: int = 0          # cost spent locally since the last sync
+    window: int = -1          # Redis window the counters below refer to
+    own_synced: int = 0       # our contribution to that window's Redis counter
+    others_seen: int = 0      # other replicas' contribution already deducted
+
+
+_buckets: dict[str, _Bucket] = {}
+
+_sync_requested: asyncio.Event | None = None
+_sync_task: asyncio.Task | None = None
+_stopping = False
+
+
+def route_cost(method: str, path: str) -> int:
+    if path.startswith(settings.api_prefix):
+        path = path[len(settings.api_prefix):]
+    for route_method, prefix, cost in ROUTE_COSTS:
+        if method == route_method and path.startswith(prefix):
+            return cost
+    return 1
+
+
+def _client_key(request: Request) -> str:
     auth_header = request.headers.get("Authorization", "")
     if auth_header.startswith("Bearer "):
-        # Extract sub from JWT without full verification (just for key)
+        # decode_jwt memoizes verification, so keying on the verified sub is cheap
+        # and a forged token can't drain someone else's budget.
         try:
-            import jwt as _jwt
-            token = auth_header[7:]
-            unverified = _jwt.decode(token, options={"verify_signature": False})
-            user_id = unverified.get("sub")
-        except Exception:
+            user_id = decode_jwt(auth_header[7:]).get("sub")
+            if user_id:
+                return f"u:{user_id}"
+        except ValueError:
             pass
+    host = request.client.host if request.client else None
+    return f"ip:{host or 'unknown'}"
 
-    key_id = user_id or request.client.host or "unknown"
-    key = f"rl:{key_id}"
 
-    now = int(time.time())
-    window_start = now - WINDOW
+def consume(key: str, cost: int) -> float:
+    """Take `cost` tokens from key's bucket. Returns 0 if allowed, else seconds to wait."""
+    now = time.monotonic()
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = _buckets[key] = _Bucket(updated=now)
+    bucket.tokens = min(RATE_LIMIT, bucket.tokens + (now - bucket.updated) * _REFILL_PER_SECOND)
+    bucket.updated = now
+    if bucket.tokens < cost:
+        return (cost - bucket.tokens) / _REFILL_PER_SECOND
+    bucket.tokens -= cost
+    bucket.pending += cost
+    return 0.0
 
-    pipe = redis.pipeline()
-    pipe.zremrangebyscore(key, 0, window_start)
-    pipe.zadd(key, {str(now): now})
-    pipe.zcard(key)
-    pipe.expire(key, WINDOW)
-    results = pipe.exec()
-
-    count = results[2]
-    if count > RATE_LIMIT:
+
+async def rate_limit(request: Request) -> None:
+    """Token bucket rate limiter: RATE_LIMIT cost units per WINDOW per user or IP."""
+    cost = route_cost(request.method, request.url.path)
+    wait = consume(_client_key(request), cost)
+    if wait:
         raise HTTPException(
             status_code=http_status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Rate limit exceeded. Try again in a minute.",
-            headers={"Retry-After": str(WINDOW)},
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
         )
+
+
+async def sync() -> None:
+    """Push local consumption to Redis and deduct what other replicas spent."""
+    now = time.monotonic()
+    for key in [k for k, b in _buckets.items() if not b.pending and now - b.updated > WINDOW]:
+        del _buckets[key]   # idle long enough to be full again
+
+    redis = get_async_redis()
+    active = [(key, b) for key, b in _buckets.items() if b.pending]
+    if redis is None or not active:
+        for _, bucket in active:
+            bucket.pending = 0
+        return
+
+    window = int(time.time() // WINDOW)
+    sent = [(key, bucket, bucket.pending) for key, bucket in active]
+    pipe = redis.pipeline()
+    for key, _, pending in sent:
+        pipe.incrby(f"rl:{key}:{window}", pending)
+        pipe.expire(f"rl:{key}:{window}", 2 * WINDOW)
+    try:
+        results = await pipe.exec()
+    except Exception as exc:
+        logger.warning("rate limit sync failed for %d keys: %s", len(sent), exc)
+        return
+
+    for (key, bucket, pending), total in zip(sent, results[::2]):
+        bucket.pending -= pending
+        if bucket.window != window:
+            bucket.window, bucket.own_synced, bucket.others_seen = window, 0, 0
+        bucket.own_synced += pending
+        others = int(total) - bucket.own_synced
+        if others > bucket.others_seen:
+            bucket.tokens = max(-RATE_LIMIT, bucket.tokens - (others - bucket.others_seen))
+            bucket.others_seen = others
+
+
+async def _sync_loop() -> None:
+    assert _sync_requested is not None
+    while not _stopping:
+        try:
+            await asyncio.wait_for(_sync_requested.wait(), timeout=settings.rate_limit_sync_seconds)
+        except asyncio.TimeoutError:
+            pass
+        _sync_requested.clear()
+        await sync()
+
+
+def start() -> None:
+    """Start the background Redis sync (application startup)."""
+    global _sync_requested, _sync_task, _stopping
+    _stopping = False
+    _sync_requested = asyncio.Event()
+    _sync_task = asyncio.create_task(_sync_loop())
+
+
+async def stop() -> None:
+    global _sync_requested, _sync_task, _stopping
+    _stopping = True
+    if _sync_requested is not None:
+        _sync_requested.set()
+    if _sync_task is not None:
+        await _sync_task
+    _sync_task = None
+    _sync_requested = None
@@ -11,3 +11,12 @@ def get_redis() -> Redis | None:
     if not settings.upstash_redis_url or not settings.upstash_redis_token:
         return None
     return Redis(url=settings.upstash_redis_url, token=settings.upstash_redis_token)
+
+
+@lru_cache(maxsize=1)
+def get_async_redis():
+    """Return an asyncio Upstash client, or None if not configured."""
+    if not settings.upstash_redis_url or not settings.upstash_redis_token:
+        return None
+    from upstash_redis.asyncio import Redis as AsyncRedis
+    return AsyncRedis(url=settings.upstash_redis_url, token=settings.upstash_redis_token)
@@ -1,10 +1,25 @@
+import time
+from functools import lru_cache
+
 from jose import JWTError, jwt
 
 from app.core.config import settings
 
 
 def decode_jwt(token: str) -> dict:
-    """Decode and verify a Supabase-issued JWT. Returns the payload."""
+    """Decode and verify a Supabase-issued JWT. Returns the payload.
+
+    Signature checks are memoized per token; expiry is re-checked on every call.
+    """
+    payload = _verify_jwt(token)
+    exp = payload.get("exp")
+    if exp is not None and exp < time.time():
+        raise ValueError("Invalid token: Signature has expired.")
+    return dict(payload)
+
+
+@lru_cache(maxsize=4096)
+def _verify_jwt(token: str) -> dict:
     try:
         payload = jwt.decode(
             token,
@@ -0,0 +1,245 @@
+"""Redis L2 tier and cross-replica invalidation for app/core/cache.py.
+
+Caches created with shared=True read through Upstash Redis after an L1 miss, so
+a cold replica is warmed by its peers instead of the database. Values are JSON
+(orjson when installed).
+
+Invalidation fans out through versioned keys plus a small invalidation log:
+- L2 keys are cache:{name}:{generation}:{key}; clearing a namespace INCRs its
+  generation, orphaning every old key (they expire on their own TTL).
+- Every invalidation is appended to the cache:inval sorted set, scored by a
+  global sequence number; one Lua script takes the number and adds the
+  entry, so no reader sees a number whose entry is still missing. Each
+  replica polls it every `shared_cache_sync_seconds`, drops the matching L1
+  entries and resumes after the highest entry it has read.
+
+Upstash's REST API has no long-lived pub/sub subscription, hence polling. A
+replica's own writes apply to its L1 immediately and are pushed to Redis by the
+sync loop, which is woken right away rather than waiting for the next poll.
+Until that push lands, the invalidated key (or the whole cache, for a clear)
+bypasses L2 on this replica, so a miss cannot reload the old value from Redis.
+Redis failures degrade to L1-only caching and never fail a request.
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import Counter
+from typing import Any
+
+from app.core.config import settings
+from app.core.redis import get_async_redis
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+_LOG_KEY = "cache:inval"
+_SEQ_KEY = "cache:inval:seq"
+_LOG_RETAIN = 10_000   # log entries kept; a replica further behind clears its shared caches
+
+# KEYS: sequence counter, log. ARGV[1]: the entry's JSON array without its
+# leading sequence number. Returns the sequence number taken.
+_APPEND_LOG_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], seq, '[' .. seq .. ',' .. ARGV[1] .. ']')
+return seq
+"""
+
+_instance_id = uuid.uuid4().hex[:12]
+_generations: dict[str, int] = {}
+_last_seq: int | None = None
+_outbox: list[tuple[str, str | None]] = []   # (cache name, key or None for "clear all")
+_pending: Counter[tuple[str, str | None]] = Counter()   # outbox entries not yet pushed
+_pending_lock = threading.Lock()
+
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_sync_task: asyncio.Task | None = None
+_stopping = False
+
+
+def enabled() -> bool:
+    return settings.shared_cache_enabled and get_async_redis() is not None
+
+
+def _dumps(value: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _loads(raw: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _redis_key(name: str, key: str) -> str:
+    return f"cache:{name}:{_generations.get(name, 0)}:{key}"
+
+
+def _invalidation_pending(name: str, key: str) -> bool:
+    """True while this replica has an unpushed invalidation covering key; L2 may still hold the old value."""
+    return _pending[(name, None)] > 0 or _pending[(name, key)] > 0
+
+
+async def l2_get(name: str, key: str) -> Any:
+    """Return the shared value for key, or MISSING."""
+    if _invalidation_pending(name, key):
+        return MISSING
+    try:
+        raw = await get_async_redis().get(_redis_key(name, key))
+    except Exception as exc:
+        logger.warning("shared cache read failed for %s:%s: %s", name, key, exc)
+        return MISSING
+    return MISSING if raw is None else _loads(raw)
+
+
+async def l2_set(name: str, key: str, value: Any, ttl: float) -> None:
+    if _invalidation_pending(name, key):
+        return
+    try:
+        await get_async_redis().set(_redis_key(name, key), _dumps(value), ex=max(1, int(ttl)))
+    except Exception as exc:
+        logger.warning("shared cache write failed for %s:%s: %s", name, key, exc)
+
+
+def publish(name: str, key: str | None) -> None:
+    """Queue an invalidation for the other replicas. Safe to call from any thread."""
+    if not enabled():
+        return
+    with _pending_lock:
+        _pending[(name, key)] += 1
+        _outbox.append((name, key))
+    if _loop is None or _wakeup is None:
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _loop:
+        _wakeup.set()
+    else:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _pushed(name: str, key: str | None) -> None:
+    with _pending_lock:
+        _pending[(name, key)] -= 1
+        if _pending[(name, key)] <= 0:
+            del _pending[(name, key)]
+
+
+async def _push_outbox(redis) -> None:
+    global _outbox
+    with _pending_lock:
+        pending, _outbox = _outbox, []
+    for i, (name, key) in enumerate(pending):
+        try:
+            if key is None:
+                _generations[name] = int(await redis.incr(f"cache:gen:{name}"))
+            else:
+                await redis.delete(_redis_key(name, key))
+            entry = _dumps([_instance_id, name, key])[1:-1]
+            seq = int(await redis.eval(_APPEND_LOG_SCRIPT, keys=[_SEQ_KEY, _LOG_KEY], args=[entry]))
+            _pushed(name, key)
+            if seq % 1_000 == 0:
+                await redis.zremrangebyscore(_LOG_KEY, 0, seq - _LOG_RETAIN)
+        except Exception as exc:
+            logger.warning("shared cache invalidation push failed, retrying %d: %s", len(pending) - i, exc)
+            with _pending_lock:
+                _outbox[:0] = pending[i:]
+            return
+
+
+async def _pull_log(redis) -> None:
+    global _last_seq
+    from app.core.cache import shared_caches
+
+    caches = shared_caches()
+    if not caches:
+        return
+    names = list(caches)
+    pipe = redis.pipeline()
+    pipe.get(_SEQ_KEY)
+    pipe.mget(*[f"cache:gen:{name}" for name in names])
+    if _last_seq is not None:
+        pipe.zrangebyscore(_LOG_KEY, f"({_last_seq}", "+inf")
+    results = await pipe.exec()
+
+    seq = int(results[0] or 0)
+    for name, gen in zip(names, results[1]):
+        _generations[name] = int(gen or 0)
+
+    if _last_seq is None:
+        _last_seq = seq   # nothing cached yet that older entries could cover
+        return
+    if seq - _last_seq > _LOG_RETAIN:
+        # Fell behind the trimmed log: we can't know what changed.
+        for cache in caches.values():
+            cache.clear(propagate=False)
+    # Resume after what was actually read, not the counter: an entry numbered
+    # below it may land after this read and must still be picked up.
+    for entry_seq, origin, name, key in (_loads(raw) for raw in results[2]):
+        _last_seq = max(_last_seq, int(entry_seq))
+        if origin == _instance_id or name not in caches:
+            continue
+        if key is None:
+            caches[name].clear(propagate=False)
+        else:
+            caches[name].invalidate(key, propagate=False)
+
+
+async def sync() -> None:
+    """Push queued invalidations, then apply everyone else's."""
+    redis = get_async_redis()
+    if redis is None:
+        return
+    if _outbox:
+        await _push_outbox(redis)
+    try:
+        await _pull_log(redis)
+    except Exception as exc:
+        logger.warning("shared cache sync failed: %s", exc)
+
+
+async def _sync_loop() -> None:
+    assert _wakeup is not None
+    while not _stopping:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.shared_cache_sync_seconds)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await sync()
+
+
+def start() -> None:
+    """Start the invalidation sync loop (application startup). No-op without Redis."""
+    global _loop, _wakeup, _sync_task, _stopping
+    if not enabled():
+        return
+    _stopping = False
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _sync_task = asyncio.create_task(_sync_loop())
+
+
+async def stop() -> None:
+    """Flush pending invalidations and stop the sync loop (application shutdown)."""
+    global _loop, _wakeup, _sync_task, _stopping
+    _stopping = True
+    if _wakeup is not None:
+        _wakeup.set()
+    if _sync_task is not None:
+        await _sync_task
+    _loop = _wakeup = _sync_task = None
+    if _outbox:
+        await sync()
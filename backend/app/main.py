@@ -1,23 +1,47 @@
+from contextlib import asynccontextmanager
+
 from fastapi import Depends, FastAPI
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from app.api.v1.router import api_router
+from app.core import rate_limit as rate_limiter
+from app.core import shared_cache
 from app.core.config import settings
+from app.core.database import close_async_supabase
 from app.core.exceptions import (
     _setup_logging,
     http_exception_handler,
     unhandled_exception_handler,
     validation_exception_handler,
 )
-from app.core.rate_limit import rate_limit
+from app.core.qdrant import close_async_qdrant
+from app.services import view_counter_service
+from app.workers import job_queue
 
 _setup_logging()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    view_counter_service.start()
+    shared_cache.start()
+    rate_limiter.start()
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    await rate_limiter.stop()
+    await shared_cache.stop()
+    await view_counter_service.stop()
+    await close_async_qdrant()
+    await close_async_supabase()
+
+
 app = FastAPI(
     title="NovelVerse API",
     version="0.1.0",
+    lifespan=lifespan,
     docs_url=f"{settings.api_prefix}/docs",
     openapi_url=f"{settings.api_prefix}/openapi.json",
 )
@@ -39,5 +63,5 @@ app.add_exception_handler(Exception, unhandled_exception_handler)
 app.include_router(
     api_router,
     prefix=settings.api_prefix,
-    dependencies=[Depends(rate_limit)],
+    dependencies=[Depends(rate_limiter.rate_limit)],
 )
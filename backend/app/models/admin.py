@@ -62,3 +62,33 @@ class FeedbackPublic(BaseModel):
 class RespondFeedbackRequest(BaseModel):
     admin_response: str
     status: str = "reviewed"
+
+
+class JobPublic(BaseModel):
+    id: str
+    job_type: str
+    payload: dict
+    status: str  # 'queued', 'running', 'succeeded', 'failed'
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class EmbeddingBackfillPublic(BaseModel):
+    novel_id: str
+    status: str  # 'queued', 'running', 'completed', 'failed'
+    last_chapter_number: int
+    chapters_done: int
+    chapters_total: int
+    chunks_embedded: int
+    chunks_skipped: int
+    chapters_per_minute: Optional[float] = None
+    eta_seconds: Optional[int] = None
+    last_error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
@@ -46,6 +46,11 @@ class ReadingProgress(BaseModel):
     user_id: str
     novel_id: str
     last_chapter_read: int
-    chapters_read_list: list[int]
+    chapters_read_count: int
     updated_at: datetime
     model_config = {"from_attributes": True}
+
+
+class ReadingProgressDetail(ReadingProgress):
+    """Progress for one novel, with read chapters as inclusive [first, last] runs."""
+    chapters_read_ranges: list[list[int]]
@@ -17,6 +17,8 @@ class RelationshipGraphResponse(BaseModel):
     status: str  # "not_started" | "pending" | "ready" | "failed"
     nodes: list[RelationshipNodePublic] = []
     edges: list[RelationshipEdgePublic] = []
+    processed: int | None = None  # chapters done / total while a rebuild is pending
+    total: int | None = None
 
 
 class TimelineEventPublic(BaseModel):
@@ -27,6 +29,8 @@ class TimelineEventPublic(BaseModel):
 class TimelineResponse(BaseModel):
     status: str  # "not_started" | "pending" | "ready" | "failed"
     events: list[TimelineEventPublic] = []
+    processed: int | None = None  # chapters done / total while pending
+    total: int | None = None
 
 
 class QARequest(BaseModel):
@@ -5,7 +5,9 @@ from fastapi import HTTPException
 from fastapi import status as http_status
 
 from app.core.database import get_supabase
+from app.core.deps import invalidate_principal
 from app.core.sanitize import sanitize_plain
+from app.services.novel_service import invalidate_novel
 
 
 def list_users(limit: int = 50, offset: int = 0, search: Optional[str] = None) -> list[dict]:
@@ -27,6 +29,7 @@ def update_user_role(user_id: str, role: str) -> dict:
     result = get_supabase().table("users").update({"role": role}).eq("id", user_id).execute()
     if not result.data:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="User not found")
+    invalidate_principal(user_id)
     return result.data[0]
 
 
@@ -38,6 +41,7 @@ def ban_user(user_id: str, ban_until: Optional[datetime]) -> dict:
     result = get_supabase().table("users").update(payload).eq("id", user_id).execute()
     if not result.data:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="User not found")
+    invalidate_principal(user_id)
     return result.data[0]
 
 
@@ -48,6 +52,7 @@ def unban_user(user_id: str) -> dict:
     ).eq("id", user_id).execute()
     if not result.data:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="User not found")
+    invalidate_principal(user_id)
     return result.data[0]
 
 
@@ -56,6 +61,7 @@ def pin_novel(novel_id: str) -> dict:
     result = get_supabase().table("novels").update({"is_pinned": True}).eq("id", novel_id).execute()
     if not result.data:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Novel not found")
+    invalidate_novel(novel_id)
     return result.data[0]
 
 
@@ -64,6 +70,7 @@ def unpin_novel(novel_id: str) -> dict:
     result = get_supabase().table("novels").update({"is_pinned": False}).eq("id", novel_id).execute()
     if not result.data:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Novel not found")
+    invalidate_novel(novel_id)
     return result.data[0]
 
 
@@ -73,6 +80,7 @@ def force_delete_novel(novel_id: str) -> None:
     if not result.data:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Novel not found")
     get_supabase().table("novels").update({"is_deleted": True}).eq("id", novel_id).execute()
+    invalidate_novel(novel_id)
 
 
 def force_delete_comment(comment_id: str) -> None:
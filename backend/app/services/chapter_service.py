@@ -4,39 +4,40 @@ import bleach
 from fastapi import HTTPException
 from fastapi import status as http_status
 
-from app.core.database import get_supabase
+from app.core.database import get_async_supabase
 from app.models.chapter import ChapterCreate, ChapterUpdate
+from app.services import novel_service, view_counter_service
 
-LEVEL_THRESHOLDS = [0, 100, 500, 2000, 5000, 10_000, 30_000, 50_000, 70_000, 100_000]
 ALLOWED_TAGS: list[str] = []   # plain text - strip all HTML
 
 
-def _calculate_level(chapters_read: int) -> int:
-    level = 0
-    for i, threshold in enumerate(LEVEL_THRESHOLDS):
-        if chapters_read >= threshold:
-            level = i
-    return min(level, 9)
-
-
-def get_chapters_for_novel(novel_id: str) -> list[dict]:
-    result = get_supabase().table("chapters").select(
+async def get_chapters_for_novel(novel_id: str) -> list[dict]:
+    result = await get_async_supabase().table("chapters").select(
         "id, novel_id, chapter_number, title, word_count, status, "
         "publish_at, published_at, views, created_at, updated_at"
     ).eq("novel_id", novel_id).eq("is_deleted", False).order("chapter_number").execute()
     return result.data or []
 
 
-def get_chapter(novel_id: str, chapter_number: int) -> dict | None:
-    result = get_supabase().table("chapters").select("*").eq(
+async def get_chapter(novel_id: str, chapter_number: int) -> dict | None:
+    result = await get_async_supabase().table("chapters").select("*").eq(
         "novel_id", novel_id
     ).eq("chapter_number", chapter_number).eq("is_deleted", False).maybe_single().execute()
     return result.data
 
-def get_chapter_with_nav(novel_id: str, chapter_number: int, user: dict | None) -> dict:
-    chapter = get_chapter(novel_id, chapter_number)
+async def get_chapter_with_nav(novel_id: str, chapter_number: int, user: dict | None) -> dict:
+    """Chapter content plus prev/next navigation and novel title.
+
+    Served by the get_chapter_reader() DB function (migration 016) in one round trip;
+    prev/next come from an index lookup rather than the novel's full chapter list.
+    """
+    result = await get_async_supabase().rpc(
+        "get_chapter_reader", {"p_novel_id": novel_id, "p_chapter_number": chapter_number}
+    ).execute()
+    chapter = result.data
     if not chapter:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Chapter not found")
+    uploader_id = chapter.pop("novel_uploader_id", None)
 
     now = datetime.now(timezone.utc)
     publish_at = chapter.get("publish_at")
@@ -47,41 +48,23 @@ def get_chapter_with_nav(novel_id: str, chapter_number: int, user: dict | None)
                 raise HTTPException(status_code=http_status.HTTP_403_FORBIDDEN,
                                     detail="VIP Pro hoac VIP Max de doc som")
             is_vip = user.get("vip_tier") in ("pro", "max")
-            is_uploader = _is_novel_owner(novel_id, user["id"])
+            is_uploader = uploader_id is not None and uploader_id == user["id"]
             is_admin = user.get("role") == "admin"
             if not (is_vip or is_uploader or is_admin):
                 raise HTTPException(status_code=http_status.HTTP_403_FORBIDDEN,
                                     detail="VIP Pro hoac VIP Max de doc som")
 
-    supabase = get_supabase()
-    all_nums_result = supabase.table("chapters").select("chapter_number").eq(
-        "novel_id", novel_id
-    ).eq("status", "published").eq("is_deleted", False).order("chapter_number").execute()
-    all_nums = [r["chapter_number"] for r in (all_nums_result.data or [])]
-
-    prev_ch = None
-    next_ch = None
-    if chapter_number in all_nums:
-        idx = all_nums.index(chapter_number)
-        if idx > 0:
-            prev_ch = all_nums[idx - 1]
-        if idx < len(all_nums) - 1:
-            next_ch = all_nums[idx + 1]
+    return chapter
 
-    novel_result = supabase.table("novels").select("title").eq("id", novel_id).maybe_single().execute()
-    novel_title = novel_result.data["title"] if novel_result.data else None
 
-    return {**chapter, "prev_chapter": prev_ch, "next_chapter": next_ch, "novel_title": novel_title}
-
-
-def _is_novel_owner(novel_id: str, user_id: str) -> bool:
-    result = get_supabase().table("novels").select("id").eq("id", novel_id).eq(
+async def _is_novel_owner(novel_id: str, user_id: str) -> bool:
+    result = await get_async_supabase().table("novels").select("id").eq("id", novel_id).eq(
         "uploader_id", user_id
     ).maybe_single().execute()
     return result.data is not None
 
-def create_chapter(novel_id: str, data: ChapterCreate, uploader_id: str) -> dict:
-    if not _is_novel_owner(novel_id, uploader_id):
+async def create_chapter(novel_id: str, data: ChapterCreate, uploader_id: str) -> dict:
+    if not await _is_novel_owner(novel_id, uploader_id):
         raise HTTPException(status_code=http_status.HTTP_403_FORBIDDEN, detail="Not the novel owner")
     content = bleach.clean(data.content, tags=ALLOWED_TAGS, strip=True)
     word_count = len(content.split())
@@ -96,12 +79,13 @@ def create_chapter(novel_id: str, data: ChapterCreate, uploader_id: str) -> dict
     }
     if data.status == "published" and not data.publish_at:
         payload["published_at"] = datetime.now(timezone.utc).isoformat()
-    result = get_supabase().table("chapters").insert(payload).execute()
+    result = await get_async_supabase().table("chapters").insert(payload).execute()
+    novel_service.invalidate_novel(novel_id)   # triggers bump total_chapters / updated_at
     return result.data[0]
 
 
-def update_chapter(novel_id: str, chapter_number: int, data: ChapterUpdate, user_id: str) -> dict:
-    if not _is_novel_owner(novel_id, user_id):
+async def update_chapter(novel_id: str, chapter_number: int, data: ChapterUpdate, user_id: str) -> dict:
+    if not await _is_novel_owner(novel_id, user_id):
         raise HTTPException(status_code=http_status.HTTP_403_FORBIDDEN, detail="Not the novel owner")
     updates = data.model_dump(exclude_none=True)
     if "content" in updates:
@@ -110,87 +94,102 @@ def update_chapter(novel_id: str, chapter_number: int, data: ChapterUpdate, user
     if "publish_at" in updates and updates["publish_at"]:
         updates["publish_at"] = updates["publish_at"].isoformat()
     if updates.get("status") == "published":
-        existing = get_chapter(novel_id, chapter_number)
+        existing = await get_chapter(novel_id, chapter_number)
         if existing and not existing.get("published_at"):
             updates["published_at"] = datetime.now(timezone.utc).isoformat()
-    result = get_supabase().table("chapters").update(updates).eq(
+    result = await get_async_supabase().table("chapters").update(updates).eq(
         "novel_id", novel_id
     ).eq("chapter_number", chapter_number).execute()
+    novel_service.invalidate_novel(novel_id)
     return result.data[0]
 
 
-def soft_delete_chapter(novel_id: str, chapter_number: int, user_id: str) -> None:
-    if not _is_novel_owner(novel_id, user_id):
+async def soft_delete_chapter(novel_id: str, chapter_number: int, user_id: str) -> None:
+    if not await _is_novel_owner(novel_id, user_id):
         raise HTTPException(status_code=http_status.HTTP_403_FORBIDDEN, detail="Not the novel owner")
-    get_supabase().table("chapters").update({"is_deleted": True}).eq(
+    await get_async_supabase().table("chapters").update({"is_deleted": True}).eq(
         "novel_id", novel_id
     ).eq("chapter_number", chapter_number).execute()
+    novel_service.invalidate_novel(novel_id)
+
+# ── Reading-progress bitmap codec ──────────────────────────────
+# reading_progress.chapters_read_bitmap (migration 018) stores chapter n as
+# bit n % 8 of byte n // 8, least significant bit first - the numbering used
+# by Postgres get_bit/set_bit on BYTEA. PostgREST serialises BYTEA as "\x<hex>".
+
+def decode_read_bitmap(raw: str | bytes | None) -> bytes:
+    if not raw:
+        return b""
+    if isinstance(raw, bytes):
+        return raw
+    return bytes.fromhex(raw[2:] if raw.startswith("\\x") else raw)
+
+
+def encode_read_bitmap(chapters: set[int] | list[int]) -> bytes:
+    if not chapters:
+        return b""
+    bitmap = bytearray(max(chapters) // 8 + 1)
+    for n in chapters:
+        if n >= 0:
+            bitmap[n >> 3] |= 1 << (n & 7)
+    return bytes(bitmap)
+
+
+def bitmap_has_chapter(bitmap: bytes, chapter_number: int) -> bool:
+    byte = chapter_number >> 3
+    return 0 <= byte < len(bitmap) and bool(bitmap[byte] & (1 << (chapter_number & 7)))
+
+
+def bitmap_to_ranges(bitmap: bytes) -> list[list[int]]:
+    """Read chapters as inclusive [first, last] runs, e.g. [[1, 120], [125, 125]]."""
+    ranges: list[list[int]] = []
+    for byte_index, byte in enumerate(bitmap):
+        if not byte:
+            continue
+        for bit in range(8):
+            if byte & (1 << bit):
+                n = (byte_index << 3) | bit
+                if ranges and ranges[-1][1] == n - 1:
+                    ranges[-1][1] = n
+                else:
+                    ranges.append([n, n])
+    return ranges
+
+
+async def mark_chapter_read(novel_id: str, chapter_number: int, user_id: str) -> dict:
+    """Set one bit in the reader's progress bitmap via record_chapter_read() (migration 018).
+
+    Only the chapter number travels over the wire; the DB reports whether it was a
+    first read so view counters are bumped once per user and chapter. The RPC
+    returns nothing for a chapter that is not published (migration 027).
+    """
+    result = await get_async_supabase().rpc(
+        "record_chapter_read",
+        {"p_user_id": user_id, "p_novel_id": novel_id, "p_chapter_number": chapter_number},
+    ).execute()
+    progress = result.data
+    if not progress:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Chapter not found")
+    if progress.pop("is_new", False):
+        view_counter_service.record_read(novel_id, chapter_number, user_id)
+    return progress
 
-def mark_chapter_read(novel_id: str, chapter_number: int, user_id: str) -> dict:
-    supabase = get_supabase()
-    progress_result = supabase.table("reading_progress").select("*").eq(
-        "user_id", user_id
-    ).eq("novel_id", novel_id).maybe_single().execute()
-    progress = progress_result.data
-
-    if progress is None:
-        new_progress = {
-            "user_id": user_id,
-            "novel_id": novel_id,
-            "last_chapter_read": chapter_number,
-            "chapters_read_list": [chapter_number],
-        }
-        result = supabase.table("reading_progress").insert(new_progress).execute()
-        progress = result.data[0]
-        chapters_delta = 1
-    else:
-        read_list: list[int] = progress.get("chapters_read_list") or []
-        is_new = chapter_number not in read_list
-        if is_new:
-            read_list.append(chapter_number)
-            chapters_delta = 1
-        else:
-            chapters_delta = 0
-        update_payload: dict = {"updated_at": datetime.now(timezone.utc).isoformat()}
-        if is_new:
-            update_payload["chapters_read_list"] = read_list
-        if chapter_number > progress.get("last_chapter_read", 0):
-            update_payload["last_chapter_read"] = chapter_number
-        result = supabase.table("reading_progress").update(update_payload).eq(
-            "user_id", user_id
-        ).eq("novel_id", novel_id).execute()
-        progress = result.data[0]
-
-    if chapters_delta > 0:
-        chapter = get_chapter(novel_id, chapter_number)
-        if chapter:
-            supabase.table("chapters").update(
-                {"views": chapter["views"] + 1}
-            ).eq("id", chapter["id"]).execute()
-            novel_result = supabase.table("novels").select("total_views").eq(
-                "id", novel_id
-            ).maybe_single().execute()
-            if novel_result.data:
-                supabase.table("novels").update(
-                    {"total_views": novel_result.data["total_views"] + 1}
-                ).eq("id", novel_id).execute()
-        user_result = supabase.table("users").select("chapters_read").eq(
-            "id", user_id
-        ).maybe_single().execute()
-        if user_result.data:
-            new_count = user_result.data["chapters_read"] + 1
-            new_level = _calculate_level(new_count)
-            supabase.table("users").update(
-                {"chapters_read": new_count, "level": new_level}
-            ).eq("id", user_id).execute()
 
-    return progress
+async def get_reading_progress(novel_id: str, user_id: str) -> dict:
+    result = await get_async_supabase().table("reading_progress").select(
+        "user_id, novel_id, last_chapter_read, chapters_read_count, chapters_read_bitmap, updated_at"
+    ).eq("user_id", user_id).eq("novel_id", novel_id).maybe_single().execute()
+    row = result.data if result else None
+    if not row:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="No reading progress")
+    bitmap = decode_read_bitmap(row.pop("chapters_read_bitmap", None))
+    return {**row, "chapters_read_ranges": bitmap_to_ranges(bitmap)}
 
 
-def get_user_library(user_id: str) -> list[dict]:
-    supabase = get_supabase()
-    result = supabase.table("reading_progress").select(
-        "novel_id, last_chapter_read, chapters_read_list, updated_at, "
+async def get_user_library(user_id: str) -> list[dict]:
+    supabase = get_async_supabase()
+    result = await supabase.table("reading_progress").select(
+        "novel_id, last_chapter_read, chapters_read_count, updated_at, "
         "novels(id, title, author, cover_url, status, total_chapters, updated_at)"
     ).eq("user_id", user_id).order("updated_at", desc=True).execute()
     items = []
@@ -49,7 +49,7 @@ def extract_characters(chapter_id: str, novel_id: str, chapter_number: int) -> N
     """Background task: extract characters from a chapter and upsert into the characters table.
 
     Silently skips if Gemini API key is not configured.
-    Never raises — all exceptions are caught and logged (BackgroundTask safety).
+    Failures are logged and re-raised so the job queue retries them.
     """
     if not settings.gemini_api_key:
         logger.warning("extract_characters skipped: GEMINI_API_KEY not configured")
@@ -113,3 +113,4 @@ def extract_characters(chapter_id: str, novel_id: str, chapter_number: int) -> N
 
     except Exception as exc:
         logger.exception("extract_characters failed for chapter %s: %s", chapter_id, exc)
+        raise
@@ -1,18 +1,19 @@
 """Chat with Characters service — RAG pipeline with SSE streaming (M17)."""
-import json
+import asyncio
 import logging
-from collections.abc import Generator
+from collections.abc import AsyncGenerator
 from datetime import datetime, timezone
 
 from fastapi import HTTPException
 
 from app.core.config import settings
-from app.core.database import get_supabase
-from app.core.qdrant import get_qdrant
+from app.core.database import get_async_supabase, get_supabase
+from app.core.gemini import stream_generate
+from app.core.qdrant import collection_for, get_async_qdrant, novel_filter
+from app.services.embedding_service import chunk_texts, embed_query
 
 logger = logging.getLogger(__name__)
 
-_EMBEDDING_MODEL = "models/text-embedding-004"
 _CHAT_MODEL = "gemini-2.0-flash"
 _TOP_K = 5
 _MAX_HISTORY_MESSAGES = 6  # last 3 exchanges kept in context
@@ -114,22 +115,60 @@ def list_sessions(user_id: str, novel_id: str) -> list[dict]:
 # RAG streaming pipeline
 # ---------------------------------------------------------------------------
 
-def stream_message(
+async def _load_session(sb, session_id: str, user_id: str) -> dict | None:
+    """get_session on the async client."""
+    result = await (
+        sb.table("chat_sessions")
+        .select("*")
+        .eq("id", session_id)
+        .eq("user_id", user_id)
+        .maybe_single()
+        .execute()
+    )
+    return result.data if result else None
+
+
+async def _load_persona(sb, character_id: str, user_id: str, novel_id: str) -> tuple[dict | None, int]:
+    """Character persona and the user's reading progress (chapter 0 if none), fetched concurrently."""
+    char_result, progress_result = await asyncio.gather(
+        sb.table("characters")
+        .select("name, description, traits")
+        .eq("id", character_id)
+        .maybe_single()
+        .execute(),
+        sb.table("reading_progress")
+        .select("last_chapter_read")
+        .eq("user_id", user_id)
+        .eq("novel_id", novel_id)
+        .maybe_single()
+        .execute(),
+    )
+    user_progress: int = 0
+    if progress_result and progress_result.data:
+        user_progress = progress_result.data.get("last_chapter_read") or 0
+    return (char_result.data if char_result else None), user_progress
+
+
+async def stream_message(
     session_id: str,
     user_id: str,
     content: str,
-) -> Generator[str, None, None]:
+) -> AsyncGenerator[str, None]:
     """RAG pipeline that streams SSE tokens.
 
     Yields Server-Sent Event strings ("data: <token>\\n\\n").
     Yields "data: [DONE]\\n\\n" when complete.
     Yields "data: [ERROR] <msg>\\n\\n" on failure and then stops.
     Never raises — safe for FastAPI StreamingResponse.
+
+    An async generator: the Supabase queries, embed, search and Gemini stream
+    are all awaited, so an open chat costs a coroutine rather than a
+    threadpool worker.
     """
-    sb = get_supabase()
+    sb = get_async_supabase()
 
     # 1. Validate session ownership
-    session = get_session(session_id, user_id)
+    session = await _load_session(sb, session_id, user_id)
     if not session:
         yield "data: [ERROR] Session not found\n\n"
         return
@@ -137,84 +176,43 @@ def stream_message(
     novel_id = session["novel_id"]
     character_id = session["character_id"]
 
-    # 2. Fetch character persona
-    char_result = (
-        sb.table("characters")
-        .select("name, description, traits")
-        .eq("id", character_id)
-        .maybe_single()
-        .execute()
-    )
-    if not char_result.data:
+    # 2. Fetch character persona and reading progress (for spoiler prevention)
+    character, user_progress = await _load_persona(sb, character_id, user_id, novel_id)
+    if not character:
         yield "data: [ERROR] Character not found\n\n"
         return
-    character = char_result.data
     char_name: str = character.get("name", "Nhân vật")
     char_desc: str = character.get("description") or ""
     char_traits: list[str] = character.get("traits") or []
 
-    # 3. Get user reading progress for spoiler prevention
-    progress_result = (
-        sb.table("reading_progress")
-        .select("last_chapter_read")
-        .eq("user_id", user_id)
-        .eq("novel_id", novel_id)
-        .maybe_single()
-        .execute()
-    )
-    user_progress: int = 0
-    if progress_result.data:
-        user_progress = progress_result.data.get("last_chapter_read") or 0
-
-    # 4. Embed query & search Qdrant (if configured)
+    # 3. Embed query & search Qdrant (if configured)
     context_chunks: list[str] = []
-    qdrant = get_qdrant()
+    qdrant = get_async_qdrant()
     if qdrant and settings.gemini_api_key and settings.qdrant_url:
         try:
-            import google.generativeai as genai
-            from qdrant_client.models import FieldCondition, Filter, Range
-
-            genai.configure(api_key=settings.gemini_api_key)
-            embed_result = genai.embed_content(
-                model=_EMBEDDING_MODEL,
-                content=content,
-                task_type="RETRIEVAL_QUERY",
-            )
-            query_vector: list[float] = embed_result["embedding"]
+            from qdrant_client.models import FieldCondition, Range
 
-            collection_name = f"novel_{novel_id}"
-            search_results = qdrant.search(
-                collection_name=collection_name,
+            query_vector = await embed_query(content)
+
+            search_results = await qdrant.search(
+                collection_name=collection_for(novel_id),
                 query_vector=query_vector,
                 limit=_TOP_K,
-                query_filter=Filter(
-                    must=[
-                        FieldCondition(
-                            key="chapter_number",
-                            range=Range(lte=user_progress),
-                        )
-                    ]
+                query_filter=novel_filter(
+                    novel_id,
+                    FieldCondition(
+                        key="chapter_number",
+                        range=Range(lte=user_progress),
+                    ),
                 ),
             )
 
-            # 5. Fetch content_preview for each matched chunk
-            vector_ids = [str(hit.id) for hit in search_results]
-            if vector_ids:
-                chunks_result = (
-                    sb.table("novel_embeddings")
-                    .select("content_preview")
-                    .in_("vector_id", vector_ids)
-                    .execute()
-                )
-                context_chunks = [
-                    row["content_preview"]
-                    for row in (chunks_result.data or [])
-                    if row.get("content_preview")
-                ]
+            # 4. Chunk text comes back in the hit payloads
+            context_chunks = await chunk_texts(sb, search_results)
         except Exception as exc:
             logger.warning("RAG search failed (continuing without context): %s", exc)
 
-    # 6. Build Gemini prompt
+    # 5. Build Gemini prompt
     traits_str = ", ".join(char_traits) if char_traits else "không rõ"
     system_prompt = (
         f"Bạn là {char_name}. {char_desc} "
@@ -246,7 +244,7 @@ def stream_message(
         f"\n{char_name}:"
     )
 
-    # 7. Stream Gemini response
+    # 6. Stream Gemini response
     if not settings.gemini_api_key:
         yield "data: [ERROR] AI service not configured\n\n"
         return
@@ -257,9 +255,7 @@ def stream_message(
 
         genai.configure(api_key=settings.gemini_api_key)
         model = genai.GenerativeModel(_CHAT_MODEL)
-        response = model.generate_content(full_prompt, stream=True)
-
-        for chunk in response:
+        async for chunk in stream_generate(model, full_prompt):
             token = chunk.text or ""
             if token:
                 full_response += token
@@ -272,16 +268,14 @@ def stream_message(
         yield "data: [ERROR] AI generation failed\n\n"
         return
 
-    # 8. Persist both messages to chat_sessions.messages
+    # 7. Persist both messages to chat_sessions.messages
     now_iso = datetime.now(timezone.utc).isoformat()
     new_messages = list(history) + [
         {"role": "user", "content": content, "created_at": now_iso},
         {"role": "assistant", "content": full_response, "created_at": now_iso},
     ]
     try:
-        sb.table("chat_sessions").update(
-            {"messages": new_messages}
-        ).eq("id", session_id).execute()
+        await sb.table("chat_sessions").update({"messages": new_messages}).eq("id", session_id).execute()
     except Exception as exc:
         logger.warning("Failed to persist chat messages for session %s: %s", session_id, exc)
 
@@ -118,7 +118,7 @@ def translate_queue_item(item_id: str, method: str, user_id: str) -> dict:
     return result.data[0]
 
 
-def publish_queue_item(item_id: str, user_id: str) -> dict:
+async def publish_queue_item(item_id: str, user_id: str) -> dict:
     from app.models.chapter import ChapterCreate
     from app.services.chapter_service import create_chapter
 
@@ -139,7 +139,7 @@ def publish_queue_item(item_id: str, user_id: str) -> dict:
         content=content,
         status="published",
     )
-    chapter = create_chapter(item["novel_id"], chapter_data, user_id)
+    chapter = await create_chapter(item["novel_id"], chapter_data, user_id)
 
     # Mark queue item as published
     get_supabase().table("crawl_queue").update(
@@ -1,17 +1,35 @@
 """Embedding pipeline: chunk chapter → embed via Gemini → upsert into Qdrant."""
+import hashlib
 import logging
+import queue
+import threading
+import time
+import unicodedata
 import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
 
+from app.core.cache import get_cache
 from app.core.config import settings
 from app.core.database import get_supabase
-from app.core.qdrant import get_qdrant
+from app.core.gemini import RequestBudget, call_with_backoff, get_genai
+from app.core.qdrant import collection_for, ensure_collection, get_qdrant
 
 logger = logging.getLogger(__name__)
 
 _EMBEDDING_MODEL = "models/text-embedding-004"
-_VECTOR_DIMENSION = 768
 _MAX_CHUNK_CHARS = 1500
 _CONTENT_PREVIEW_CHARS = 200
+_POINT_NAMESPACE = uuid.UUID("4840b112-6ee0-59aa-8a42-7761def96793")  # uuid5(URL, "novelverse:novel_embeddings")
+
+# A question's vector depends only on its text, so "Ai là X?" asked by every
+# reader of a novel is embedded once. Hit rate shows up at /admin/cache/stats.
+_query_cache = get_cache(
+    "query_embeddings", settings.query_embed_cache_max_entries, settings.query_embed_cache_ttl_seconds
+)
 
 
 def _chunk_content(text: str) -> list[str]:
@@ -60,49 +78,207 @@ def _chunk_content(text: str) -> list[str]:
     return [c for c in chunks if c]
 
 
-def _ensure_collection(qdrant_client, collection_name: str) -> None:
-    """Create the Qdrant collection for a novel if it does not exist yet."""
-    from qdrant_client.models import Distance, VectorParams
+def _content_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode()).hexdigest()
+
+
+def _point_id(chapter_id: str, chunk_index: int, content_hash: str) -> str:
+    """Deterministic Qdrant point ID: re-embedding the same chunk overwrites its point."""
+    return str(uuid.uuid5(_POINT_NAMESPACE, f"{chapter_id}:{chunk_index}:{content_hash}"))
+
 
-    existing = {c.name for c in qdrant_client.get_collections().collections}
-    if collection_name not in existing:
-        qdrant_client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=_VECTOR_DIMENSION, distance=Distance.COSINE),
+def _normalize_query(text: str) -> str:
+    """Fold variants of one question together: Unicode form, case, spacing, end punctuation."""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split()).casefold().rstrip("?!.… ")
+
+
+async def embed_query(text: str) -> list[float]:
+    """RETRIEVAL_QUERY vector for a chat message or Q&A question, cached by normalised text."""
+    query = _normalize_query(text) or text
+    vector = _query_cache.get(query)
+    if vector is None:
+        result = await get_genai().embed_content_async(
+            model=_EMBEDDING_MODEL, content=query, task_type="RETRIEVAL_QUERY"
         )
-        logger.info("Created Qdrant collection: %s", collection_name)
+        vector = result["embedding"]
+        _query_cache.set(query, vector)
+    return vector
+
+
+async def chunk_texts(sb, hits) -> list[str]:
+    """Chunk text for Qdrant search hits, best match first.
+
+    Points carry their chunk text in the payload, so a search returns usable
+    context directly. Points written before that fall back to the 200-char
+    content_preview in novel_embeddings until their chunk is re-embedded;
+    `sb` is the async client (get_async_supabase) for that lookup.
+    """
+    texts: dict[str, str] = {}
+    legacy_ids = []
+    for hit in hits:
+        text = (hit.payload or {}).get("text")
+        if text:
+            texts[str(hit.id)] = text
+        else:
+            legacy_ids.append(str(hit.id))
+    if legacy_ids:
+        rows = (
+            await sb.table("novel_embeddings")
+            .select("vector_id, content_preview")
+            .in_("vector_id", legacy_ids)
+            .execute()
+        ).data or []
+        texts.update((row["vector_id"], row["content_preview"]) for row in rows if row.get("content_preview"))
+    return [texts[str(hit.id)] for hit in hits if str(hit.id) in texts]
+
+
+@lru_cache(maxsize=1)
+def _embed_budget() -> RequestBudget:
+    return RequestBudget(settings.gemini_embed_rpm)
+
+
+@lru_cache(maxsize=1)
+def _embed_executor() -> ThreadPoolExecutor:
+    """Process-wide pool, so concurrent embed_chapter tasks share the concurrency cap."""
+    return ThreadPoolExecutor(max_workers=settings.gemini_embed_concurrency, thread_name_prefix="embed")
+
+
+def _embed_batch(texts: list[str]) -> list[list[float]]:
+    """One batch embed request for up to gemini_embed_batch_size texts."""
+    genai = get_genai()
+    result = call_with_backoff(
+        lambda: genai.embed_content(model=_EMBEDDING_MODEL, content=texts, task_type="RETRIEVAL_DOCUMENT"),
+        budget=_embed_budget(),
+    )
+    return result["embedding"]
 
 
 def _embed_texts(texts: list[str]) -> list[list[float]]:
     """Embed a list of texts using Gemini text-embedding-004.
 
-    Returns a list of 768-dimensional float vectors.
+    Texts are sent in batches of gemini_embed_batch_size; batches run on a shared
+    pool of gemini_embed_concurrency threads, paced by the gemini_embed_rpm budget.
+    Returns a list of 768-dimensional float vectors in input order.
     """
-    import google.generativeai as genai
-
-    genai.configure(api_key=settings.gemini_api_key)
-    vectors = []
-    for text in texts:
-        result = genai.embed_content(
-            model=_EMBEDDING_MODEL,
-            content=text,
-            task_type="RETRIEVAL_DOCUMENT",
-        )
-        vectors.append(result["embedding"])
+    size = settings.gemini_embed_batch_size
+    batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+    if len(batches) <= 1:
+        return _embed_batch(texts) if texts else []
+    vectors: list[list[float]] = []
+    for batch_vectors in _embed_executor().map(_embed_batch, batches):
+        vectors.extend(batch_vectors)
     return vectors
 
 
+@dataclass
+class _ChapterPlan:
+    """What re-embedding one chapter involves, diffed against novel_embeddings."""
+    chapter: dict
+    chunks: list[str]
+    hashes: list[str]
+    point_ids: list[str]
+    changed: list[int]          # chunk indexes to embed and upsert
+    stale_ids: list[str]        # points replaced or no longer backed by a chunk
+    has_removed: bool           # rows exist past the chapter's last chunk
+
+
+def _plan_chapter(chapter: dict, existing: list[dict]) -> _ChapterPlan:
+    """A chunk whose text hash is unchanged keeps its point; everything else is embedded afresh."""
+    chunks = _chunk_content(chapter.get("content") or "")
+    hashes = [_content_hash(chunk) for chunk in chunks]
+    point_ids = [_point_id(chapter["id"], i, h) for i, h in enumerate(hashes)]
+    existing_ids = {row["chunk_index"]: row["vector_id"] for row in existing}
+    return _ChapterPlan(
+        chapter=chapter,
+        chunks=chunks,
+        hashes=hashes,
+        point_ids=point_ids,
+        changed=[i for i, point_id in enumerate(point_ids) if existing_ids.get(i) != point_id],
+        stale_ids=[
+            vector_id for i, vector_id in existing_ids.items()
+            if i >= len(chunks) or vector_id != point_ids[i]
+        ],
+        has_removed=any(i >= len(chunks) for i in existing_ids),
+    )
+
+
+def _write_plans(sb, qdrant, collection_name: str, novel_id: str,
+                 plans: list[_ChapterPlan], vectors: list[list[float]]) -> None:
+    """Upsert the embedded chunks of `plans` (vectors in plan/changed order) and drop stale ones.
+
+    One Qdrant upsert, one novel_embeddings upsert and one Qdrant delete cover
+    every chapter in the batch.
+    """
+    from qdrant_client.models import PointIdsList, PointStruct
+
+    points, records = [], []
+    it = iter(vectors)
+    for plan in plans:
+        chapter = plan.chapter
+        for i in plan.changed:
+            points.append(
+                PointStruct(
+                    id=plan.point_ids[i],
+                    vector=next(it),
+                    payload={
+                        "novel_id": novel_id,
+                        "chapter_id": chapter["id"],
+                        "chapter_number": chapter["chapter_number"],
+                        "chunk_index": i,
+                        "text": plan.chunks[i],
+                    },
+                )
+            )
+            records.append({
+                "chapter_id": chapter["id"],
+                "chunk_index": i,
+                "content_preview": plan.chunks[i][:_CONTENT_PREVIEW_CHARS],
+                "vector_id": plan.point_ids[i],
+                "content_hash": plan.hashes[i],
+            })
+    if points:
+        qdrant.upsert(collection_name=collection_name, points=points)
+        sb.table("novel_embeddings").upsert(
+            records,
+            on_conflict="chapter_id,chunk_index",
+        ).execute()
+
+    # Drop points replaced above and rows for chunks a chapter no longer has
+    stale_ids = [vector_id for plan in plans for vector_id in plan.stale_ids]
+    if stale_ids:
+        qdrant.delete(collection_name=collection_name, points_selector=PointIdsList(points=stale_ids))
+    for plan in plans:
+        if plan.has_removed:
+            sb.table("novel_embeddings").delete().eq(
+                "chapter_id", plan.chapter["id"]
+            ).gte("chunk_index", len(plan.chunks)).execute()
+
+    if points or stale_ids:
+        from app.services.story_intelligence_service import invalidate_qa_answers
+        invalidate_qa_answers(novel_id)   # cached Q&A answers predate this text
+
+
+def _embedding_configured(task: str) -> bool:
+    if not settings.gemini_api_key:
+        logger.warning("%s skipped: GEMINI_API_KEY not configured", task)
+        return False
+    if not settings.qdrant_url:
+        logger.warning("%s skipped: QDRANT_URL not configured", task)
+        return False
+    return True
+
+
 def embed_chapter(chapter_id: str, novel_id: str) -> None:
     """Background task: chunk chapter content, embed via Gemini, upsert into Qdrant + DB.
 
+    Only chunks whose content hash changed since the last run are embedded;
+    points for replaced or removed chunks are deleted.
+
     Silently skips if Gemini API key or Qdrant URL is not configured.
-    Never raises — all exceptions are caught and logged (BackgroundTask safety).
+    Failures are logged and re-raised so the job queue retries them.
     """
-    if not settings.gemini_api_key:
-        logger.warning("embed_chapter skipped: GEMINI_API_KEY not configured")
-        return
-    if not settings.qdrant_url:
-        logger.warning("embed_chapter skipped: QDRANT_URL not configured")
+    if not _embedding_configured("embed_chapter"):
         return
 
     qdrant = get_qdrant()
@@ -121,66 +297,251 @@ def embed_chapter(chapter_id: str, novel_id: str) -> None:
             logger.warning("embed_chapter: chapter %s not found", chapter_id)
             return
         chapter = result.data
-        content = chapter.get("content", "")
-        if not content.strip():
+        if not (chapter.get("content") or "").strip():
             logger.warning("embed_chapter: chapter %s has empty content", chapter_id)
             return
 
-        # 2. Chunk
-        chunks = _chunk_content(content)
-        if not chunks:
+        # 2. Chunk and diff against what is already embedded
+        existing = sb.table("novel_embeddings").select(
+            "chunk_index, vector_id"
+        ).eq("chapter_id", chapter_id).execute().data or []
+        plan = _plan_chapter(chapter, existing)
+        if not plan.chunks:
+            return
+        if not plan.changed and not plan.stale_ids:
+            logger.info("embed_chapter: chapter %s unchanged (%d chunks)", chapter_id, len(plan.chunks))
             return
 
-        # 3. Embed via Gemini
-        vectors = _embed_texts(chunks)
-
-        # 4. Ensure Qdrant collection exists
-        collection_name = f"novel_{novel_id}"
-        _ensure_collection(qdrant, collection_name)
-
-        # 5. Upsert vectors into Qdrant
-        from qdrant_client.models import PointStruct
-
-        points = []
-        point_ids = []
-        for i, (chunk, vector) in enumerate(zip(chunks, vectors)):
-            point_id = str(uuid.uuid4())
-            point_ids.append(point_id)
-            points.append(
-                PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload={
-                        "novel_id": novel_id,
-                        "chapter_id": chapter_id,
-                        "chapter_number": chapter["chapter_number"],
-                        "chunk_index": i,
-                    },
-                )
-            )
-        qdrant.upsert(collection_name=collection_name, points=points)
+        # 3. Ensure Qdrant collection exists
+        collection_name = collection_for(novel_id)
+        ensure_collection(qdrant, collection_name)
 
-        # 6. Upsert chunk records into novel_embeddings
-        records = [
-            {
-                "chapter_id": chapter_id,
-                "chunk_index": i,
-                "content_preview": chunk[:_CONTENT_PREVIEW_CHARS],
-                "vector_id": point_ids[i],
-            }
-            for i, chunk in enumerate(chunks)
-        ]
-        sb.table("novel_embeddings").upsert(
-            records,
-            on_conflict="chapter_id,chunk_index",
-        ).execute()
+        # 4. Embed changed chunks via Gemini, upsert them, drop stale points
+        vectors = _embed_texts([plan.chunks[i] for i in plan.changed]) if plan.changed else []
+        _write_plans(sb, qdrant, collection_name, novel_id, [plan], vectors)
 
         logger.info(
-            "embed_chapter: chapter %s → %d chunks → collection %s",
+            "embed_chapter: chapter %s → %d chunks (%d embedded, %d stale removed) → collection %s",
             chapter_id,
-            len(chunks),
+            len(plan.chunks),
+            len(plan.changed),
+            len(plan.stale_ids),
             collection_name,
         )
 
     except Exception as exc:
         logger.exception("embed_chapter failed for chapter %s: %s", chapter_id, exc)
+        raise
+
+
+# ── Novel-wide backfill ──────────────────────────────────────────────────────
+#
+# fetch pages ──▶ [pages queue] ──▶ chunk + diff + embed ──▶ [writes queue] ──▶ upsert + checkpoint
+#
+# Three stages on their own threads, joined by bounded queues: a slow stage
+# fills its input queue and blocks the one before it, so at most
+# embed_backfill_prefetch pages are held in memory on either side of the
+# embedding step. The checkpoint advances only after a page is written.
+
+_STOP = object()
+_QUEUE_POLL_SECONDS = 0.2
+
+
+class _BackfillAborted(Exception):
+    pass
+
+
+def _put(q: queue.Queue, item, check: Callable[[], None]) -> None:
+    while True:
+        try:
+            q.put(item, timeout=_QUEUE_POLL_SECONDS)
+            return
+        except queue.Full:
+            check()
+
+
+def _get(q: queue.Queue, check: Callable[[], None]):
+    while True:
+        try:
+            return q.get(timeout=_QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            check()
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def get_backfill(novel_id: str) -> dict | None:
+    result = get_supabase().table("embedding_backfills").select("*").eq(
+        "novel_id", novel_id
+    ).maybe_single().execute()
+    return result.data if result else None
+
+
+def reset_backfill(novel_id: str, restart: bool = False) -> dict:
+    """Prepare the checkpoint row for a new run.
+
+    A failed run resumes from its checkpoint unless `restart`; a completed one
+    starts over (unchanged chunks are skipped by their content hash).
+    """
+    current = get_backfill(novel_id)
+    row: dict = {"novel_id": novel_id, "status": "queued", "last_error": None,
+                 "finished_at": None, "updated_at": _now_iso()}
+    if restart or current is None or current["status"] == "completed":
+        # -1 so the first page includes a chapter 0 (migration 029)
+        row.update(last_chapter_number=-1, chapters_done=0, chunks_embedded=0, chunks_skipped=0,
+                   chapters_per_minute=None, eta_seconds=None, started_at=None)
+    result = get_supabase().table("embedding_backfills").upsert(row, on_conflict="novel_id").execute()
+    return result.data[0]
+
+
+def _fetch_pages(novel_id: str, after: int, out: queue.Queue, check: Callable[[], None]) -> None:
+    """Stage 1: page published chapters in chapter_number order after the checkpoint."""
+    sb = get_supabase()
+    page_size = settings.embed_backfill_page_size
+    while True:
+        rows = sb.table("chapters").select(
+            "id, chapter_number, content"
+        ).eq("novel_id", novel_id).eq("status", "published").eq("is_deleted", False).gt(
+            "chapter_number", after
+        ).order("chapter_number").limit(page_size).execute().data or []
+        if rows:
+            _put(out, rows, check)
+            after = rows[-1]["chapter_number"]
+        if len(rows) < page_size:
+            _put(out, _STOP, check)
+            return
+
+
+def _embed_page(sb, chapters: list[dict]) -> tuple[list[_ChapterPlan], list[list[float]]]:
+    """Stage 2: diff a page against novel_embeddings and embed every changed chunk in it."""
+    existing = sb.table("novel_embeddings").select(
+        "chapter_id, chunk_index, vector_id"
+    ).in_("chapter_id", [c["id"] for c in chapters]).execute().data or []
+    by_chapter: dict[str, list[dict]] = {}
+    for row in existing:
+        by_chapter.setdefault(row["chapter_id"], []).append(row)
+    plans = [_plan_chapter(chapter, by_chapter.get(chapter["id"], [])) for chapter in chapters]
+    texts = [plan.chunks[i] for plan in plans for i in plan.changed]
+    return plans, _embed_texts(texts) if texts else []
+
+
+def _write_pages(novel_id: str, collection_name: str, progress: dict,
+                 inbox: queue.Queue, check: Callable[[], None]) -> None:
+    """Stage 3: write each embedded page, then advance the checkpoint and report throughput."""
+    sb = get_supabase()
+    qdrant = get_qdrant()
+    started = time.monotonic()
+    done_this_run = 0
+
+    def drained() -> None:
+        # Pages embedded before an abort are still written, so their work is checkpointed.
+        if inbox.empty():
+            check()
+
+    while True:
+        item = _get(inbox, drained)
+        if item is _STOP:
+            return
+        plans, vectors = item
+        _write_plans(sb, qdrant, collection_name, novel_id, plans, vectors)
+
+        embedded = sum(len(plan.changed) for plan in plans)
+        done_this_run += len(plans)
+        progress["chapters_done"] += len(plans)
+        progress["chunks_embedded"] += embedded
+        progress["chunks_skipped"] += sum(len(plan.chunks) for plan in plans) - embedded
+        progress["last_chapter_number"] = plans[-1].chapter["chapter_number"]
+        rate = done_this_run / max(time.monotonic() - started, 1e-6) * 60
+        remaining = max(progress["chapters_total"] - progress["chapters_done"], 0)
+        progress["chapters_per_minute"] = round(rate, 2)
+        progress["eta_seconds"] = int(remaining / rate * 60) if rate else None
+        _save_progress(sb, novel_id, progress)
+        logger.info(
+            "backfill %s: %d/%d chapters (%.1f/min, ETA %ss)",
+            novel_id, progress["chapters_done"], progress["chapters_total"],
+            rate, progress["eta_seconds"],
+        )
+
+
+_PROGRESS_FIELDS = (
+    "status", "last_chapter_number", "chapters_done", "chapters_total", "chunks_embedded",
+    "chunks_skipped", "chapters_per_minute", "eta_seconds", "last_error", "started_at", "finished_at",
+)
+
+
+def _save_progress(sb, novel_id: str, progress: dict) -> None:
+    fields = {k: progress[k] for k in _PROGRESS_FIELDS if k in progress}
+    sb.table("embedding_backfills").update({**fields, "updated_at": _now_iso()}).eq(
+        "novel_id", novel_id
+    ).execute()
+
+
+def backfill_novel_embeddings(novel_id: str) -> None:
+    """Job: embed every published chapter of a novel, resuming from its checkpoint.
+
+    Chapters are read in pages of embed_backfill_page_size; each page's changed
+    chunks go to Gemini as one batched _embed_texts call and to Qdrant as one
+    upsert. Failures mark the backfill failed and re-raise for the job queue,
+    whose retry resumes after the last written page.
+    """
+    if not _embedding_configured("backfill_novel_embeddings"):
+        return
+    qdrant = get_qdrant()
+    if qdrant is None:
+        logger.warning("backfill_novel_embeddings skipped: Qdrant client unavailable")
+        return
+
+    sb = get_supabase()
+    progress = get_backfill(novel_id) or reset_backfill(novel_id)
+    novel = sb.table("novels").select("total_chapters").eq("id", novel_id).maybe_single().execute()
+    progress.update(
+        status="running",
+        chapters_total=(novel.data or {}).get("total_chapters", 0) if novel else 0,
+        started_at=progress.get("started_at") or _now_iso(),
+        last_error=None,
+    )
+    _save_progress(sb, novel_id, progress)
+
+    collection_name = collection_for(novel_id)
+    depth = settings.embed_backfill_prefetch
+    pages: queue.Queue = queue.Queue(maxsize=depth)
+    writes: queue.Queue = queue.Queue(maxsize=depth)
+    abort = threading.Event()
+
+    def aborted() -> None:
+        if abort.is_set():
+            raise _BackfillAborted()
+
+    try:
+        ensure_collection(qdrant, collection_name)
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="backfill") as pool:
+            fetcher = pool.submit(_fetch_pages, novel_id, progress["last_chapter_number"], pages, aborted)
+            writer = pool.submit(_write_pages, novel_id, collection_name, progress, writes, aborted)
+
+            def peers_alive() -> None:
+                for stage in (fetcher, writer):
+                    if stage.done() and stage.exception() is not None:
+                        raise stage.exception()
+
+            try:
+                while (page := _get(pages, peers_alive)) is not _STOP:
+                    _put(writes, _embed_page(sb, page), peers_alive)
+                _put(writes, _STOP, peers_alive)
+                writer.result()
+            except BaseException:
+                abort.set()
+                raise
+    except Exception as exc:
+        logger.exception("backfill_novel_embeddings failed for novel %s: %s", novel_id, exc)
+        progress.update(status="failed", last_error=f"{type(exc).__name__}: {exc}")
+        _save_progress(sb, novel_id, progress)
+        raise
+
+    progress.update(status="completed", eta_seconds=0, finished_at=_now_iso())
+    _save_progress(sb, novel_id, progress)
+    logger.info(
+        "backfill %s complete: %d chapters, %d chunks embedded, %d unchanged",
+        novel_id, progress["chapters_done"], progress["chunks_embedded"], progress["chunks_skipped"],
+    )
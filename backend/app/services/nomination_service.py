@@ -3,7 +3,9 @@ from datetime import date
 
 from fastapi import HTTPException
 from fastapi import status as http_status
+from fastapi.concurrency import run_in_threadpool
 
+from app.core.cache import get_cache
 from app.core.database import get_supabase
 from app.core.redis import get_redis
 
@@ -13,6 +15,9 @@ _DAILY_ALLOWANCE = {"none": 3, "pro": 5, "max": 10}
 # Redis key TTLs (seconds)
 _TTL = {"daily": 172_800, "weekly": 1_209_600, "monthly": 5_184_000}
 
+# Leaderboards are read on every homepage load but tolerate a minute of lag.
+_leaderboard_cache = get_cache("leaderboards", 32, 60.0, shared=True)
+
 
 # ---------------------------------------------------------------------------
 # Internal helpers
@@ -180,17 +185,20 @@ def get_nomination_status(user_id: str, novel_id: str) -> dict:
     }
 
 
-def get_leaderboard(period: str, limit: int = 20) -> dict:
-    """Return top-N novels by nomination score for the given period.
-
-    Tries Redis first; falls back to DB aggregation if Redis is unavailable or empty.
-    """
+async def get_leaderboard(period: str, limit: int = 20) -> dict:
+    """Return top-N novels by nomination score for the given period (cached for 60s)."""
     if period not in ("daily", "weekly", "monthly"):
         raise HTTPException(
             status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="period must be daily, weekly, or monthly",
         )
+    return await _leaderboard_cache.get_or_load(
+        (period, limit), lambda: run_in_threadpool(_load_leaderboard, period, limit)
+    )
+
 
+def _load_leaderboard(period: str, limit: int) -> dict:
+    """Tries Redis first; falls back to DB aggregation if Redis is unavailable or empty."""
     supabase = get_supabase()
     redis = get_redis()
 
@@ -2,33 +2,82 @@ import base64
 import json
 
 import bleach
+from fastapi import HTTPException
+from fastapi import status as http_status
 
-from app.core.database import get_supabase
+from app.core.cache import get_cache
+from app.core.config import settings
+from app.core.database import get_async_supabase
 from app.models.novel import NovelCreate, NovelUpdate
 
 ALLOWED_HTML_TAGS = ["p", "br", "strong", "em", "ul", "ol", "li"]
+MAX_TAG_FILTERS = 5   # each AND-ed tag is one more join
 
+# Homepage lists and novel detail are identical for every visitor between writes.
+# Writes below (and admin pin/unpin, chapter publishing) call invalidate_novel().
+_novel_cache = get_cache(
+    "novel_detail", settings.catalog_cache_max_entries, settings.catalog_cache_ttl_seconds, shared=True
+)
+_list_cache = get_cache("novel_lists", 64, settings.catalog_cache_ttl_seconds, shared=True)
+_tag_cache = get_cache("tags", 1, settings.tags_cache_ttl_seconds, shared=True)
 
-def _encode_cursor(updated_at: str, novel_id: str) -> str:
-    data = json.dumps({"updated_at": updated_at, "id": novel_id})
+
+def invalidate_novel(novel_id: str | None = None) -> None:
+    """Drop cached data a novel write can change: its detail and every homepage list."""
+    if novel_id is not None:
+        _novel_cache.invalidate(novel_id)
+    _list_cache.clear()
+
+
+def invalidate_tags() -> None:
+    _tag_cache.clear()
+
+
+def _encode_cursor(sort: str, sort_key, novel_id: str) -> str:
+    """Keyset position: the value of the active sort column plus id as tie-breaker."""
+    data = json.dumps({"sort": sort, "key": sort_key, "id": novel_id})
     return base64.b64encode(data.encode()).decode()
 
 
-def _decode_cursor(cursor: str) -> tuple[str, str]:
-    data = json.loads(base64.b64decode(cursor.encode()).decode())
-    return data["updated_at"], data["id"]
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        data = json.loads(base64.b64decode(cursor.encode()).decode())
+        if "sort" not in data and "updated_at" in data:
+            data = {"sort": "updated_at", "key": data["updated_at"], "id": data["id"]}   # legacy (updated_at, id) cursor
+        if data["sort"] != sort:
+            raise ValueError("cursor belongs to another sort order")
+        return data["key"], data["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
 
 
-def get_novels(
+async def get_novels(
     q: str | None = None,
-    tag_slug: str | None = None,
+    tag_slugs: list[str] | None = None,
+    tag_mode: str = "all",     # "all" (AND) | "any" (OR)
     status: str | None = None,
-    sort: str = "updated_at",   # "updated_at" | "total_views" | "avg_rating"
+    sort: str | None = None,   # "relevance" | "updated_at" | "total_views" | "avg_rating"
     cursor: str | None = None,
     limit: int = 20,
 ) -> dict:
-    """Returns {"items": [...], "next_cursor": str | None}"""
-    supabase = get_supabase()
+    """Returns {"items": [...], "next_cursor": str | None}
+
+    With q, novels are matched on search_vector and ranked by relevance unless
+    another sort is requested; without q, "relevance" falls back to updated_at.
+    Tag filters are joined server-side; tag_mode "all" requires every slug.
+    """
+    tag_slugs = list(dict.fromkeys(tag_slugs or []))
+    if len(tag_slugs) > MAX_TAG_FILTERS:
+        raise HTTPException(
+            status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {MAX_TAG_FILTERS} tags can be combined",
+        )
+    if q and q.strip():
+        return await _search_novels(q, tag_slugs, tag_mode, status, sort or "relevance", cursor, limit)
+    if sort in (None, "relevance"):
+        sort = "updated_at"
+
+    supabase = get_async_supabase()
 
     # Select novels with tags via join
     select_str = (
@@ -36,35 +85,39 @@ def get_novels(
         "total_chapters, total_views, avg_rating, rating_count, is_pinned, updated_at, "
         "novel_tags(tag_id, tags(id, name, slug))"
     )
+    # Tag filters are separate aliased !inner embeds, so they drop non-matching
+    # novels without trimming the novel_tags list we return.
+    filter_aliases: list[str] = []
+    if tag_slugs and tag_mode == "any":
+        filter_aliases = ["tf0"]
+    elif tag_slugs:
+        filter_aliases = [f"tf{i}" for i in range(len(tag_slugs))]
+    for alias in filter_aliases:
+        select_str += f", {alias}:novel_tags!inner(tags!inner(slug))"
 
     query = supabase.table("novels").select(select_str).eq("is_deleted", False)
 
-    if q:
-        # Full text search — use ilike on title as fallback for simplicity
-        # (text_search via PostgREST requires raw query)
-        query = query.ilike("title", f"%{q}%")
-
     if status:
         query = query.eq("status", status)
 
-    if tag_slug:
-        # Filter via novel_tags -> tags join
-        tag_result = supabase.table("tags").select("id").eq("slug", tag_slug).maybe_single().execute()
-        if tag_result.data:
-            tag_id = tag_result.data["id"]
-            novel_ids_result = supabase.table("novel_tags").select("novel_id").eq("tag_id", tag_id).execute()
-            ids = [r["novel_id"] for r in novel_ids_result.data]
-            if not ids:
-                return {"items": [], "next_cursor": None}
-            query = query.in_("id", ids)
+    if tag_slugs and tag_mode == "any":
+        query = query.in_("tf0.tags.slug", tag_slugs)
+    else:
+        for alias, slug in zip(filter_aliases, tag_slugs):
+            query = query.eq(f"{alias}.tags.slug", slug)
 
     if cursor:
-        cursor_updated_at, cursor_id = _decode_cursor(cursor)
-        # Cursor-based: items updated before cursor, or same time with smaller id
-        query = query.or_(f"updated_at.lt.{cursor_updated_at},and(updated_at.eq.{cursor_updated_at},id.lt.{cursor_id})")
+        cursor_key, cursor_id = _decode_cursor(cursor, sort)
+        # Keyset on (sort column, id). PostgREST cannot express a row comparison,
+        # so the plain lte bound is what lets the novels_*_keyset_idx indexes
+        # (migration 020) start the scan at the cursor; the or_ then drops the
+        # ties already served.
+        query = query.lte(sort, cursor_key).or_(
+            f'{sort}.lt."{cursor_key}",and({sort}.eq."{cursor_key}",id.lt."{cursor_id}")'
+        )
 
     query = query.order(sort, desc=True).order("id", desc=True).limit(limit + 1)
-    result = query.execute()
+    result = await query.execute()
     rows = result.data or []
 
     has_more = len(rows) > limit
@@ -74,18 +127,51 @@ def get_novels(
     for row in rows:
         raw_tags = row.pop("novel_tags", [])
         row["tags"] = [nt["tags"] for nt in raw_tags if nt.get("tags")]
+        for alias in filter_aliases:
+            row.pop(alias, None)
 
     next_cursor = None
     if has_more and rows:
         last = rows[-1]
-        next_cursor = _encode_cursor(last["updated_at"], last["id"])
+        next_cursor = _encode_cursor(sort, last[sort], last["id"])
 
     return {"items": rows, "next_cursor": next_cursor}
 
 
-def get_novel_by_id(novel_id: str) -> dict | None:
-    supabase = get_supabase()
-    result = supabase.table("novels").select(
+async def _search_novels(
+    q: str, tag_slugs: list[str], tag_mode: str, status: str | None, sort: str, cursor: str | None, limit: int
+) -> dict:
+    """Ranked full-text search through the search_novels() DB function (migrations 019, 021)."""
+    after_key, after_id = _decode_cursor(cursor, sort) if cursor else (None, None)
+    result = await get_async_supabase().rpc("search_novels", {
+        "p_query": q,
+        "p_sort": sort,
+        "p_status": status,
+        "p_tag_slugs": tag_slugs or None,
+        "p_tag_mode": tag_mode,
+        "p_after_key": after_key,
+        "p_after_id": after_id,
+        "p_limit": limit + 1,
+    }).execute()
+    rows = result.data or []
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    sort_keys = [row.pop("sort_key") for row in rows]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = _encode_cursor(sort, sort_keys[-1], rows[-1]["id"])
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+async def get_novel_by_id(novel_id: str) -> dict | None:
+    return await _novel_cache.get_or_load(novel_id, lambda: _load_novel(novel_id))
+
+
+async def _load_novel(novel_id: str) -> dict | None:
+    supabase = get_async_supabase()
+    result = await supabase.table("novels").select(
         "*, novel_tags(tag_id, tags(id, name, slug)), users!uploader_id(id, username, avatar_url)"
     ).eq("id", novel_id).eq("is_deleted", False).maybe_single().execute()
 
@@ -103,48 +189,55 @@ def get_novel_by_id(novel_id: str) -> dict | None:
     return row
 
 
-def create_novel(data: NovelCreate, uploader_id: str) -> dict:
-    supabase = get_supabase()
+async def create_novel(data: NovelCreate, uploader_id: str) -> dict:
+    supabase = get_async_supabase()
     payload = data.model_dump(exclude={"tag_ids"})
     if payload.get("description"):
         payload["description"] = bleach.clean(payload["description"], tags=ALLOWED_HTML_TAGS, strip=True)
     payload["uploader_id"] = uploader_id
 
-    result = supabase.table("novels").insert(payload).execute()
+    result = await supabase.table("novels").insert(payload).execute()
     novel = result.data[0]
 
     if data.tag_ids:
         tag_rows = [{"novel_id": novel["id"], "tag_id": tid} for tid in data.tag_ids]
-        supabase.table("novel_tags").insert(tag_rows).execute()
+        await supabase.table("novel_tags").insert(tag_rows).execute()
 
-    return get_novel_by_id(novel["id"])
+    invalidate_novel(novel["id"])
+    return await get_novel_by_id(novel["id"])
 
 
-def update_novel(novel_id: str, data: NovelUpdate) -> dict:
-    supabase = get_supabase()
+async def update_novel(novel_id: str, data: NovelUpdate) -> dict:
+    supabase = get_async_supabase()
     payload = data.model_dump(exclude={"tag_ids"}, exclude_none=True)
     if payload.get("description"):
         payload["description"] = bleach.clean(payload["description"], tags=ALLOWED_HTML_TAGS, strip=True)
 
     if payload:
-        supabase.table("novels").update(payload).eq("id", novel_id).execute()
+        await supabase.table("novels").update(payload).eq("id", novel_id).execute()
 
     if data.tag_ids is not None:
-        supabase.table("novel_tags").delete().eq("novel_id", novel_id).execute()
+        await supabase.table("novel_tags").delete().eq("novel_id", novel_id).execute()
         if data.tag_ids:
             tag_rows = [{"novel_id": novel_id, "tag_id": tid} for tid in data.tag_ids]
-            supabase.table("novel_tags").insert(tag_rows).execute()
+            await supabase.table("novel_tags").insert(tag_rows).execute()
+
+    invalidate_novel(novel_id)
+    return await get_novel_by_id(novel_id)
+
 
-    return get_novel_by_id(novel_id)
+async def soft_delete_novel(novel_id: str) -> None:
+    await get_async_supabase().table("novels").update({"is_deleted": True}).eq("id", novel_id).execute()
+    invalidate_novel(novel_id)
 
 
-def soft_delete_novel(novel_id: str) -> None:
-    get_supabase().table("novels").update({"is_deleted": True}).eq("id", novel_id).execute()
+async def get_featured_novels() -> list[dict]:
+    return await _list_cache.get_or_load("featured", _load_featured_novels)
 
 
-def get_featured_novels() -> list[dict]:
-    supabase = get_supabase()
-    result = supabase.table("novels").select(
+async def _load_featured_novels() -> list[dict]:
+    supabase = get_async_supabase()
+    result = await supabase.table("novels").select(
         "id, title, original_title, author, cover_url, status, uploader_id, "
         "total_chapters, total_views, avg_rating, rating_count, is_pinned, updated_at, "
         "novel_tags(tag_id, tags(id, name, slug))"
@@ -156,8 +249,12 @@ def get_featured_novels() -> list[dict]:
     return rows
 
 
-def get_recently_updated(limit: int = 12) -> list[dict]:
-    result = get_supabase().table("novels").select(
+async def get_recently_updated(limit: int = 12) -> list[dict]:
+    return await _list_cache.get_or_load(("recently_updated", limit), lambda: _load_recently_updated(limit))
+
+
+async def _load_recently_updated(limit: int) -> list[dict]:
+    result = await get_async_supabase().table("novels").select(
         "id, title, original_title, author, cover_url, status, uploader_id, "
         "total_chapters, total_views, avg_rating, rating_count, is_pinned, updated_at, "
         "novel_tags(tag_id, tags(id, name, slug))"
@@ -169,8 +266,12 @@ def get_recently_updated(limit: int = 12) -> list[dict]:
     return rows
 
 
-def get_recently_completed(limit: int = 12) -> list[dict]:
-    result = get_supabase().table("novels").select(
+async def get_recently_completed(limit: int = 12) -> list[dict]:
+    return await _list_cache.get_or_load(("recently_completed", limit), lambda: _load_recently_completed(limit))
+
+
+async def _load_recently_completed(limit: int) -> list[dict]:
+    result = await get_async_supabase().table("novels").select(
         "id, title, original_title, author, cover_url, status, uploader_id, "
         "total_chapters, total_views, avg_rating, rating_count, is_pinned, updated_at, "
         "novel_tags(tag_id, tags(id, name, slug))"
@@ -182,6 +283,10 @@ def get_recently_completed(limit: int = 12) -> list[dict]:
     return rows
 
 
-def get_all_tags() -> list[dict]:
-    result = get_supabase().table("tags").select("*").order("name").execute()
+async def get_all_tags() -> list[dict]:
+    return await _tag_cache.get_or_load("all", _load_all_tags)
+
+
+async def _load_all_tags() -> list[dict]:
+    result = await get_async_supabase().table("tags").select("*").order("name").execute()
     return result.data or []
@@ -1,18 +1,35 @@
 """Story Intelligence service — Relationship Graph, Timeline, Q&A, Arc Summaries (M19)."""
+import asyncio
+import hashlib
 import json
 import logging
-from collections.abc import Generator
+import math
+from collections import Counter
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+from typing import Any
 
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.cache import get_cache
 from app.core.config import settings
-from app.core.database import get_supabase
-from app.core.qdrant import get_qdrant
+from app.core.cooccurrence import NameMatcher, count_pairs
+from app.core.database import get_async_supabase, get_supabase
+from app.core.gemini import fan_out, generate, stream_generate
+from app.core.qdrant import collection_for, get_async_qdrant, novel_filter
+from app.services.embedding_service import chunk_texts, embed_query
 
 logger = logging.getLogger(__name__)
 
-_EMBEDDING_MODEL = "models/text-embedding-004"
 _CHAT_MODEL = "gemini-2.0-flash"
 _TOP_K = 5
 
+# Q&A has no spoiler filter, so an answer depends only on the novel and the
+# question. Each novel keeps its recent (question vector, answer) pairs; a new
+# question close enough to one of them replays that answer. Embedding new
+# chapters calls invalidate_qa_answers(), which reaches every replica.
+_qa_answer_cache = get_cache("qa_answers", 1_024, settings.qa_answer_cache_ttl_seconds, shared=True)
+
 
 # ---------------------------------------------------------------------------
 # Relationship graph helpers
@@ -58,85 +75,254 @@ def _mark_relationships_failed(novel_id: str) -> None:
         pass
 
 
-def compute_relationships_task(novel_id: str) -> None:
-    """Background task: extract character co-mentions via Gemini, build NetworkX graph.
+class _GraphConflict(Exception):
+    """Another run updated the relationship graph first."""
 
-    Never raises — safe for FastAPI BackgroundTasks.
-    """
-    if not settings.gemini_api_key:
-        _mark_relationships_failed(novel_id)
-        logger.warning("compute_relationships_task: gemini_api_key not set, marking failed")
-        return
-
-    try:
-        import google.generativeai as genai
-        import networkx as nx
-
-        genai.configure(api_key=settings.gemini_api_key)
-        model = genai.GenerativeModel(_CHAT_MODEL)
 
-        sb = get_supabase()
-        chapters_result = (
-            sb.table("chapters")
-            .select("chapter_number, content")
+def _extract_pairs(model, content: str) -> list[list[str]]:
+    """Character pairs Gemini finds interacting in one chapter, names sorted within a pair."""
+    prompt = (
+        "List pairs of characters who interact or appear together in this text. "
+        "Return a JSON array only, with no explanation: [[\"Name1\",\"Name2\"],...] "
+        "If no pairs found, return []. "
+        f"Text:\n{content[:3000]}"
+    )
+    response = generate(model, prompt)
+    raw = (response.text or "").strip()
+    # Strip markdown code fences if present
+    if raw.startswith("```"):
+        raw = raw.split("```")[1]
+        if raw.startswith("json"):
+            raw = raw[4:]
+    pairs = []
+    for pair in json.loads(raw):
+        if isinstance(pair, list) and len(pair) == 2:
+            a, b = str(pair[0]).strip(), str(pair[1]).strip()
+            if a and b and a != b:
+                pairs.append(sorted([a, b]))
+    return pairs
+
+
+def _edge_weights(graph: dict) -> Counter:
+    return Counter({
+        tuple(sorted([edge["source"], edge["target"]])): edge.get("weight", 1)
+        for edge in graph.get("edges") or []
+    })
+
+
+def _add_pairs(weights: Counter, pairs: list[list], sign: int = 1) -> None:
+    # Gemini pairs are [a, b] and weigh 1; co-occurrence pairs are [a, b, count]
+    for a, b, *count in pairs:
+        weights[(a, b)] += sign * (count[0] if count else 1)
+
+
+def _load_roster(sb, novel_id: str) -> tuple[NameMatcher | None, str | None]:
+    """Matcher over the novel's known characters and the md5 of the roster.
+
+    Returns (None, None) when fewer than two characters are known, in which
+    case chapters fall back to Gemini extraction. Otherwise the roster is
+    recorded with adopt_relationship_roster (migration 028), which carries
+    rows counted against an earlier roster over to this one unless their
+    chapter mentions a name that was added or removed, so only those
+    chapters come back from relationship_chapters_due.
+    """
+    rows = sb.table("characters").select("name").eq("novel_id", novel_id).execute().data or []
+    names = sorted({row["name"].strip() for row in rows if (row.get("name") or "").strip()})
+    if len(names) < 2:
+        return None, None
+    roster_hash = hashlib.md5("\n".join(names).encode()).hexdigest()
+    sb.rpc("adopt_relationship_roster", {
+        "p_novel_id": novel_id,
+        "p_roster_hash": roster_hash,
+        "p_names": names,
+    }).execute()
+    return NameMatcher(names), roster_hash
+
+
+def _load_pair_weights(sb, novel_id: str) -> tuple[Counter, int]:
+    """Edge weights summed from every stored chapter row, a page at a time, and the row count."""
+    weights: Counter = Counter()
+    count = 0
+    page_size = settings.relationship_page_size
+    after = -1   # chapter numbers start at 0
+    while True:
+        rows = (
+            sb.table("chapter_relationship_pairs")
+            .select("chapter_number, pairs")
             .eq("novel_id", novel_id)
-            .eq("is_deleted", False)
+            .gt("chapter_number", after)
             .order("chapter_number")
+            .limit(page_size)
             .execute()
-        )
-        chapters = chapters_result.data or []
+        ).data or []
+        for row in rows:
+            _add_pairs(weights, row["pairs"])
+        count += len(rows)
+        if len(rows) < page_size:
+            return weights, count
+        after = rows[-1]["chapter_number"]
 
-        G: nx.Graph = nx.Graph()
 
-        for chapter in chapters:
-            content = chapter.get("content") or ""
-            if not content.strip():
-                continue
+def _published_chapter_count(sb, novel_id: str) -> int:
+    result = (
+        sb.table("chapters")
+        .select("id", count="exact")
+        .eq("novel_id", novel_id)
+        .eq("status", "published")
+        .eq("is_deleted", False)
+        .limit(1)
+        .execute()
+    )
+    return result.count or 0
 
-            prompt = (
-                "List pairs of characters who interact or appear together in this text. "
-                "Return a JSON array only, with no explanation: [[\"Name1\",\"Name2\"],...] "
-                "If no pairs found, return []. "
-                f"Text:\n{content[:3000]}"
-            )
-            try:
-                response = model.generate_content(prompt)
-                raw = (response.text or "").strip()
-                # Strip markdown code fences if present
-                if raw.startswith("```"):
-                    raw = raw.split("```")[1]
-                    if raw.startswith("json"):
-                        raw = raw[4:]
-                pairs = json.loads(raw)
-                for pair in pairs:
-                    if isinstance(pair, list) and len(pair) == 2:
-                        a, b = str(pair[0]).strip(), str(pair[1]).strip()
-                        if a and b and a != b:
-                            if G.has_edge(a, b):
-                                G[a][b]["weight"] += 1
-                            else:
-                                G.add_edge(a, b, weight=1)
-            except Exception as exc:
-                logger.debug(
-                    "Skipping chapter %s pair extraction: %s",
-                    chapter.get("chapter_number"),
-                    exc,
-                )
-                continue
 
-        nodes = [{"id": n, "name": n} for n in G.nodes()]
-        edges = [
-            {"source": u, "target": v, "weight": d.get("weight", 1)}
-            for u, v, d in G.edges(data=True)
-        ]
+def _apply_pairs(sb, novel_id: str, version: int, weights: Counter, status: str,
+                 rows: list[dict], delete_ids: list[str], progress: dict | None = None) -> int:
+    """Store chapter rows and the merged graph atomically; returns the new graph version.
+
+    `progress` ({"processed": n, "total": N}) is stored alongside a pending graph.
+    """
+    edges = [
+        {"source": a, "target": b, "weight": weight}
+        for (a, b), weight in weights.items() if weight > 0
+    ]
+    names = dict.fromkeys(name for edge in edges for name in (edge["source"], edge["target"]))
+    graph = {
+        "status": status,
+        "version": version + 1,
+        "nodes": [{"id": name, "name": name} for name in names],
+        "edges": edges,
+        **(progress or {}),
+    }
+    applied = sb.rpc("apply_relationship_pairs", {
+        "p_novel_id": novel_id,
+        "p_expected_version": version,
+        "p_graph": graph,
+        "p_rows": rows,
+        "p_delete_ids": delete_ids,
+    }).execute().data
+    if not applied:
+        raise _GraphConflict(novel_id)
+    return version + 1
 
-        sb.table("novels").update(
-            {"relationship_graph": {"status": "ready", "nodes": nodes, "edges": edges}}
-        ).eq("id", novel_id).execute()
 
+def compute_relationships_task(novel_id: str) -> None:
+    """Background task: bring the relationship graph up to date with the novel.
+
+    Only chapters that are new, whose content changed, or that mention a
+    character added to or removed from the roster since they were counted
+    (relationship_chapters_due after _load_roster) are processed, a page at
+    a time; their edge deltas are merged into the stored graph. When the novel has a character roster, pairs are counted
+    locally by co-occurrence within settings.relationship_window_paragraphs
+    paragraphs; otherwise the page's chapters go to Gemini in parallel
+    (gemini.fan_out). Pairs of deleted or unpublished chapters are
+    subtracted. A graph that is not "ready" is rebuilt from the stored
+    chapter rows first and carries "processed" and "total" chapter counts
+    until it is ready again. Publishing enqueues this task, but a novel
+    whose graph was never requested is skipped.
+
+    Failures are recorded as status "failed" unless a ready graph exists,
+    which is left as is. Raises only when another run updated the graph
+    first, so the job is retried.
+    """
+    graph = get_relationships(novel_id)
+    status = graph.get("status")
+    if status == "not_started":
+        return
+    try:
+        sb = get_supabase()
+        matcher, roster_hash = _load_roster(sb, novel_id)
+        model = None
+        if matcher is None:
+            if not settings.gemini_api_key:
+                if status != "ready":
+                    _mark_relationships_failed(novel_id)
+                logger.warning("compute_relationships_task: no character roster and gemini_api_key not set")
+                return
+            import google.generativeai as genai
+
+            genai.configure(api_key=settings.gemini_api_key)
+            model = genai.GenerativeModel(_CHAT_MODEL)
+        window = settings.relationship_window_paragraphs
+
+        version = graph.get("version", 0)
+        state = "ready" if status == "ready" else "pending"
+        if state == "ready":
+            weights, processed = _edge_weights(graph), 0
+        else:
+            weights, processed = _load_pair_weights(sb, novel_id)
+            total = _published_chapter_count(sb, novel_id)
+
+        orphaned = sb.rpc("relationship_pairs_orphaned", {"p_novel_id": novel_id}).execute().data or []
+        for row in orphaned:
+            _add_pairs(weights, row["pairs"], -1)
+        delete_ids = [row["chapter_id"] for row in orphaned]
+        processed -= len(orphaned)
+
+        def chapter_pairs(chapter: dict) -> list[list]:
+            content = chapter.get("content") or ""
+            if not content.strip():
+                return []
+            if matcher is not None:
+                return count_pairs(matcher, content, window)
+            return _extract_pairs(model, content)
+
+        after = -1   # chapter numbers start at 0
+        while True:
+            chapters = sb.rpc("relationship_chapters_due", {
+                "p_novel_id": novel_id,
+                "p_after_number": after,
+                "p_limit": settings.relationship_page_size,
+                "p_roster_hash": roster_hash,
+            }).execute().data or []
+            rows = []
+            if chapters:
+                previous = {
+                    row["chapter_id"]: row["pairs"]
+                    for row in (
+                        sb.table("chapter_relationship_pairs")
+                        .select("chapter_id, pairs")
+                        .in_("chapter_id", [c["id"] for c in chapters])
+                        .execute()
+                    ).data or []
+                }
+                if matcher is not None:
+                    results = ((chapter, chapter_pairs(chapter), None) for chapter in chapters)
+                else:
+                    results = fan_out(chapter_pairs, chapters)
+                for chapter, pairs, error in results:
+                    if error is not None:
+                        # Not stored, so the chapter is retried on the next run
+                        logger.debug("Skipping chapter %s pair extraction: %s", chapter["chapter_number"], error)
+                        continue
+                    _add_pairs(weights, previous.get(chapter["id"], []), -1)
+                    _add_pairs(weights, pairs)
+                    if chapter["id"] not in previous:
+                        processed += 1
+                    rows.append({
+                        "chapter_id": chapter["id"],
+                        "chapter_number": chapter["chapter_number"],
+                        "content_hash": hashlib.md5((chapter.get("content") or "").encode()).hexdigest(),
+                        "roster_hash": roster_hash,
+                        "pairs": pairs,
+                    })
+                after = chapters[-1]["chapter_number"]
+            if rows or delete_ids:
+                progress = {"processed": min(processed, total), "total": total} if state == "pending" else None
+                version = _apply_pairs(sb, novel_id, version, weights, state, rows, delete_ids, progress)
+                delete_ids = []
+            if len(chapters) < settings.relationship_page_size:
+                break
+        if state != "ready":
+            _apply_pairs(sb, novel_id, version, weights, "ready", [], [])
+
+    except _GraphConflict:
+        logger.info("Relationship graph for novel %s changed during update; retrying", novel_id)
+        raise
     except Exception as exc:
         logger.exception("compute_relationships_task failed for novel %s: %s", novel_id, exc)
-        _mark_relationships_failed(novel_id)
+        if status != "ready":
+            _mark_relationships_failed(novel_id)
 
 
 # ---------------------------------------------------------------------------
@@ -183,10 +369,32 @@ def _mark_timeline_failed(novel_id: str) -> None:
         pass
 
 
+def _timeline_event(model, chapter: dict) -> dict | None:
+    ch_num = chapter.get("chapter_number", 0)
+    prompt = (
+        "Tóm tắt sự kiện chính của chương này trong một câu tiếng Việt ngắn gọn. "
+        "Chỉ trả lời đúng một câu, không giải thích thêm.\n"
+        f"Chương {ch_num}:\n{(chapter.get('content') or '')[:2000]}"
+    )
+    response = generate(model, prompt)
+    summary = (response.text or "").strip()
+    return {"chapter_number": ch_num, "event_summary": summary} if summary else None
+
+
+def _save_timeline(sb, novel_id: str, timeline: dict) -> None:
+    sb.table("novels").update({"arc_timeline": timeline}).eq("id", novel_id).execute()
+
+
 def compute_timeline_task(novel_id: str) -> None:
     """Background task: extract key plot event per chapter via Gemini.
 
-    Never raises — safe for FastAPI BackgroundTasks.
+    Chapters fan out over the shared generate pool (gemini.fan_out), paced
+    by the process-wide RPM/TPM budget. While it runs, arc_timeline holds
+    the events so far with "processed" and "total" chapter counts, saved
+    every settings.timeline_progress_every chapters; a retried job resumes
+    from there instead of starting over.
+
+    Never raises — failures are recorded as status "failed" for the UI.
     """
     if not settings.gemini_api_key:
         _mark_timeline_failed(novel_id)
@@ -208,34 +416,41 @@ def compute_timeline_task(novel_id: str) -> None:
             .order("chapter_number")
             .execute()
         )
-        chapters = chapters_result.data or []
-
-        events = []
-        for chapter in chapters:
-            ch_num = chapter.get("chapter_number", 0)
-            content = chapter.get("content") or ""
-            if not content.strip():
-                continue
-
-            prompt = (
-                "Tóm tắt sự kiện chính của chương này trong một câu tiếng Việt ngắn gọn. "
-                "Chỉ trả lời đúng một câu, không giải thích thêm.\n"
-                f"Chương {ch_num}:\n{content[:2000]}"
-            )
-            try:
-                response = model.generate_content(prompt)
-                summary = (response.text or "").strip()
-                if summary:
-                    events.append({"chapter_number": ch_num, "event_summary": summary})
-            except Exception as exc:
+        chapters = [c for c in chapters_result.data or [] if (c.get("content") or "").strip()]
+
+        previous = get_timeline(novel_id)
+        events = {}
+        if previous.get("status") == "pending":
+            events = {e["chapter_number"]: e for e in previous.get("events") or []}
+        todo = [c for c in chapters if c.get("chapter_number", 0) not in events]
+        total = len(chapters)
+        processed = total - len(todo)
+
+        def save_progress() -> None:
+            _save_timeline(sb, novel_id, {
+                "status": "pending",
+                "processed": processed,
+                "total": total,
+                "events": sorted(events.values(), key=lambda e: e["chapter_number"]),
+            })
+
+        if todo:
+            save_progress()
+        for chapter, event, error in fan_out(lambda c: _timeline_event(model, c), todo):
+            processed += 1
+            if error is not None:
                 logger.debug(
-                    "Skipping chapter %s timeline extraction: %s", ch_num, exc
+                    "Skipping chapter %s timeline extraction: %s", chapter.get("chapter_number"), error
                 )
-                continue
+            elif event:
+                events[event["chapter_number"]] = event
+            if processed % settings.timeline_progress_every == 0 and processed < total:
+                save_progress()
 
-        sb.table("novels").update(
-            {"arc_timeline": {"status": "ready", "events": events}}
-        ).eq("id", novel_id).execute()
+        _save_timeline(sb, novel_id, {
+            "status": "ready",
+            "events": sorted(events.values(), key=lambda e: e["chapter_number"]),
+        })
 
     except Exception as exc:
         logger.exception("compute_timeline_task failed for novel %s: %s", novel_id, exc)
@@ -246,56 +461,82 @@ def compute_timeline_task(novel_id: str) -> None:
 # Full-context Q&A (RAG, no spoiler filter)
 # ---------------------------------------------------------------------------
 
-def stream_qa(novel_id: str, question: str) -> Generator[str, None, None]:
+def invalidate_qa_answers(novel_id: str) -> None:
+    _qa_answer_cache.invalidate(novel_id)
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _best_answer(entries: list, query_vector: list[float]) -> str | None:
+    best_score, best_answer = 0.0, None
+    for vector, answer in entries:
+        score = _cosine(query_vector, vector)
+        if score > best_score:
+            best_score, best_answer = score, answer
+    return best_answer if best_score >= settings.qa_answer_cache_similarity else None
+
+
+async def _cached_answer(novel_id: str, query_vector: list[float]) -> str | None:
+    """The answer to the most similar recent question, if it clears the threshold.
+
+    The scan is pure Python over up to qa_answer_cache_per_novel embeddings,
+    so it runs in a thread rather than on the event loop.
+    """
+    entries = await _qa_answer_cache.get_shared(novel_id)
+    if not entries:
+        return None
+    return await asyncio.to_thread(_best_answer, entries, query_vector)
+
+
+async def _store_answer(novel_id: str, query_vector: list[float], answer: str) -> None:
+    entries = list(await _qa_answer_cache.get_shared(novel_id) or ())
+    entries.append((query_vector, answer))
+    await _qa_answer_cache.set_shared(novel_id, entries[-settings.qa_answer_cache_per_novel:])
+
+
+async def stream_qa(novel_id: str, question: str) -> AsyncGenerator[str, None]:
     """SSE generator for full-context Q&A.
 
     No chapter filter — user sees complete novel context.
     Never raises — safe for FastAPI StreamingResponse.
+    Async like chat_service.stream_message, so open streams don't hold threads.
     """
     if not settings.gemini_api_key:
         yield "data: [ERROR] AI service not configured\n\n"
         return
 
-    sb = get_supabase()
     context_chunks: list[str] = []
+    query_vector: list[float] | None = None
+    cached: str | None = None
 
-    qdrant = get_qdrant()
+    qdrant = get_async_qdrant()
     if qdrant and settings.qdrant_url:
         try:
-            import google.generativeai as genai
-
-            genai.configure(api_key=settings.gemini_api_key)
-            embed_result = genai.embed_content(
-                model=_EMBEDDING_MODEL,
-                content=question,
-                task_type="RETRIEVAL_QUERY",
-            )
-            query_vector: list[float] = embed_result["embedding"]
-
-            collection_name = f"novel_{novel_id}"
-            # No chapter filter — full novel context (no spoiler control for VIP Max)
-            search_results = qdrant.search(
-                collection_name=collection_name,
-                query_vector=query_vector,
-                limit=_TOP_K,
-            )
-
-            vector_ids = [str(hit.id) for hit in search_results]
-            if vector_ids:
-                chunks_result = (
-                    sb.table("novel_embeddings")
-                    .select("content_preview")
-                    .in_("vector_id", vector_ids)
-                    .execute()
+            query_vector = await embed_query(question)
+            cached = await _cached_answer(novel_id, query_vector)
+            if cached is None:
+                # No chapter filter — full novel context (no spoiler control for VIP Max)
+                search_results = await qdrant.search(
+                    collection_name=collection_for(novel_id),
+                    query_vector=query_vector,
+                    limit=_TOP_K,
+                    query_filter=novel_filter(novel_id),
                 )
-                context_chunks = [
-                    row["content_preview"]
-                    for row in (chunks_result.data or [])
-                    if row.get("content_preview")
-                ]
+                context_chunks = await chunk_texts(get_async_supabase(), search_results)
         except Exception as exc:
             logger.warning("Q&A RAG search failed (continuing without context): %s", exc)
 
+    if cached is not None:
+        # Replay a recent answer to the same question as a single event
+        safe_answer = cached.replace("\n", "\\n")
+        yield f"data: {safe_answer}\n\n"
+        yield "data: [DONE]\n\n"
+        return
+
     context_section = ""
     if context_chunks:
         context_section = (
@@ -314,11 +555,11 @@ def stream_qa(novel_id: str, question: str) -> Generator[str, None, None]:
 
         genai.configure(api_key=settings.gemini_api_key)
         model = genai.GenerativeModel(_CHAT_MODEL)
-        response = model.generate_content(prompt, stream=True)
-
-        for chunk in response:
+        answer = ""
+        async for chunk in stream_generate(model, prompt):
             token = chunk.text or ""
             if token:
+                answer += token
                 safe_token = token.replace("\n", "\\n")
                 yield f"data: {safe_token}\n\n"
 
@@ -327,6 +568,10 @@ def stream_qa(novel_id: str, question: str) -> Generator[str, None, None]:
         yield "data: [ERROR] AI generation failed\n\n"
         return
 
+    # Only a grounded answer is replayed; one made without story context
+    # (search failed or found nothing) would otherwise stick for the TTL
+    if query_vector is not None and context_chunks and answer:
+        await _store_answer(novel_id, query_vector, answer)
     yield "data: [DONE]\n\n"
 
 
@@ -334,80 +579,401 @@ def stream_qa(novel_id: str, question: str) -> Generator[str, None, None]:
 # Arc summaries (cached in Supabase Storage)
 # ---------------------------------------------------------------------------
 
-def get_arc_summary(novel_id: str, start_chapter: int, end_chapter: int) -> dict:
-    """Return arc summary for the given chapter range.
+_ARC_BUCKET = "arc-summaries"
+_ARC_INDEX_PAGE = 1_000   # PostgREST's default max rows per request
 
-    Checks Supabase Storage cache first. On cache miss: calls Gemini and caches result.
-    Raises on Gemini failure (propagates as 500).
-    """
-    cache_path = f"{novel_id}/{start_chapter}-{end_chapter}.json"
-    sb = get_supabase()
 
-    # Check cache
-    try:
-        cached_bytes = sb.storage.from_("arc-summaries").download(cache_path)
-        return json.loads(cached_bytes)
-    except Exception:
-        pass  # Cache miss — proceed to compute
+def _arc_prompt(first: int, last: int, text: str) -> str:
+    return (
+        f"Tóm tắt nội dung từ chương {first} đến chương {last} "
+        "trong 3-5 đoạn văn tiếng Việt. "
+        "Bao gồm các sự kiện chính, diễn biến của nhân vật, và những điểm nổi bật quan trọng.\n\n"
+        f"{text}"
+    )
+
+
+def _piece_prompt(number: int, part: int, parts: int, text: str) -> str:
+    return (
+        f"Tóm tắt phần {part}/{parts} của chương {number} trong 1-2 đoạn văn tiếng Việt, "
+        "giữ lại các sự kiện chính và diễn biến của nhân vật.\n\n"
+        f"{text}"
+    )
+
+
+def _split_text(text: str, size: int) -> list[str]:
+    """`text` in pieces of at most `size` characters, cut at a line break where there is one."""
+    pieces = []
+    while len(text) > size:
+        cut = text.rfind("\n", 0, size)
+        if cut <= 0:
+            cut = size
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def _chapter_texts(model, contents: dict[int, str], share: int) -> dict[int, str]:
+    """Text to put in a summary prompt for each chapter, at most about `share` characters each.
+
+    A chapter that fits its share goes in as is. A longer one is cut into
+    pieces that each fit one prompt (settings.arc_summary_prompt_chars),
+    the pieces are summarised in parallel, and their summaries stand in for
+    the chapter, so no part of it is left out.
+    """
+    texts = {number: content for number, content in contents.items() if len(content) <= share}
+    pieces: list[tuple[int, int, int, str]] = []
+    for number, content in contents.items():
+        if number not in texts:
+            split = _split_text(content, settings.arc_summary_prompt_chars)
+            pieces.extend((number, k, len(split), piece) for k, piece in enumerate(split))
+
+    done: dict[int, dict[int, str]] = {}
+    for (number, k, parts, piece), response, error in fan_out(
+        lambda item: generate(model, _piece_prompt(item[0], item[1] + 1, item[2], item[3])), pieces
+    ):
+        if error is not None:
+            raise error
+        assert response is not None
+        done.setdefault(number, {})[k] = (response.text or "").strip()
+    for number, summaries in done.items():
+        texts[number] = "\n\n".join(summaries[k] for k in sorted(summaries))
+    return texts
+
+
+def _chapter_index(sb, novel_id: str, start: int, end: int) -> dict[int, str]:
+    """chapter_number -> updated_at for the chapters in [start, end], without content."""
+    index: dict[int, str] = {}
+    after = start - 1
+    while True:
+        rows = (
+            sb.table("chapters")
+            .select("chapter_number, updated_at")
+            .eq("novel_id", novel_id)
+            .eq("is_deleted", False)
+            .gt("chapter_number", after)
+            .lte("chapter_number", end)
+            .order("chapter_number")
+            .limit(_ARC_INDEX_PAGE)
+            .execute()
+        ).data or []
+        index.update((row["chapter_number"], str(row.get("updated_at"))) for row in rows)
+        if len(rows) < _ARC_INDEX_PAGE:
+            return index
+        after = rows[-1]["chapter_number"]
 
-    if not settings.gemini_api_key:
-        raise ValueError("AI service not configured")
 
-    # Fetch chapters in range
-    chapters_result = (
+def _chapter_contents(sb, novel_id: str, numbers: list[int]) -> dict[int, str]:
+    rows = (
         sb.table("chapters")
         .select("chapter_number, content")
         .eq("novel_id", novel_id)
         .eq("is_deleted", False)
-        .gte("chapter_number", start_chapter)
-        .lte("chapter_number", end_chapter)
-        .order("chapter_number")
+        .in_("chapter_number", numbers)
         .execute()
-    )
-    chapters = chapters_result.data or []
+    ).data or []
+    return {row["chapter_number"]: row.get("content") or "" for row in rows}
+
+
+def _fingerprint(index: dict[int, str], first: int, last: int) -> str:
+    """Changes whenever a chapter in [first, last] is added, removed or edited."""
+    digest = hashlib.md5()
+    for number in sorted(n for n in index if first <= n <= last):
+        digest.update(f"{number}:{index[number]};".encode())
+    return digest.hexdigest()
+
+
+def _node_range(node: tuple[int, int]) -> tuple[int, int]:
+    """Chapter numbers covered by (level, i): level 0 is chapter i + 1, level L spans block_size**L chapters."""
+    level, i = node
+    span = settings.arc_summary_block_size ** level
+    return i * span + 1, (i + 1) * span
+
+
+def _present(index: dict[int, str], node: tuple[int, int]) -> list[int]:
+    first, last = _node_range(node)
+    return sorted(n for n in index if first <= n <= last)
+
+
+def _arc_nodes(start: int, end: int) -> list[tuple[int, int]]:
+    """Cover [start, end] with the fewest aligned blocks, largest first, chapters at the edges."""
+    size = settings.arc_summary_block_size
+    nodes = []
+    number = start
+    while number <= end:
+        level = 0
+        while (number - 1) % size ** (level + 1) == 0 and number - 1 + size ** (level + 1) <= end:
+            level += 1
+        nodes.append((level, (number - 1) // size ** level))
+        number += size ** level
+    return nodes
+
+
+def _block_path(novel_id: str, node: tuple[int, int]) -> str:
+    return f"{novel_id}/blocks/{settings.arc_summary_block_size}/{node[0]}-{node[1]}.json"
 
-    if not chapters:
+
+def _download_json(sb, path: str) -> dict | None:
+    try:
+        return json.loads(sb.storage.from_(_ARC_BUCKET).download(path))
+    except Exception:
+        return None  # Cache miss
+
+
+def _upload_json(sb, path: str, data: dict) -> None:
+    try:
+        sb.storage.from_(_ARC_BUCKET).upload(
+            path=path,
+            file=json.dumps(data, ensure_ascii=False).encode("utf-8"),
+            file_options={"upsert": "true", "content-type": "application/json"},
+        )
+    except Exception as exc:
+        logger.warning("Failed to cache arc summary to Storage: %s", exc)
+
+
+def _block_summaries(sb, model, novel_id: str, index: dict[int, str],
+                     blocks: list[tuple[int, int]]) -> dict[tuple[int, int], str]:
+    """Summaries for the given blocks (level >= 1), from Storage where still current.
+
+    A missing block needs its child blocks, so lookups walk down level by
+    level; summaries are then built bottom-up, each level's blocks in
+    parallel: level 1 from chapter content (_chapter_texts), higher levels
+    from the summaries of their children. Every block built is cached.
+    """
+    size = settings.arc_summary_block_size
+
+    def present(node: tuple[int, int]) -> list[int]:
+        return _present(index, node)
+
+    def children(node: tuple[int, int]) -> list[tuple[int, int]]:
+        level, i = node
+        return [child for child in ((level - 1, i * size + k) for k in range(size)) if present(child)]
+
+    summaries: dict[tuple[int, int], str] = {}
+    fingerprints: dict[tuple[int, int], str] = {}
+    missing: dict[int, list[tuple[int, int]]] = {}
+    frontier = [node for node in blocks if present(node)]
+    while frontier:
+        below = []
+        for node in frontier:
+            fingerprints[node] = _fingerprint(index, *_node_range(node))
+            cached = _download_json(sb, _block_path(novel_id, node))
+            if cached and cached.get("fingerprint") == fingerprints[node]:
+                summaries[node] = cached["summary"]
+                continue
+            missing.setdefault(node[0], []).append(node)
+            if node[0] > 1:
+                below.extend(children(node))
+        frontier = below
+
+    for level in sorted(missing):
+        texts = {}
+        for node in missing[level]:
+            numbers = present(node)
+            if level == 1:
+                contents = _chapter_contents(sb, novel_id, numbers)
+                chapters = _chapter_texts(
+                    model, {n: contents.get(n, "") for n in numbers},
+                    settings.arc_summary_prompt_chars // len(numbers),
+                )
+                parts = [f"=== Chương {n} ===\n{chapters[n]}\n\n" for n in numbers]
+            else:
+                parts = [
+                    f"=== Chương {present(child)[0]}–{present(child)[-1]} ===\n{summaries[child]}\n\n"
+                    for child in children(node)
+                ]
+            texts[node] = _arc_prompt(numbers[0], numbers[-1], "".join(parts))
+
+        for node, response, error in fan_out(lambda n: generate(model, texts[n]), missing[level]):
+            if error is not None:
+                raise error
+            assert response is not None
+            summaries[node] = (response.text or "").strip()
+            _upload_json(sb, _block_path(novel_id, node), {
+                "summary": summaries[node],
+                "fingerprint": fingerprints[node],
+            })
+    return summaries
+
+
+@dataclass
+class _ArcPlan:
+    """What is left to do for a range: nothing (`result`), or one final generation."""
+    result: dict | None = None
+    sb: Any = None
+    model: Any = None
+    prompt: str = ""
+    cache_path: str = ""
+    fingerprint: str = ""
+
+
+def _plan_arc_summary(novel_id: str, start_chapter: int, end_chapter: int) -> _ArcPlan:
+    """Everything up to the final Gemini call for a range (blocking; run in a thread).
+
+    The range is covered by aligned blocks of settings.arc_summary_block_size
+    chapters (and blocks of blocks) plus single chapters at the edges, like
+    a segment tree. Block summaries are cached in Supabase Storage and
+    shared by every range that contains them, so once its blocks exist a
+    range costs one Gemini call (plus one per piece of an edge chapter too
+    long to send whole), and every chapter in it contributes.
+    Cached summaries carry a fingerprint of their chapters' updated_at and
+    are rebuilt when a chapter changes.
+    """
+    cache_path = f"{novel_id}/{start_chapter}-{end_chapter}.json"
+    sb = get_supabase()
+
+    index = _chapter_index(sb, novel_id, start_chapter, end_chapter)
+    if not index:
         raise ValueError(f"No chapters found in range {start_chapter}–{end_chapter}")
+    fingerprint = _fingerprint(index, start_chapter, end_chapter)
 
-    # Build combined text (truncated to avoid token limits)
-    combined_parts = []
-    total_chars = 0
-    for ch in chapters:
-        part = f"=== Chương {ch['chapter_number']} ===\n{ch.get('content', '')}\n\n"
-        if total_chars + len(part) > 30000:
-            break
-        combined_parts.append(part)
-        total_chars += len(part)
-    combined_text = "".join(combined_parts)
+    cached = _download_json(sb, cache_path)
+    if cached and cached.get("fingerprint") == fingerprint:
+        return _ArcPlan(result={key: cached[key] for key in ("summary", "start_chapter", "end_chapter")})
+
+    if not settings.gemini_api_key:
+        raise ValueError("AI service not configured")
 
     import google.generativeai as genai
 
     genai.configure(api_key=settings.gemini_api_key)
     model = genai.GenerativeModel(_CHAT_MODEL)
 
-    prompt = (
-        f"Tóm tắt nội dung từ chương {start_chapter} đến chương {end_chapter} "
-        "trong 3-5 đoạn văn tiếng Việt. "
-        "Bao gồm các sự kiện chính, diễn biến của nhân vật, và những điểm nổi bật quan trọng.\n\n"
-        f"{combined_text}"
+    # Stop at the last chapter that exists, so a partly written last block
+    # is summarised chapter by chapter rather than cached half-full
+    nodes = [node for node in _arc_nodes(start_chapter, max(index)) if _present(index, node)]
+    summaries = _block_summaries(sb, model, novel_id, index, [node for node in nodes if node[0] > 0])
+
+    if len(nodes) == 1 and nodes[0][0] > 0:
+        result = {"summary": summaries[nodes[0]], "start_chapter": start_chapter, "end_chapter": end_chapter}
+        _upload_json(sb, cache_path, {**result, "fingerprint": fingerprint})
+        return _ArcPlan(result=result)
+
+    edges = [node[1] + 1 for node in nodes if node[0] == 0]
+    contents = _chapter_contents(sb, novel_id, edges) if edges else {}
+    chapters = _chapter_texts(
+        model, {n: contents.get(n, "") for n in edges}, settings.arc_summary_prompt_chars // len(nodes)
+    )
+    parts = []
+    for node in nodes:
+        numbers = _present(index, node)
+        if node[0] == 0:
+            parts.append(f"=== Chương {numbers[0]} ===\n{chapters[numbers[0]]}\n\n")
+        else:
+            parts.append(f"=== Chương {numbers[0]}–{numbers[-1]} ===\n{summaries[node]}\n\n")
+    return _ArcPlan(
+        sb=sb,
+        model=model,
+        prompt=_arc_prompt(start_chapter, end_chapter, "".join(parts)),
+        cache_path=cache_path,
+        fingerprint=fingerprint,
     )
-    response = model.generate_content(prompt)
-    summary_text = (response.text or "").strip()
 
-    result = {
-        "summary": summary_text,
-        "start_chapter": start_chapter,
-        "end_chapter": end_chapter,
-    }
 
-    # Cache to Storage
+class _ArcFlight:
+    """One arc-summary generation in progress, shared by every request for its range.
+
+    The generation runs in its own task, so a client that disconnects does
+    not cancel it for the others. Followers replay the chunks produced so
+    far and then receive new ones as they arrive.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: Exception | None = None
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, chunk: str) -> None:
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Exception | None = None) -> None:
+        async with self._changed:
+            self.done, self.error = True, error
+            self._changed.notify_all()
+
+    async def follow(self) -> AsyncGenerator[str, None]:
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.chunks) > sent)
+                fresh, done = self.chunks[sent:], self.done
+            for chunk in fresh:
+                yield chunk
+            sent += len(fresh)
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+_arc_flights: dict[str, _ArcFlight] = {}
+
+
+async def _generate_arc_summary(key: str, flight: _ArcFlight, novel_id: str,
+                                start_chapter: int, end_chapter: int) -> None:
     try:
-        sb.storage.from_("arc-summaries").upload(
-            path=cache_path,
-            file=json.dumps(result, ensure_ascii=False).encode("utf-8"),
-            file_options={"upsert": "true", "content-type": "application/json"},
-        )
+        plan = await run_in_threadpool(_plan_arc_summary, novel_id, start_chapter, end_chapter)
+        if plan.result is not None:
+            await flight.publish(plan.result["summary"])
+        else:
+            async for chunk in stream_generate(plan.model, plan.prompt):
+                token = chunk.text or ""
+                if token:
+                    await flight.publish(token)
+            result = {
+                "summary": "".join(flight.chunks).strip(),
+                "start_chapter": start_chapter,
+                "end_chapter": end_chapter,
+            }
+            await run_in_threadpool(_upload_json, plan.sb, plan.cache_path, {**result, "fingerprint": plan.fingerprint})
+        await flight.finish()
     except Exception as exc:
-        logger.warning("Failed to cache arc summary to Storage: %s", exc)
+        await flight.finish(exc)
+    finally:
+        _arc_flights.pop(key, None)
 
-    return result
+
+def _join_arc_flight(novel_id: str, start_chapter: int, end_chapter: int) -> _ArcFlight:
+    """The in-progress generation for this range, starting one if there is none."""
+    key = f"{novel_id}:{start_chapter}-{end_chapter}"
+    flight = _arc_flights.get(key)
+    if flight is None:
+        flight = _arc_flights[key] = _ArcFlight()
+        flight.task = asyncio.create_task(_generate_arc_summary(key, flight, novel_id, start_chapter, end_chapter))
+    return flight
+
+
+async def get_arc_summary(novel_id: str, start_chapter: int, end_chapter: int) -> dict:
+    """Return arc summary for the given chapter range (see _plan_arc_summary).
+
+    Concurrent requests for the same uncached range share one generation.
+    Raises ValueError when the range has no chapters or AI is not configured,
+    and re-raises Gemini failures (propagates as 500).
+    """
+    chunks = [chunk async for chunk in _join_arc_flight(novel_id, start_chapter, end_chapter).follow()]
+    return {"summary": "".join(chunks).strip(), "start_chapter": start_chapter, "end_chapter": end_chapter}
+
+
+async def stream_arc_summary(novel_id: str, start_chapter: int, end_chapter: int) -> AsyncGenerator[str, None]:
+    """SSE generator for an arc summary, teed from the shared generation for its range.
+
+    A cached summary arrives as a single event. Never raises — safe for
+    FastAPI StreamingResponse.
+    """
+    try:
+        async for chunk in _join_arc_flight(novel_id, start_chapter, end_chapter).follow():
+            safe_chunk = chunk.replace("\n", "\\n")
+            yield f"data: {safe_chunk}\n\n"
+    except ValueError as exc:
+        yield f"data: [ERROR] {exc}\n\n"
+        return
+    except Exception as exc:
+        logger.exception("Arc summary streaming failed for novel %s: %s", novel_id, exc)
+        yield "data: [ERROR] AI generation failed\n\n"
+        return
+    yield "data: [DONE]\n\n"
@@ -1,4 +1,5 @@
 from app.core.database import get_supabase
+from app.core.deps import invalidate_principal
 from app.models.user import UserUpdate
 
 
@@ -10,7 +11,17 @@ def get_user_by_id(user_id: str) -> dict | None:
     return result.data
 
 
+def get_me(user_id: str) -> dict | None:
+    result = get_supabase().table("users").select(
+        "id, username, avatar_url, bio, social_links, donate_url, role, "
+        "chapters_read, level, vip_tier, created_at, is_banned, ban_until, "
+        "daily_nominations, nominations_reset_at, vip_expires_at"
+    ).eq("id", user_id).single().execute()
+    return result.data
+
+
 def update_user(user_id: str, data: UserUpdate) -> dict:
     updates = data.model_dump(exclude_none=True)
     result = get_supabase().table("users").update(updates).eq("id", user_id).execute()
+    invalidate_principal(user_id)
     return result.data[0]
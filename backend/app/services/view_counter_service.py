@@ -0,0 +1,102 @@
+"""Write-behind counters for chapter views and reader progress.
+
+mark_chapter_read records deltas here instead of read-modify-writing
+chapters.views / novels.total_views / users.chapters_read. A background loop
+flushes the accumulated deltas as one apply_read_counters() call (migration 017)
+every `view_counter_flush_seconds`, or sooner once `view_counter_max_pending`
+distinct keys are buffered. Deltas are only ever lost on a hard crash, and at
+most one flush interval's worth; shutdown drains the buffer.
+"""
+import asyncio
+import logging
+from collections import Counter
+
+from app.core.config import settings
+from app.core.database import get_async_supabase
+
+logger = logging.getLogger(__name__)
+
+_chapter_views: Counter[tuple[str, int]] = Counter()   # (novel_id, chapter_number) -> delta
+_user_reads: Counter[str] = Counter()                  # user_id -> delta
+
+_flush_requested: asyncio.Event | None = None
+_flush_task: asyncio.Task | None = None
+_stopping = False
+
+
+def record_read(novel_id: str, chapter_number: int, user_id: str) -> None:
+    """Buffer one first-time read of a chapter by a user."""
+    _chapter_views[(novel_id, chapter_number)] += 1
+    _user_reads[user_id] += 1
+    if _flush_requested is not None and pending_count() >= settings.view_counter_max_pending:
+        _flush_requested.set()
+
+
+def pending_count() -> int:
+    return len(_chapter_views) + len(_user_reads)
+
+
+async def flush() -> None:
+    """Apply all buffered deltas in one round trip. On failure they are re-queued."""
+    global _chapter_views, _user_reads
+    if not _chapter_views and not _user_reads:
+        return
+
+    chapter_views, user_reads = _chapter_views, _user_reads
+    _chapter_views, _user_reads = Counter(), Counter()
+    try:
+        await get_async_supabase().rpc(
+            "apply_read_counters",
+            {
+                "p_chapter_views": [
+                    {"novel_id": novel_id, "chapter_number": number, "delta": delta}
+                    for (novel_id, number), delta in chapter_views.items()
+                ],
+                "p_user_reads": [
+                    {"user_id": user_id, "delta": delta} for user_id, delta in user_reads.items()
+                ],
+            },
+        ).execute()
+    except Exception as exc:
+        logger.warning("view counter flush failed, re-queueing %d keys: %s",
+                       len(chapter_views) + len(user_reads), exc)
+        _chapter_views.update(chapter_views)
+        _user_reads.update(user_reads)
+
+
+async def _flush_loop() -> None:
+    assert _flush_requested is not None
+    while not _stopping:
+        try:
+            await asyncio.wait_for(_flush_requested.wait(), timeout=settings.view_counter_flush_seconds)
+        except asyncio.TimeoutError:
+            pass
+        _flush_requested.clear()
+        await flush()
+
+
+def start() -> None:
+    """Start the periodic flush loop (application startup)."""
+    global _flush_requested, _flush_task, _stopping
+    _stopping = False
+    _flush_requested = asyncio.Event()
+    _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop() -> None:
+    """Stop the flush loop and drain whatever is still buffered (application shutdown)."""
+    global _flush_task, _flush_requested, _stopping
+    _stopping = True
+    if _flush_requested is not None:
+        _flush_requested.set()
+    if _flush_task is not None:
+        await _flush_task
+    _flush_task = None
+    _flush_requested = None
+
+    await flush()
+    if pending_count():
+        logger.error(
+            "view counter drain failed, dropping deltas: chapters=%s users=%s",
+            dict(_chapter_views), dict(_user_reads),
+        )
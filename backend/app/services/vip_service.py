@@ -4,6 +4,7 @@ from fastapi import HTTPException
 from fastapi import status as http_status
 
 from app.core.database import get_supabase
+from app.core.deps import invalidate_principal
 
 
 def _get_setting(key: str):
@@ -56,6 +57,7 @@ def purchase_vip(tier: str, user_id: str) -> dict:
         "vip_tier": tier,
         "vip_expires_at": expires_at.isoformat(),
     }).eq("id", user_id).execute()
+    invalidate_principal(user_id)
     sb.table("transactions").insert({
         "user_id": user_id,
         "currency_type": "linh_thach",
@@ -0,0 +1,422 @@
+"""Durable background jobs for the AI pipelines.
+
+API routes call enqueue(); a separate worker process (app/workers/job_worker.py)
+claims due jobs and runs their handlers, so Gemini/ElevenLabs work never
+competes with reader requests for the web worker's threadpool.
+
+- Jobs live in public.jobs (migration 023). Claiming uses FOR UPDATE SKIP
+  LOCKED, so any number of workers can poll the same table.
+- Each job type has a concurrency limit per worker process (JOB_TYPES,
+  overridable with settings.job_concurrency) and a max_attempts budget.
+- A handler that raises is retried with exponential backoff; after
+  max_attempts the job is marked failed with the last error.
+- A claimed job holds a lease the worker renews while it runs. If the worker
+  dies, the lease expires and another worker picks the job up.
+- An idempotency key collapses duplicate enqueues while a job is still queued.
+  A retry whose key has been enqueued again meanwhile is folded into that
+  queued job rather than queued a second time.
+
+settings.job_queue_backend = "memory" swaps the table for an in-process
+stand-in (local development without the migration, not durable). It is
+always paired with an embedded worker, which the API also starts when
+settings.job_worker_embedded is set.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import random
+import socket
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from app.core.config import settings
+from app.core.database import get_async_supabase
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class JobType:
+    handler: str        # "module:function", imported when the first job runs
+    concurrency: int    # jobs of this type in flight per worker process
+    max_attempts: int
+
+
+# embed_chapter, extract_characters and backfill_embeddings raise on failure and are retried.
+# The others record their own 'failed' status for the UI and only get a second
+# attempt when a worker dies mid-run.
+JOB_TYPES: dict[str, JobType] = {
+    "embed_chapter": JobType("app.services.embedding_service:embed_chapter", 4, 5),
+    "extract_characters": JobType("app.services.character_service:extract_characters", 2, 3),
+    "generate_narration": JobType("app.services.tts_service:generate_narration", 2, 2),
+    "compute_relationships": JobType("app.services.story_intelligence_service:compute_relationships_task", 1, 2),
+    "compute_timeline": JobType("app.services.story_intelligence_service:compute_timeline_task", 1, 2),
+    # Resumes from its checkpoint, so a retry only redoes the page in flight.
+    "backfill_embeddings": JobType("app.services.embedding_service:backfill_novel_embeddings", 1, 5),
+}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat()
+
+
+def concurrency(job_type: str) -> int:
+    return settings.job_concurrency.get(job_type, JOB_TYPES[job_type].concurrency)
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts`: exponential with jitter, capped."""
+    delay = min(settings.job_retry_max_seconds, settings.job_retry_base_seconds * 2 ** (attempts - 1))
+    return delay * (0.5 + random.random() / 2)
+
+
+# ── Backends ─────────────────────────────────────────────────────────────────
+
+class _PostgresBackend:
+    async def enqueue(self, job_type: str, payload: dict, idempotency_key: str | None,
+                      max_attempts: int, delay_seconds: int) -> dict:
+        result = await get_async_supabase().rpc("enqueue_job", {
+            "p_job_type": job_type,
+            "p_payload": payload,
+            "p_idempotency_key": idempotency_key,
+            "p_max_attempts": max_attempts,
+            "p_delay_seconds": delay_seconds,
+        }).execute()
+        return result.data
+
+    async def claim(self, worker_id: str, job_type: str, limit: int, lease_seconds: int) -> list[dict]:
+        result = await get_async_supabase().rpc("claim_jobs", {
+            "p_worker": worker_id,
+            "p_job_type": job_type,
+            "p_limit": limit,
+            "p_lease_seconds": lease_seconds,
+        }).execute()
+        return result.data or []
+
+    async def update(self, job_id: str, worker_id: str, fields: dict) -> None:
+        # Guarded by locked_by: a worker whose lease was taken over can't clobber the new run.
+        await get_async_supabase().table("jobs").update(fields).eq(
+            "id", job_id
+        ).eq("locked_by", worker_id).execute()
+
+    async def retry(self, job_id: str, worker_id: str, error: str, delay_seconds: float) -> str | None:
+        result = await get_async_supabase().rpc("retry_job", {
+            "p_job_id": job_id,
+            "p_worker": worker_id,
+            "p_error": error,
+            "p_delay_seconds": round(delay_seconds),
+        }).execute()
+        return result.data
+
+    async def extend(self, job_ids: list[str], worker_id: str, locked_until: str) -> None:
+        await get_async_supabase().table("jobs").update({"locked_until": locked_until}).in_(
+            "id", job_ids
+        ).eq("locked_by", worker_id).eq("status", "running").execute()
+
+    async def get(self, job_id: str) -> dict | None:
+        result = await get_async_supabase().table("jobs").select("*").eq(
+            "id", job_id
+        ).maybe_single().execute()
+        return result.data if result else None
+
+    async def list(self, status: str | None, job_type: str | None, limit: int) -> list[dict]:
+        query = get_async_supabase().table("jobs").select("*")
+        if status:
+            query = query.eq("status", status)
+        if job_type:
+            query = query.eq("job_type", job_type)
+        result = await query.order("created_at", desc=True).limit(limit).execute()
+        return result.data or []
+
+
+class _MemoryBackend:
+    """In-process stand-in with the same semantics as the jobs table."""
+
+    def __init__(self) -> None:
+        self.jobs: dict[str, dict] = {}
+
+    async def enqueue(self, job_type: str, payload: dict, idempotency_key: str | None,
+                      max_attempts: int, delay_seconds: int) -> dict:
+        queued = self._queued_with_key(idempotency_key)
+        if queued is not None:
+            return dict(queued)
+        now = _now()
+        job = {
+            "id": str(uuid.uuid4()), "job_type": job_type, "payload": payload, "status": "queued",
+            "idempotency_key": idempotency_key, "attempts": 0, "max_attempts": max_attempts,
+            "run_after": _iso(now + timedelta(seconds=delay_seconds)), "locked_by": None,
+            "locked_until": None, "last_error": None, "created_at": _iso(now),
+            "started_at": None, "finished_at": None,
+        }
+        self.jobs[job["id"]] = job
+        if _embedded is not None:
+            _embedded.wake()
+        return dict(job)
+
+    async def claim(self, worker_id: str, job_type: str, limit: int, lease_seconds: int) -> list[dict]:
+        now = _now()
+
+        def runnable(job: dict) -> bool:
+            if job["job_type"] != job_type:
+                return False
+            if job["status"] == "queued":
+                return datetime.fromisoformat(job["run_after"]) <= now
+            return job["status"] == "running" and datetime.fromisoformat(job["locked_until"]) < now
+
+        due = sorted(filter(runnable, self.jobs.values()), key=lambda j: j["run_after"])[:limit]
+        for job in due:
+            job.update(
+                status="running", attempts=job["attempts"] + 1, locked_by=worker_id,
+                locked_until=_iso(now + timedelta(seconds=lease_seconds)), started_at=_iso(now),
+            )
+        return [dict(job) for job in due]
+
+    def _queued_with_key(self, idempotency_key: str | None, exclude: str | None = None) -> dict | None:
+        if not idempotency_key:
+            return None
+        for job in self.jobs.values():
+            if job["idempotency_key"] == idempotency_key and job["status"] == "queued" and job["id"] != exclude:
+                return job
+        return None
+
+    async def update(self, job_id: str, worker_id: str, fields: dict) -> None:
+        job = self.jobs.get(job_id)
+        if job is None or job["locked_by"] != worker_id:
+            return
+        if fields.get("status", job["status"]) == "queued":
+            key = fields.get("idempotency_key", job["idempotency_key"])
+            if self._queued_with_key(key, exclude=job_id) is not None:
+                # Mirrors the unique violation on jobs_idempotency_idx.
+                raise ValueError(f"duplicate queued job for idempotency key {key!r}")
+        job.update(fields)
+
+    async def retry(self, job_id: str, worker_id: str, error: str, delay_seconds: float) -> str | None:
+        job = self.jobs.get(job_id)
+        if job is None or job["locked_by"] != worker_id:
+            return None
+        queued = self._queued_with_key(job["idempotency_key"], exclude=job_id)
+        if queued is not None:
+            queued["last_error"] = error
+            job.update(status="failed", finished_at=_iso(_now()),
+                       last_error=f"{error} (retry folded into job {queued['id']})")
+            return queued["id"]
+        job.update(status="queued", last_error=error,
+                   run_after=_iso(_now() + timedelta(seconds=delay_seconds)))
+        return job_id
+
+    async def extend(self, job_ids: list[str], worker_id: str, locked_until: str) -> None:
+        for job_id in job_ids:
+            job = self.jobs.get(job_id)
+            if job is not None and job["locked_by"] == worker_id and job["status"] == "running":
+                job["locked_until"] = locked_until
+
+    async def get(self, job_id: str) -> dict | None:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def list(self, status: str | None, job_type: str | None, limit: int) -> list[dict]:
+        jobs = [
+            dict(job) for job in self.jobs.values()
+            if (not status or job["status"] == status) and (not job_type or job["job_type"] == job_type)
+        ]
+        return sorted(jobs, key=lambda j: j["created_at"], reverse=True)[:limit]
+
+
+@lru_cache(maxsize=1)
+def get_backend() -> _PostgresBackend | _MemoryBackend:
+    if settings.job_queue_backend == "memory":
+        return _MemoryBackend()
+    return _PostgresBackend()
+
+
+# ── Producer API ─────────────────────────────────────────────────────────────
+
+async def enqueue(
+    job_type: str,
+    payload: dict,
+    idempotency_key: str | None = None,
+    delay_seconds: int = 0,
+) -> dict:
+    """Queue a job; returns the job row (the already-queued one for a repeated key)."""
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {job_type}")
+    return await get_backend().enqueue(
+        job_type, payload, idempotency_key, JOB_TYPES[job_type].max_attempts, delay_seconds
+    )
+
+
+async def enqueue_chapter_pipeline(chapter_id: str, novel_id: str, chapter_number: int) -> None:
+    """Jobs every newly published chapter needs: embedding, character extraction and,
+    for novels whose graph has been requested, an incremental relationship update."""
+    await enqueue(
+        "embed_chapter",
+        {"chapter_id": chapter_id, "novel_id": novel_id},
+        idempotency_key=f"embed_chapter:{chapter_id}",
+    )
+    await enqueue(
+        "extract_characters",
+        {"chapter_id": chapter_id, "novel_id": novel_id, "chapter_number": chapter_number},
+        idempotency_key=f"extract_characters:{chapter_id}",
+    )
+    await enqueue(
+        "compute_relationships",
+        {"novel_id": novel_id},
+        idempotency_key=f"compute_relationships:{novel_id}",
+    )
+
+
+async def get_job(job_id: str) -> dict | None:
+    return await get_backend().get(job_id)
+
+
+async def list_jobs(status: str | None = None, job_type: str | None = None, limit: int = 50) -> list[dict]:
+    return await get_backend().list(status, job_type, limit)
+
+
+# ── Worker ───────────────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=None)
+def _resolve_handler(path: str) -> Callable[..., None]:
+    module_name, func_name = path.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+class Worker:
+    """Claims and runs jobs until stopped. One per process."""
+
+    def __init__(self, job_types: list[str] | None = None) -> None:
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.job_types = job_types or list(JOB_TYPES)
+        self._in_flight: dict[str, set[str]] = {job_type: set() for job_type in self.job_types}
+        self._tasks: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def poll(self) -> int:
+        """Claim jobs for every type with free slots and start them. Returns the number claimed."""
+        backend = get_backend()
+        claimed = 0
+        for job_type in self.job_types:
+            free = concurrency(job_type) - len(self._in_flight[job_type])
+            if free <= 0:
+                continue
+            try:
+                jobs = await backend.claim(self.worker_id, job_type, free, settings.job_lease_seconds)
+            except Exception as exc:
+                logger.warning("claiming %s jobs failed: %s", job_type, exc)
+                continue
+            for job in jobs:
+                self._in_flight[job_type].add(job["id"])
+                task = asyncio.create_task(self._execute(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            claimed += len(jobs)
+        return claimed
+
+    async def _execute(self, job: dict) -> None:
+        backend = get_backend()
+        job_type = job["job_type"]
+        try:
+            if job["attempts"] > job["max_attempts"]:
+                # Reclaimed after its worker died on the last attempt.
+                await backend.update(job["id"], self.worker_id, {
+                    "status": "failed", "finished_at": _iso(_now()),
+                    "last_error": job.get("last_error") or "lease expired on final attempt",
+                })
+                return
+            handler = _resolve_handler(JOB_TYPES[job_type].handler)
+            try:
+                await asyncio.to_thread(handler, **job["payload"])
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                if job["attempts"] < job["max_attempts"]:
+                    delay = retry_delay(job["attempts"])
+                    logger.warning("job %s (%s) attempt %d failed, retrying in %.0fs: %s",
+                                   job["id"], job_type, job["attempts"], delay, error)
+                    # Folded into the queued job when its key was enqueued again mid-run.
+                    await backend.retry(job["id"], self.worker_id, error, delay)
+                else:
+                    logger.error("job %s (%s) failed after %d attempts: %s",
+                                 job["id"], job_type, job["attempts"], error)
+                    await backend.update(job["id"], self.worker_id, {
+                        "status": "failed", "last_error": error, "finished_at": _iso(_now()),
+                    })
+            else:
+                await backend.update(job["id"], self.worker_id, {
+                    "status": "succeeded", "finished_at": _iso(_now()),
+                })
+        except Exception as exc:
+            # Status write failed; the lease expires and the job is retried elsewhere.
+            logger.exception("job %s (%s): recording outcome failed: %s", job["id"], job_type, exc)
+        finally:
+            self._in_flight[job_type].discard(job["id"])
+            self.wake()   # a slot just freed up
+
+    async def _renew_leases(self) -> None:
+        ids = [job_id for ids in self._in_flight.values() for job_id in ids]
+        if not ids:
+            return
+        until = _iso(_now() + timedelta(seconds=settings.job_lease_seconds))
+        try:
+            await get_backend().extend(ids, self.worker_id, until)
+        except Exception as exc:
+            logger.warning("renewing %d job leases failed: %s", len(ids), exc)
+
+    async def run(self) -> None:
+        logger.info("job worker %s started for %s", self.worker_id, ", ".join(self.job_types))
+        loop = asyncio.get_running_loop()
+        next_renewal = loop.time() + settings.job_lease_seconds / 3
+        while not self._stopping:
+            self._wakeup.clear()
+            claimed = await self.poll()
+            if loop.time() >= next_renewal:
+                await self._renew_leases()
+                next_renewal = loop.time() + settings.job_lease_seconds / 3
+            if claimed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.job_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        """Stop claiming and wait for in-flight jobs to finish."""
+        self._stopping = True
+        self.wake()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# ── Embedded worker (API process) ────────────────────────────────────────────
+
+_embedded: Worker | None = None
+_embedded_task: asyncio.Task | None = None
+
+
+def start() -> None:
+    """Run a worker inside the API process when configured (application startup)."""
+    global _embedded, _embedded_task
+    if settings.job_queue_backend != "memory" and not settings.job_worker_embedded:
+        return
+    _embedded = Worker()
+    _embedded_task = asyncio.create_task(_embedded.run())
+
+
+async def stop() -> None:
+    global _embedded, _embedded_task
+    if _embedded is not None:
+        await _embedded.stop()
+    if _embedded_task is not None:
+        await _embedded_task
+    _embedded = _embedded_task = None
@@ -0,0 +1,43 @@
+"""Job worker entry point: runs queued AI jobs outside the API process.
+
+Usage (from backend/):
+    python -m app.workers.job_worker                      # every job type
+    python -m app.workers.job_worker embed_chapter ...    # only these types
+
+Stops claiming on SIGINT/SIGTERM and exits once in-flight jobs finish.
+"""
+import asyncio
+import signal
+import sys
+
+from app.core import shared_cache
+from app.core.database import close_async_supabase
+from app.core.exceptions import _setup_logging
+from app.workers.job_queue import JOB_TYPES, Worker
+
+
+async def _main(job_types: list[str]) -> None:
+    worker = Worker(job_types or None)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(worker.stop()))
+    shared_cache.start()   # pushes cache invalidations made by jobs to the API replicas
+    try:
+        await worker.run()
+        await worker.stop()
+    finally:
+        await shared_cache.stop()
+        await close_async_supabase()
+
+
+def main() -> None:
+    _setup_logging()
+    job_types = sys.argv[1:]
+    unknown = [t for t in job_types if t not in JOB_TYPES]
+    if unknown:
+        sys.exit(f"Unknown job types: {', '.join(unknown)} (known: {', '.join(JOB_TYPES)})")
+    asyncio.run(_main(job_types))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Copy per-novel Qdrant collections (novel_{id}) into the shared collection.
+
+Run once before switching QDRANT_COLLECTION_MODE to "shared". Points keep
+their IDs, vectors and payload (which already carries novel_id), so
+re-running is safe: a point that was already copied is overwritten in place.
+
+Usage (from backend/):
+    python -m app.workers.qdrant_migrate                   # copy every novel_* collection
+    python -m app.workers.qdrant_migrate --delete-source   # ...then drop each copied collection
+"""
+import argparse
+import logging
+import sys
+
+from app.core.config import settings
+from app.core.exceptions import _setup_logging
+from app.core.qdrant import ensure_collection, get_qdrant
+
+logger = logging.getLogger(__name__)
+
+_SCROLL_LIMIT = 256
+
+
+def _source_collections(client) -> list[str]:
+    return sorted(
+        c.name for c in client.get_collections().collections
+        if c.name.startswith("novel_") and c.name != settings.qdrant_shared_collection
+    )
+
+
+def migrate_collection(client, source: str, target: str) -> int:
+    """Copy every point of `source` into `target`; returns the number copied."""
+    from qdrant_client.models import PointStruct
+
+    copied = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=source,
+            limit=_SCROLL_LIMIT,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if records:
+            client.upsert(
+                collection_name=target,
+                points=[PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records],
+            )
+            copied += len(records)
+        if offset is None:
+            return copied
+
+
+def migrate(client, delete_source: bool = False) -> dict[str, int]:
+    """Copy all per-novel collections into the shared one; returns points copied per collection."""
+    target = settings.qdrant_shared_collection
+    ensure_collection(client, target)
+    copied: dict[str, int] = {}
+    for source in _source_collections(client):
+        copied[source] = migrate_collection(client, source, target)
+        logger.info("Copied %d points from %s into %s", copied[source], source, target)
+        if delete_source:
+            client.delete_collection(source)
+            logger.info("Deleted Qdrant collection: %s", source)
+    return copied
+
+
+def main() -> None:
+    _setup_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delete-source", action="store_true", help="drop each novel_* collection once copied")
+    args = parser.parse_args()
+
+    client = get_qdrant()
+    if client is None:
+        sys.exit("QDRANT_URL is not configured")
+    copied = migrate(client, delete_source=args.delete_source)
+    print(f"Copied {sum(copied.values())} points from {len(copied)} collections "
+          f"into {settings.qdrant_shared_collection}")
+
+
+if __name__ == "__main__":
+    main()
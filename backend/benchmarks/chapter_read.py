@@ -0,0 +1,130 @@
+"""Requests-per-second benchmark for the chapter-read endpoint.
+
+Runs GET /novels/{id}/chapters/{num} through the real FastAPI app against an
+in-memory fake PostgREST that adds a fixed latency to every query. Two modes:
+
+- ``blocking``: the fake sleeps with ``time.sleep`` — equivalent to the old sync
+  Supabase client, where every round trip stalled the event loop.
+- ``async``: the fake sleeps with ``asyncio.sleep`` — the awaited client from
+  ``app.core.database.get_async_supabase``.
+
+Usage (from backend/):
+    python -m benchmarks.chapter_read --requests 400 --concurrency 50 --latency-ms 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench-service-key")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "bench-jwt-secret-bench-jwt-secret")
+os.environ["UPSTASH_REDIS_URL"] = ""
+os.environ["UPSTASH_REDIS_TOKEN"] = ""
+
+import httpx  # noqa: E402
+from supabase import AsyncClient, AsyncClientOptions  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+NOVEL_ID = "bench-novel"
+TOTAL_CHAPTERS = 3000
+
+_CHAPTER_ROW = {
+    "id": "bench-chapter",
+    "novel_id": NOVEL_ID,
+    "chapter_number": 1500,
+    "title": "Chương 1500",
+    "content": "Lorem ipsum dolor sit amet. " * 400,
+    "word_count": 2000,
+    "status": "published",
+    "publish_at": None,
+    "published_at": "2026-01-01T00:00:00+00:00",
+    "views": 0,
+    "created_at": "2026-01-01T00:00:00+00:00",
+    "updated_at": "2026-01-01T00:00:00+00:00",
+}
+
+
+def _fake_postgrest(latency: float, blocking: bool) -> httpx.MockTransport:
+    """PostgREST stand-in: answers the chapter reader's queries after `latency` seconds."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if blocking:
+            time.sleep(latency)
+        else:
+            await asyncio.sleep(latency)
+
+        table = request.url.path.rsplit("/", 1)[-1]
+        select = request.url.params.get("select", "*")
+        if table == "get_chapter_reader":
+            number = _CHAPTER_ROW["chapter_number"]
+            body = {
+                **_CHAPTER_ROW,
+                "prev_chapter": number - 1,
+                "next_chapter": number + 1,
+                "novel_title": "Bench Novel",
+                "novel_uploader_id": "bench-uploader",
+            }
+        elif table == "chapters" and select == "chapter_number":
+            body = [{"chapter_number": n} for n in range(1, TOTAL_CHAPTERS + 1)]
+        elif table == "chapters":
+            body = [_CHAPTER_ROW]
+        elif table == "novels":
+            body = [{"id": NOVEL_ID, "title": "Bench Novel", "uploader_id": "bench-uploader"}]
+        else:
+            body = []
+        return httpx.Response(200, json=body)
+
+    return httpx.MockTransport(handler)
+
+
+async def _run(mode: str, requests: int, concurrency: int, latency: float) -> float:
+    fake = AsyncClient(
+        os.environ["SUPABASE_URL"],
+        os.environ["SUPABASE_SERVICE_KEY"],
+        options=AsyncClientOptions(
+            httpx_client=httpx.AsyncClient(transport=_fake_postgrest(latency, mode == "blocking")),
+        ),
+    )
+    path = f"/api/v1/novels/{NOVEL_ID}/chapters/{_CHAPTER_ROW['chapter_number']}"
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+            r = await client.get(path)
+            r.raise_for_status()
+
+    with patch("app.services.chapter_service.get_async_supabase", return_value=fake):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get(path)  # warm up imports and route resolution
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    return requests / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    latency = args.latency_ms / 1000
+    results = {}
+    for mode in ("blocking", "async"):
+        results[mode] = asyncio.run(_run(mode, args.requests, args.concurrency, latency))
+        print(f"{mode:>9}: {results[mode]:8.1f} req/s")
+    print(f"  speedup: {results['async'] / results['blocking']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Local relationship-pair extraction throughput.
+
+Builds a NameMatcher over a synthetic roster of --characters names and runs
+count_pairs over --chapters synthetic chapters of --paragraphs paragraphs,
+reporting chapters per second. Compare with one Gemini call per chapter
+(hundreds of ms each, plus quota) that compute_relationships_task used to
+make before a roster existed.
+
+Usage (from backend/):
+    python -m benchmarks.cooccurrence_throughput --chapters 2000 --characters 200
+"""
+import argparse
+import random
+import time
+
+from app.core.cooccurrence import NameMatcher, count_pairs
+
+_SYLLABLES = ["an", "bảo", "chi", "dũng", "giang", "hà", "khoa", "lan", "minh", "ngọc", "phong", "quân", "thảo", "vy"]
+_FAMILY = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Vũ", "Đặng", "Bùi", "Đỗ", "Lý"]
+_FILLER = ("bước vào đại sảnh, ánh mắt lạnh lùng nhìn quanh, tiếng gió rít qua khe cửa "
+           "khiến mọi người im lặng chờ đợi điều gì đó sắp xảy ra").split()
+
+
+def _roster(size: int, rng: random.Random) -> list[str]:
+    names: set[str] = set()
+    while len(names) < size:
+        given = " ".join(s.capitalize() for s in rng.sample(_SYLLABLES, rng.randint(1, 2)))
+        names.add(f"{rng.choice(_FAMILY)} {given}" if rng.random() < 0.6 else given)
+    return sorted(names)
+
+
+def _chapter(roster: list[str], paragraphs: int, rng: random.Random) -> str:
+    out = []
+    for _ in range(paragraphs):
+        words = rng.choices(_FILLER, k=rng.randint(30, 80))
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(roster))
+        out.append(f"<p>{' '.join(words)}.</p>")
+    return "".join(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=2_000)
+    parser.add_argument("--characters", type=int, default=200, help="roster size")
+    parser.add_argument("--paragraphs", type=int, default=40, help="paragraphs per chapter")
+    parser.add_argument("--window", type=int, default=3, help="co-occurrence window in paragraphs")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    roster = _roster(args.characters, rng)
+    chapters = [_chapter(roster, args.paragraphs, rng) for _ in range(args.chapters)]
+    size_mb = sum(len(c) for c in chapters) / 1_000_000
+
+    started = time.perf_counter()
+    matcher = NameMatcher(roster)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    pairs = sum(len(count_pairs(matcher, content, args.window)) for content in chapters)
+    elapsed = time.perf_counter() - started
+
+    print(f"roster {len(roster)} names, matcher built in {build * 1000:.1f}ms")
+    print(f"{args.chapters} chapters ({size_mb:.1f}M chars) in {elapsed:.2f}s: "
+          f"{args.chapters / elapsed:,.0f} chapters/s, {size_mb / elapsed:.1f}M chars/s, {pairs} pair rows")
+
+
+if __name__ == "__main__":
+    main()
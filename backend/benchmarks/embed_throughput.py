@@ -0,0 +1,102 @@
+"""Chapters-per-minute benchmark for the chapter embedding step.
+
+Runs embedding_service._embed_texts over synthetic chapters against a fake
+Gemini embedder that adds fixed latency per request plus a little per text,
+so no network or API key is needed. Two modes:
+
+- ``sequential``: one request per chunk, one at a time — the old behaviour.
+- ``batched``: gemini_embed_batch_size chunks per request, up to
+  gemini_embed_concurrency requests in flight.
+
+Both modes are paced by gemini_embed_rpm (``--rpm``), like production.
+
+Usage (from backend/):
+    python -m benchmarks.embed_throughput --chapters 40 --latency-ms 150 --rpm 1500
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench-service-key")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "bench-jwt-secret-bench-jwt-secret")
+
+from app.core.config import settings  # noqa: E402
+from app.core.qdrant import VECTOR_DIMENSION  # noqa: E402
+from app.services import embedding_service  # noqa: E402
+
+_PARAGRAPH = "Lý Minh bước vào đại điện, đôi mắt sắc bén quét qua từng góc. " * 6
+
+
+class FakeEmbedder:
+    """Stands in for google.generativeai: sleeps, then returns zero vectors."""
+
+    def __init__(self, latency: float, per_text: float) -> None:
+        self.latency = latency
+        self.per_text = per_text
+        self.requests = 0
+
+    def embed_content(self, model, content, task_type=None):
+        texts = content if isinstance(content, list) else [content]
+        self.requests += 1
+        time.sleep(self.latency + self.per_text * len(texts))
+        vectors = [[0.0] * VECTOR_DIMENSION for _ in texts]
+        return {"embedding": vectors if isinstance(content, list) else vectors[0]}
+
+
+def _run(mode: str, chapters: list[list[str]], parallel: int, args) -> tuple[float, int]:
+    fake = FakeEmbedder(args.latency_ms / 1000, args.per_text_ms / 1000)
+    batched = mode == "batched"
+    overrides = {
+        "gemini_embed_rpm": args.rpm,
+        "gemini_embed_batch_size": args.batch_size if batched else 1,
+        "gemini_embed_concurrency": args.concurrency if batched else 1,
+    }
+    embedding_service._embed_budget.cache_clear()
+    embedding_service._embed_executor.cache_clear()
+
+    def embed_one(chunks: list[str]) -> None:
+        if batched:
+            embedding_service._embed_texts(chunks)
+        else:
+            for chunk in chunks:
+                embedding_service._embed_batch([chunk])
+
+    with patch.multiple(settings, **overrides), \
+         patch.object(embedding_service, "get_genai", return_value=fake):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            list(pool.map(embed_one, chapters))
+        elapsed = time.perf_counter() - started
+    embedding_service._embed_executor().shutdown()
+    return len(chapters) / elapsed * 60, fake.requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=40)
+    parser.add_argument("--paragraphs", type=int, default=60, help="paragraphs per chapter")
+    parser.add_argument("--parallel-chapters", type=int, default=2, help="embed_chapter tasks running at once")
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="fixed latency per request")
+    parser.add_argument("--per-text-ms", type=float, default=2.0, help="extra latency per text in a request")
+    parser.add_argument("--rpm", type=int, default=settings.gemini_embed_rpm)
+    parser.add_argument("--batch-size", type=int, default=settings.gemini_embed_batch_size)
+    parser.add_argument("--concurrency", type=int, default=settings.gemini_embed_concurrency)
+    args = parser.parse_args()
+
+    content = "\n\n".join([_PARAGRAPH] * args.paragraphs)
+    chunks = embedding_service._chunk_content(content)
+    chapters = [chunks] * args.chapters
+    print(f"{args.chapters} chapters x {len(chunks)} chunks")
+
+    results = {}
+    for mode in ("sequential", "batched"):
+        results[mode], requests = _run(mode, chapters, args.parallel_chapters, args)
+        print(f"{mode:>10}: {results[mode]:8.1f} chapters/min ({requests} requests)")
+    print(f"   speedup: {results['batched'] / results['sequential']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
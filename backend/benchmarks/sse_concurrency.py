@@ -0,0 +1,122 @@
+"""Concurrent SSE streams: sync generator in the threadpool vs async generator.
+
+Opens --streams Q&A streams at once against an in-process ASGI app and
+reports wall time, per-stream latency and peak thread count. The LLM is a
+fake streaming model that emits --tokens tokens, --token-ms apart, so no
+network or API key is needed. Two modes:
+
+- ``sync``: the old shape — a sync generator iterating a blocking
+  generate_content(stream=True). Starlette runs it in the threadpool, so
+  each open stream pins one of its ~40 threads for the whole generation.
+- ``async``: story_intelligence_service.stream_qa as shipped, awaiting
+  generate_content_async(stream=True).
+
+Usage (from backend/):
+    python -m benchmarks.sse_concurrency --streams 200 --tokens 20 --token-ms 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench-service-key")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "bench-jwt-secret-bench-jwt-secret")
+
+import httpx  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.responses import StreamingResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.services import story_intelligence_service  # noqa: E402
+
+
+class FakeStreamingModel:
+    """Stands in for genai.GenerativeModel: streams fixed tokens with a delay between them."""
+
+    def __init__(self, tokens: int, delay: float) -> None:
+        self.tokens = tokens
+        self.delay = delay
+
+    def generate_content(self, prompt, stream=False):
+        for i in range(self.tokens):
+            time.sleep(self.delay)
+            yield MagicMock(text=f"t{i} ")
+
+    async def generate_content_async(self, prompt, stream=False):
+        async def chunks():
+            for i in range(self.tokens):
+                await asyncio.sleep(self.delay)
+                yield MagicMock(text=f"t{i} ")
+        return chunks()
+
+
+def _legacy_stream(model: FakeStreamingModel, question: str):
+    for chunk in model.generate_content(question, stream=True):
+        yield f"data: {chunk.text}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def _app(model: FakeStreamingModel) -> Starlette:
+    async def sync_qa(request):
+        return StreamingResponse(_legacy_stream(model, request.query_params["q"]), media_type="text/event-stream")
+
+    async def async_qa(request):
+        return StreamingResponse(
+            story_intelligence_service.stream_qa("bench-novel", request.query_params["q"]),
+            media_type="text/event-stream",
+        )
+
+    return Starlette(routes=[Route("/sync", sync_qa), Route("/async", async_qa)])
+
+
+async def _run(mode: str, app: Starlette, streams: int) -> tuple[float, list[float], int]:
+    peak_threads = threading.active_count()
+    latencies: list[float] = []
+
+    async def one(client: httpx.AsyncClient, i: int) -> None:
+        nonlocal peak_threads
+        started = time.perf_counter()
+        async with client.stream("GET", f"/{mode}", params={"q": f"question {i}"}) as response:
+            async for _ in response.aiter_text():
+                peak_threads = max(peak_threads, threading.active_count())
+        latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(streams)))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies, peak_threads
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200, help="concurrent SSE streams")
+    parser.add_argument("--tokens", type=int, default=20, help="tokens per answer")
+    parser.add_argument("--token-ms", type=float, default=50.0, help="delay between tokens")
+    args = parser.parse_args()
+
+    model = FakeStreamingModel(args.tokens, args.token_ms / 1000)
+    app = _app(model)
+    ideal = args.tokens * args.token_ms / 1000
+    print(f"{args.streams} streams x {args.tokens} tokens ({ideal:.2f}s per answer)")
+
+    svc = story_intelligence_service
+    with patch.object(svc.settings, "gemini_api_key", "bench-key"), \
+         patch.object(svc, "get_async_qdrant", return_value=None), \
+         patch.object(svc, "get_supabase", return_value=MagicMock()), \
+         patch("google.generativeai.configure"), \
+         patch("google.generativeai.GenerativeModel", return_value=model):
+        for mode in ("sync", "async"):
+            elapsed, latencies, threads = asyncio.run(_run(mode, app, args.streams))
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            print(f"{mode:>6}: {elapsed:6.2f}s wall, p50 {statistics.median(latencies):5.2f}s, "
+                  f"p95 {p95:5.2f}s, {args.streams / elapsed:6.1f} streams/s, peak {threads} threads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.core import cache, qdrant, rate_limit
+from app.workers import job_queue
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    """In-process caches and rate-limit buckets outlive a test; start every test cold."""
+    cache.clear_all()
+    rate_limit._buckets.clear()
+    qdrant._known_collections.clear()
+    yield
+    cache.clear_all()
+    rate_limit._buckets.clear()
+    qdrant._known_collections.clear()
+
+
+@pytest.fixture(autouse=True)
+def job_backend():
+    """Enqueued jobs land in a fresh in-memory queue instead of the jobs table."""
+    backend = job_queue._MemoryBackend()
+    with patch("app.workers.job_queue.get_backend", return_value=backend):
+        yield backend
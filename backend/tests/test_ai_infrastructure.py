@@ -1,6 +1,7 @@
 """Tests for M16 AI infrastructure: embedding pipeline + character extraction."""
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -141,7 +142,7 @@ class TestEmbedChapterPipeline:
     def test_full_pipeline_calls_qdrant_upsert(self):
         mock_sb = self._make_sb()
         mock_qdrant = MagicMock()
-        mock_qdrant.get_collections.return_value.collections = []
+        mock_qdrant.collection_exists.return_value = False
 
         with patch("app.services.embedding_service.settings") as s, \
              patch("app.services.embedding_service.get_supabase", return_value=mock_sb), \
@@ -160,9 +161,7 @@ class TestEmbedChapterPipeline:
     def test_existing_collection_not_recreated(self):
         mock_sb = self._make_sb()
         mock_qdrant = MagicMock()
-        col = MagicMock()
-        col.name = "novel_novel-uuid-1"
-        mock_qdrant.get_collections.return_value.collections = [col]
+        mock_qdrant.collection_exists.return_value = True
 
         with patch("app.services.embedding_service.settings") as s, \
              patch("app.services.embedding_service.get_supabase", return_value=mock_sb), \
@@ -190,19 +189,482 @@ class TestEmbedChapterPipeline:
 
         mock_qdrant.upsert.assert_not_called()
 
-    def test_gemini_failure_does_not_propagate(self):
+    def test_gemini_failure_propagates_for_retry(self):
         mock_sb = self._make_sb()
         mock_qdrant = MagicMock()
-        mock_qdrant.get_collections.return_value.collections = []
+        mock_qdrant.collection_exists.return_value = False
 
         with patch("app.services.embedding_service.settings") as s, \
              patch("app.services.embedding_service.get_supabase", return_value=mock_sb), \
              patch("app.services.embedding_service.get_qdrant", return_value=mock_qdrant), \
-             patch("app.services.embedding_service._embed_texts", side_effect=Exception("Gemini error")):
+             patch("app.services.embedding_service._embed_texts", side_effect=Exception("Gemini error")), \
+             pytest.raises(Exception, match="Gemini error"):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = "http://localhost:6333"
             from app.services.embedding_service import embed_chapter
-            embed_chapter(chapter_id="chapter-uuid-1", novel_id="novel-uuid-1")  # must not raise
+            embed_chapter(chapter_id="chapter-uuid-1", novel_id="novel-uuid-1")  # job queue retries it
+
+
+# ── Unit: embed_chapter — incremental re-embedding ───────────────────────────
+
+class TestEmbedChapterIncremental:
+    def _run(self, chapter: dict, existing: list[dict]):
+        sb = MagicMock()
+        sb.table("chapters").select().eq().maybe_single().execute.return_value = MagicMock(data=chapter)
+        sb.table("novel_embeddings").select().eq().execute.return_value = MagicMock(data=existing)
+        qdrant = MagicMock()
+        qdrant.collection_exists.return_value = False
+
+        def fake_embed(texts):
+            return [MOCK_EMBEDDING_VECTOR for _ in texts]
+
+        with patch("app.services.embedding_service.settings") as s, \
+             patch("app.services.embedding_service.get_supabase", return_value=sb), \
+             patch("app.services.embedding_service.get_qdrant", return_value=qdrant), \
+             patch("app.services.embedding_service._embed_texts", side_effect=fake_embed) as embed:
+            s.gemini_api_key = "fake-key"
+            s.qdrant_url = "http://localhost:6333"
+            from app.services.embedding_service import embed_chapter
+            embed_chapter(chapter_id=chapter["id"], novel_id=chapter["novel_id"])
+        return sb, qdrant, embed
+
+    def _chunks(self, chapter: dict) -> list[tuple[int, str]]:
+        from app.services.embedding_service import _chunk_content, _content_hash, _point_id
+        return [
+            (i, _point_id(chapter["id"], i, _content_hash(chunk)))
+            for i, chunk in enumerate(_chunk_content(chapter["content"]))
+        ]
+
+    def test_point_ids_are_deterministic(self):
+        from app.services.embedding_service import _point_id
+        assert _point_id("c1", 0, "abc") == _point_id("c1", 0, "abc")
+        assert _point_id("c1", 0, "abc") != _point_id("c1", 1, "abc")
+        assert _point_id("c1", 0, "abc") != _point_id("c1", 0, "abd")
+
+    def test_unchanged_chapter_is_not_reembedded(self):
+        existing = [{"chunk_index": i, "vector_id": pid} for i, pid in self._chunks(MOCK_CHAPTER_DB)]
+        _, qdrant, embed = self._run(MOCK_CHAPTER_DB, existing)
+        embed.assert_not_called()
+        qdrant.upsert.assert_not_called()
+        qdrant.delete.assert_not_called()
+
+    def test_only_changed_chunks_are_embedded_and_old_points_deleted(self):
+        chapter = {**MOCK_CHAPTER_DB, "content": "A" * 1400 + "\n\n" + "B" * 1400 + "\n\n" + "C" * 1400}
+        chunks = self._chunks(chapter)
+        assert len(chunks) == 3
+        existing = [{"chunk_index": i, "vector_id": pid} for i, pid in chunks]
+        existing[1] = {"chunk_index": 1, "vector_id": "old-point"}
+
+        sb, qdrant, embed = self._run(chapter, existing)
+
+        embed.assert_called_once_with(["B" * 1400])
+        points = qdrant.upsert.call_args.kwargs["points"]
+        assert [p.id for p in points] == [chunks[1][1]]
+        assert points[0].payload["text"] == "B" * 1400
+        assert qdrant.delete.call_args.kwargs["points_selector"].points == ["old-point"]
+        records = sb.table("novel_embeddings").upsert.call_args.args[0]
+        assert [r["chunk_index"] for r in records] == [1]
+        assert records[0]["content_hash"]
+
+    def test_removed_chunks_are_deleted(self):
+        chunks = self._chunks(MOCK_CHAPTER_DB)
+        existing = [{"chunk_index": i, "vector_id": pid} for i, pid in chunks]
+        existing.append({"chunk_index": len(chunks), "vector_id": "trailing-point"})
+
+        sb, qdrant, embed = self._run(MOCK_CHAPTER_DB, existing)
+
+        embed.assert_not_called()
+        assert qdrant.delete.call_args.kwargs["points_selector"].points == ["trailing-point"]
+        sb.table("novel_embeddings").delete().eq().gte.assert_called_with("chunk_index", len(chunks))
+
+
+# ── Unit: chunk_texts ────────────────────────────────────────────────────────
+
+class TestChunkTexts:
+    async def test_payload_text_needs_no_lookup(self):
+        from app.services.embedding_service import chunk_texts
+        sb = MagicMock()
+        hits = [MagicMock(id="p1", payload={"text": "one"}), MagicMock(id="p2", payload={"text": "two"})]
+        assert await chunk_texts(sb, hits) == ["one", "two"]
+        sb.table.assert_not_called()
+
+    async def test_legacy_points_fall_back_to_content_preview_in_hit_order(self):
+        from app.services.embedding_service import chunk_texts
+        sb = MagicMock()
+        sb.table.return_value.select.return_value.in_.return_value.execute = AsyncMock(return_value=MagicMock(
+            data=[{"vector_id": "p3", "content_preview": "three"}, {"vector_id": "p1", "content_preview": "one"}]
+        ))
+        hits = [
+            MagicMock(id="p1", payload={"novel_id": "n1"}),
+            MagicMock(id="p2", payload={"text": "two"}),
+            MagicMock(id="p3", payload=None),
+        ]
+        assert await chunk_texts(sb, hits) == ["one", "two", "three"]
+        sb.table.return_value.select.return_value.in_.assert_called_once_with("vector_id", ["p1", "p3"])
+
+
+# ── Unit: query embedding cache ──────────────────────────────────────────────
+
+class TestQueryEmbeddingCache:
+    async def test_variants_of_a_question_share_one_embedding(self):
+        from app.services import embedding_service
+        genai = MagicMock()
+        genai.embed_content_async = AsyncMock(return_value={"embedding": MOCK_EMBEDDING_VECTOR})
+        before = embedding_service._query_cache.stats()   # counters survive clear_all()
+        with patch.object(embedding_service, "get_genai", return_value=genai):
+            first = await embedding_service.embed_query("Ai là Lý Minh?")
+            second = await embedding_service.embed_query("  ai là   LÝ MINH ")
+        assert first == second == MOCK_EMBEDDING_VECTOR
+        genai.embed_content_async.assert_awaited_once_with(
+            model="models/text-embedding-004", content="ai là lý minh", task_type="RETRIEVAL_QUERY"
+        )
+        stats = embedding_service._query_cache.stats()
+        assert stats["hits"] - before["hits"] == 1
+        assert stats["misses"] - before["misses"] == 1
+
+    async def test_different_questions_are_embedded_separately(self):
+        from app.services import embedding_service
+        genai = MagicMock()
+        genai.embed_content_async = AsyncMock(return_value={"embedding": MOCK_EMBEDDING_VECTOR})
+        with patch.object(embedding_service, "get_genai", return_value=genai):
+            await embedding_service.embed_query("Ai là Lý Minh?")
+            await embedding_service.embed_query("Lý Minh ở đâu?")
+        assert genai.embed_content_async.call_count == 2
+
+    async def test_failed_embedding_is_not_cached(self):
+        from app.services import embedding_service
+        genai = MagicMock()
+        genai.embed_content_async = AsyncMock(side_effect=[RuntimeError("boom"), {"embedding": MOCK_EMBEDDING_VECTOR}])
+        with patch.object(embedding_service, "get_genai", return_value=genai):
+            with pytest.raises(RuntimeError):
+                await embedding_service.embed_query("Ai là Lý Minh?")
+            assert await embedding_service.embed_query("Ai là Lý Minh?") == MOCK_EMBEDDING_VECTOR
+
+
+# ── Unit: batched embedding ──────────────────────────────────────────────────
+
+class TestEmbedTextsBatching:
+    def test_texts_are_sent_in_batches_in_order(self):
+        calls = []
+
+        def fake_embed_content(model, content, task_type):
+            calls.append(list(content))
+            return {"embedding": [[float(text)] for text in content]}
+
+        genai = MagicMock()
+        genai.embed_content.side_effect = fake_embed_content
+        texts = [str(i) for i in range(7)]
+        from app.core.config import settings
+        with patch.object(settings, "gemini_embed_batch_size", 3), \
+             patch("app.services.embedding_service.get_genai", return_value=genai):
+            from app.services.embedding_service import _embed_texts
+            vectors = _embed_texts(texts)
+
+        assert sorted(calls) == [["0", "1", "2"], ["3", "4", "5"], ["6"]]
+        assert vectors == [[float(i)] for i in range(7)]
+
+    def test_single_batch_makes_one_request(self):
+        genai = MagicMock()
+        genai.embed_content.return_value = {"embedding": [MOCK_EMBEDDING_VECTOR] * 2}
+        with patch("app.services.embedding_service.get_genai", return_value=genai):
+            from app.services.embedding_service import _embed_texts
+            vectors = _embed_texts(["a", "b"])
+        genai.embed_content.assert_called_once()
+        assert genai.embed_content.call_args.kwargs["content"] == ["a", "b"]
+        assert len(vectors) == 2
+
+    def test_empty_input_makes_no_request(self):
+        genai = MagicMock()
+        with patch("app.services.embedding_service.get_genai", return_value=genai):
+            from app.services.embedding_service import _embed_texts
+            assert _embed_texts([]) == []
+        genai.embed_content.assert_not_called()
+
+
+class TestGeminiBackoff:
+    def test_retries_rate_limit_then_succeeds(self):
+        from app.core.gemini import call_with_backoff
+        fn = MagicMock(side_effect=[Exception("429 Resource has been exhausted"), "ok"])
+        with patch("app.core.gemini.time.sleep") as sleep:
+            assert call_with_backoff(fn, max_retries=3) == "ok"
+        assert fn.call_count == 2
+        sleep.assert_called_once()
+
+    def test_gives_up_after_max_retries(self):
+        from app.core.gemini import call_with_backoff
+        fn = MagicMock(side_effect=Exception("429 quota"))
+        with patch("app.core.gemini.time.sleep"), pytest.raises(Exception, match="429"):
+            call_with_backoff(fn, max_retries=2)
+        assert fn.call_count == 3
+
+    def test_other_errors_are_not_retried(self):
+        from app.core.gemini import call_with_backoff
+        fn = MagicMock(side_effect=ValueError("bad request"))
+        with patch("app.core.gemini.time.sleep") as sleep, pytest.raises(ValueError):
+            call_with_backoff(fn, max_retries=3)
+        assert fn.call_count == 1
+        sleep.assert_not_called()
+
+    def test_budget_blocks_when_window_is_full(self):
+        from app.core.gemini import RequestBudget
+        budget = RequestBudget(rpm=2, period=60.0)
+        budget.acquire()
+        budget.acquire()
+        with patch("app.core.gemini.time.sleep", side_effect=RuntimeError("would block")), \
+             pytest.raises(RuntimeError, match="would block"):
+            budget.acquire()
+
+    def test_budget_blocks_when_tokens_would_exceed_tpm(self):
+        from app.core.gemini import RequestBudget
+        budget = RequestBudget(rpm=100, period=60.0, tpm=1_000)
+        budget.acquire(600)
+        budget.acquire(400)
+        with patch("app.core.gemini.time.sleep", side_effect=RuntimeError("would block")), \
+             pytest.raises(RuntimeError, match="would block"):
+            budget.acquire(1)
+
+    def test_budget_lets_one_oversized_call_through(self):
+        from app.core.gemini import RequestBudget
+        budget = RequestBudget(rpm=100, period=60.0, tpm=1_000)
+        budget.acquire(5_000)
+
+
+class TestGenerateFanOut:
+    def test_yields_every_item_with_result_or_error(self):
+        from app.core.gemini import fan_out
+
+        def work(n):
+            if n == 3:
+                raise ValueError("bad chapter")
+            return n * 10
+
+        results = {item: (result, error) for item, result, error in fan_out(work, range(1, 6))}
+        assert {n: r for n, (r, e) in results.items() if e is None} == {1: 10, 2: 20, 4: 40, 5: 50}
+        assert isinstance(results[3][1], ValueError)
+
+    def test_runs_calls_in_parallel_up_to_the_limit(self):
+        import threading
+        import time as _time
+
+        from app.core.gemini import fan_out, settings
+
+        lock = threading.Lock()
+        running = peak = 0
+
+        def work(n):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            _time.sleep(0.02)
+            with lock:
+                running -= 1
+            return n
+
+        assert sorted(item for item, _, _ in fan_out(work, range(30))) == list(range(30))
+        assert 1 < peak <= settings.gemini_generate_concurrency
+
+    def test_generate_goes_through_shared_budget(self):
+        from app.core import gemini
+
+        model = MagicMock()
+        model.generate_content.return_value = "reply"
+        with patch.object(gemini, "generate_budget") as budget:
+            assert gemini.generate(model, "x" * 400) == "reply"
+        budget.return_value.acquire.assert_called_once_with(101)
+
+    async def test_stream_retries_rate_limit_before_first_chunk(self):
+        from app.core import gemini
+
+        async def chunks(*texts, fail_after=None):
+            for text in texts:
+                yield MagicMock(text=text)
+            if fail_after:
+                raise fail_after
+
+        model = MagicMock()
+        model.generate_content_async = AsyncMock(side_effect=[
+            Exception("429 Resource has been exhausted"),
+            chunks(fail_after=Exception("429 quota")),
+            chunks("a", "b"),
+        ])
+        with patch.object(gemini, "generate_budget") as budget, \
+             patch("app.core.gemini.asyncio.sleep", new_callable=AsyncMock) as sleep:
+            out = [chunk.text async for chunk in gemini.stream_generate(model, "x" * 400, max_retries=3)]
+        assert out == ["a", "b"]
+        assert budget.return_value.acquire.call_count == 3
+        assert sleep.await_count == 2
+
+    async def test_stream_does_not_retry_after_first_chunk(self):
+        from app.core import gemini
+
+        async def chunks():
+            yield MagicMock(text="a")
+            raise Exception("429 quota")
+
+        model = MagicMock()
+        model.generate_content_async = AsyncMock(return_value=chunks())
+        out = []
+        with patch.object(gemini, "generate_budget"), pytest.raises(Exception, match="429"):
+            async for chunk in gemini.stream_generate(model, "x", max_retries=3):
+                out.append(chunk.text)
+        assert out == ["a"]
+        model.generate_content_async.assert_awaited_once()
+
+
+# ── Unit: novel-wide embedding backfill ──────────────────────────────────────
+
+def _backfill_chapters(n: int) -> list[dict]:
+    return [
+        {"id": f"ch-{i}", "chapter_number": i, "content": f"Chương {i}.\n\nNội dung chương {i}."}
+        for i in range(1, n + 1)
+    ]
+
+
+class TestEmbeddingBackfill:
+    def _make_sb(self, pages: list[list[dict]], checkpoint: dict | None = None) -> tuple[MagicMock, dict]:
+        tables = {name: MagicMock() for name in ("chapters", "novel_embeddings", "embedding_backfills", "novels")}
+        sb = MagicMock()
+        sb.table.side_effect = lambda name: tables[name]
+
+        chapters_chain = tables["chapters"].select.return_value.eq.return_value.eq.return_value.eq.return_value
+        chapters_chain.gt.return_value.order.return_value.limit.return_value.execute.side_effect = [
+            MagicMock(data=page) for page in pages
+        ]
+        tables["novel_embeddings"].select.return_value.in_.return_value.execute.return_value = MagicMock(data=[])
+        row = checkpoint or {
+            "novel_id": "novel-uuid-1", "status": "queued", "last_chapter_number": -1, "chapters_done": 0,
+            "chapters_total": 0, "chunks_embedded": 0, "chunks_skipped": 0, "started_at": None,
+        }
+        tables["embedding_backfills"].select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = \
+            MagicMock(data=row)
+        tables["novels"].select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = \
+            MagicMock(data={"total_chapters": sum(len(p) for p in pages)})
+        return sb, tables
+
+    def _run(self, sb, embed=None):
+        qdrant = MagicMock()
+        qdrant.collection_exists.return_value = False
+        with patch("app.services.embedding_service.settings") as s, \
+             patch("app.services.embedding_service.get_supabase", return_value=sb), \
+             patch("app.services.embedding_service.get_qdrant", return_value=qdrant), \
+             patch("app.services.embedding_service._embed_texts",
+                   side_effect=embed or (lambda texts: [MOCK_EMBEDDING_VECTOR for _ in texts])):
+            s.gemini_api_key = "fake-key"
+            s.qdrant_url = "http://localhost:6333"
+            s.embed_backfill_page_size = 2
+            s.embed_backfill_prefetch = 1
+            from app.services.embedding_service import backfill_novel_embeddings
+            backfill_novel_embeddings("novel-uuid-1")
+        return qdrant
+
+    @staticmethod
+    def _saved(tables) -> list[dict]:
+        return [c.args[0] for c in tables["embedding_backfills"].update.call_args_list]
+
+    def test_pages_through_chapters_and_checkpoints_each_page(self):
+        chapters = _backfill_chapters(3)
+        sb, tables = self._make_sb([chapters[:2], chapters[2:]])
+
+        qdrant = self._run(sb)
+
+        assert qdrant.upsert.call_count == 2     # one upsert per page
+        saved = self._saved(tables)
+        checkpoints = [u["last_chapter_number"] for u in saved if u.get("status") == "running"]
+        assert checkpoints[-2:] == [2, 3]
+        final = saved[-1]
+        assert final["status"] == "completed"
+        assert final["chapters_done"] == 3
+        assert final["chapters_total"] == 3
+        assert final["chunks_embedded"] == 3
+        assert final["chapters_per_minute"] > 0
+
+    def test_first_page_includes_chapter_zero(self):
+        prologue = {"id": "ch-0", "chapter_number": 0, "content": "Mở đầu.\n\nNội dung mở đầu."}
+        chapters = [prologue, *_backfill_chapters(1)]
+        sb, tables = self._make_sb([chapters, []])
+
+        qdrant = self._run(sb)
+
+        chapters_chain = tables["chapters"].select.return_value.eq.return_value.eq.return_value.eq.return_value
+        assert chapters_chain.gt.call_args_list[0].args == ("chapter_number", -1)
+        assert qdrant.upsert.call_count == 1
+        assert self._saved(tables)[-1]["chapters_done"] == 2
+
+    def test_reset_starts_before_chapter_zero(self):
+        sb = MagicMock()
+        sb.table.return_value.upsert.return_value.execute.return_value = MagicMock(data=[{"novel_id": "novel-uuid-1"}])
+        with patch("app.services.embedding_service.get_supabase", return_value=sb), \
+             patch("app.services.embedding_service.get_backfill", return_value={"status": "completed"}):
+            from app.services.embedding_service import reset_backfill
+            reset_backfill("novel-uuid-1")
+        assert sb.table.return_value.upsert.call_args.args[0]["last_chapter_number"] == -1
+
+    def test_resumes_after_checkpoint(self):
+        chapters = _backfill_chapters(5)
+        checkpoint = {
+            "novel_id": "novel-uuid-1", "status": "failed", "last_chapter_number": 4, "chapters_done": 4,
+            "chapters_total": 5, "chunks_embedded": 4, "chunks_skipped": 0, "started_at": "2026-02-23T00:00:00+00:00",
+        }
+        sb, tables = self._make_sb([chapters[4:]], checkpoint)
+
+        self._run(sb)
+
+        chapters_chain = tables["chapters"].select.return_value.eq.return_value.eq.return_value.eq.return_value
+        chapters_chain.gt.assert_called_with("chapter_number", 4)
+        final = self._saved(tables)[-1]
+        assert final["status"] == "completed"
+        assert final["chapters_done"] == 5
+
+    def test_failure_marks_backfill_failed_and_reraises(self):
+        chapters = _backfill_chapters(4)
+        sb, tables = self._make_sb([chapters[:2], chapters[2:]])
+        calls = []
+
+        def flaky_embed(texts):
+            calls.append(texts)
+            if len(calls) == 2:
+                raise RuntimeError("quota")
+            return [MOCK_EMBEDDING_VECTOR for _ in texts]
+
+        with pytest.raises(RuntimeError, match="quota"):
+            self._run(sb, embed=flaky_embed)
+
+        final = self._saved(tables)[-1]
+        assert final["status"] == "failed"
+        assert "quota" in final["last_error"]
+        assert final["last_chapter_number"] == 2   # first page was written before the failure
+
+    def test_admin_start_enqueues_job(self, job_backend):
+        admin = {**MOCK_UPLOADER, "id": "admin-1", "role": "admin"}
+        progress = {
+            "novel_id": "novel-uuid-1", "status": "queued", "last_chapter_number": -1, "chapters_done": 0,
+            "chapters_total": 0, "chunks_embedded": 0, "chunks_skipped": 0,
+            "updated_at": "2026-02-23T00:00:00+00:00",
+        }
+        with patch("app.core.deps.get_supabase", return_value=_make_user_supabase_mock(admin)), \
+             patch("app.services.embedding_service.get_backfill", return_value=None), \
+             patch("app.services.embedding_service.reset_backfill", return_value=progress) as reset:
+            r = client.post(
+                "/api/v1/admin/novels/novel-uuid-1/embeddings/backfill",
+                headers={"Authorization": f"Bearer {_make_token('admin-1')}"},
+            )
+        assert r.status_code == 202
+        reset.assert_called_once_with("novel-uuid-1", restart=False)
+        [job] = job_backend.jobs.values()
+        assert job["job_type"] == "backfill_embeddings"
+        assert job["payload"] == {"novel_id": "novel-uuid-1"}
+
+    def test_admin_start_conflicts_while_running(self, job_backend):
+        admin = {**MOCK_UPLOADER, "id": "admin-1", "role": "admin"}
+        with patch("app.core.deps.get_supabase", return_value=_make_user_supabase_mock(admin)), \
+             patch("app.services.embedding_service.get_backfill", return_value={"status": "running"}):
+            r = client.post(
+                "/api/v1/admin/novels/novel-uuid-1/embeddings/backfill",
+                headers={"Authorization": f"Bearer {_make_token('admin-1')}"},
+            )
+        assert r.status_code == 409
+        assert job_backend.jobs == {}
 
 
 # ── Unit: extract_characters — graceful skip ─────────────────────────────────
@@ -292,25 +754,25 @@ class TestExtractCharactersPipeline:
             extract_characters(chapter_id="chapter-uuid-1", novel_id="novel-uuid-1", chapter_number=5)
         mock_sb.table.return_value.insert.assert_not_called()
 
-    def test_gemini_exception_does_not_propagate(self):
+    def test_gemini_exception_propagates_for_retry(self):
         mock_sb = self._make_sb()
         with patch("app.services.character_service.settings") as s, \
              patch("app.services.character_service.get_supabase", return_value=mock_sb), \
-             patch("app.services.character_service._extract_from_gemini", side_effect=Exception("API error")):
+             patch("app.services.character_service._extract_from_gemini", side_effect=Exception("API error")), \
+             pytest.raises(Exception, match="API error"):
             s.gemini_api_key = "fake-key"
             from app.services.character_service import extract_characters
             extract_characters(chapter_id="chapter-uuid-1", novel_id="novel-uuid-1", chapter_number=5)
 
 
-# ── Integration: chapter publish → background tasks triggered ────────────────
+# ── Integration: chapter publish → jobs enqueued ─────────────────────────────
 
-class TestChapterPublishTriggersBackgroundTasks:
-    def test_create_published_chapter_schedules_both_tasks(self):
+class TestChapterPublishEnqueuesJobs:
+    def test_create_published_chapter_enqueues_both_jobs(self, job_backend):
         tok = _make_token(user_id="uploader-123")
         with patch("app.core.deps.get_supabase") as ms, \
              patch("app.services.chapter_service.create_chapter", return_value=MOCK_CHAPTER_RESPONSE), \
-             patch("app.services.embedding_service.embed_chapter") as mock_embed, \
-             patch("app.services.character_service.extract_characters") as mock_extract:
+             patch("app.services.embedding_service.embed_chapter") as mock_embed:
             ms.return_value = _make_user_supabase_mock(MOCK_UPLOADER)
             r = client.post(
                 "/api/v1/novels/novel-uuid-1/chapters",
@@ -318,15 +780,16 @@ class TestChapterPublishTriggersBackgroundTasks:
                 headers={"Authorization": f"Bearer {tok}"},
             )
         assert r.status_code == 201
-        assert mock_embed.call_count == 1
-        assert mock_extract.call_count == 1
+        jobs = sorted(job_backend.jobs.values(), key=lambda j: j["job_type"])
+        assert [j["job_type"] for j in jobs] == ["compute_relationships", "embed_chapter", "extract_characters"]
+        assert jobs[1]["payload"] == {"chapter_id": "chapter-uuid-1", "novel_id": "novel-uuid-1"}
+        mock_embed.assert_not_called()   # runs in the job worker, not the request
 
-    def test_create_draft_chapter_does_not_schedule_tasks(self):
+    def test_create_draft_chapter_does_not_enqueue_jobs(self, job_backend):
         tok = _make_token(user_id="uploader-123")
         with patch("app.core.deps.get_supabase") as ms, \
              patch("app.services.chapter_service.create_chapter", return_value={**MOCK_CHAPTER_RESPONSE, "status": "draft"}), \
-             patch("app.services.embedding_service.embed_chapter") as mock_embed, \
-             patch("app.services.character_service.extract_characters") as mock_extract:
+             patch("app.services.embedding_service.embed_chapter") as mock_embed:
             ms.return_value = _make_user_supabase_mock(MOCK_UPLOADER)
             r = client.post(
                 "/api/v1/novels/novel-uuid-1/chapters",
@@ -334,17 +797,16 @@ class TestChapterPublishTriggersBackgroundTasks:
                 headers={"Authorization": f"Bearer {tok}"},
             )
         assert r.status_code == 201
-        assert mock_embed.call_count == 0
-        assert mock_extract.call_count == 0
+        assert job_backend.jobs == {}
+        mock_embed.assert_not_called()
 
-    def test_update_to_published_schedules_tasks(self):
+    def test_update_to_published_enqueues_jobs(self, job_backend):
         tok = _make_token(user_id="uploader-123")
         old_chapter = {**MOCK_CHAPTER_RESPONSE, "status": "draft"}
         with patch("app.core.deps.get_supabase") as ms, \
              patch("app.services.chapter_service.get_chapter", return_value=old_chapter), \
              patch("app.services.chapter_service.update_chapter", return_value=MOCK_CHAPTER_RESPONSE), \
-             patch("app.services.embedding_service.embed_chapter") as mock_embed, \
-             patch("app.services.character_service.extract_characters") as mock_extract:
+             patch("app.services.embedding_service.embed_chapter") as mock_embed:
             ms.return_value = _make_user_supabase_mock(MOCK_UPLOADER)
             r = client.patch(
                 "/api/v1/novels/novel-uuid-1/chapters/5",
@@ -352,18 +814,19 @@ class TestChapterPublishTriggersBackgroundTasks:
                 headers={"Authorization": f"Bearer {tok}"},
             )
         assert r.status_code == 200
-        assert mock_embed.call_count == 1
-        assert mock_extract.call_count == 1
+        jobs = sorted(job_backend.jobs.values(), key=lambda j: j["job_type"])
+        assert [j["job_type"] for j in jobs] == ["compute_relationships", "embed_chapter", "extract_characters"]
+        assert jobs[1]["payload"] == {"chapter_id": "chapter-uuid-1", "novel_id": "novel-uuid-1"}
+        mock_embed.assert_not_called()   # runs in the job worker, not the request
 
-    def test_update_already_published_chapter_does_not_reschedule(self):
+    def test_update_already_published_chapter_does_not_reenqueue(self, job_backend):
         """Editing an already-published chapter (e.g. fixing a typo) does not re-embed."""
         tok = _make_token(user_id="uploader-123")
         already_published = {**MOCK_CHAPTER_RESPONSE, "status": "published"}
         with patch("app.core.deps.get_supabase") as ms, \
              patch("app.services.chapter_service.get_chapter", return_value=already_published), \
              patch("app.services.chapter_service.update_chapter", return_value=already_published), \
-             patch("app.services.embedding_service.embed_chapter") as mock_embed, \
-             patch("app.services.character_service.extract_characters") as mock_extract:
+             patch("app.services.embedding_service.embed_chapter") as mock_embed:
             ms.return_value = _make_user_supabase_mock(MOCK_UPLOADER)
             r = client.patch(
                 "/api/v1/novels/novel-uuid-1/chapters/5",
@@ -371,27 +834,28 @@ class TestChapterPublishTriggersBackgroundTasks:
                 headers={"Authorization": f"Bearer {tok}"},
             )
         assert r.status_code == 200
-        assert mock_embed.call_count == 0
-        assert mock_extract.call_count == 0
+        assert job_backend.jobs == {}
+        mock_embed.assert_not_called()
 
 
-# ── Integration: crawl publish → background tasks triggered ──────────────────
+# ── Integration: crawl publish → jobs enqueued ───────────────────────────────
 
-class TestCrawlPublishTriggersBackgroundTasks:
-    def test_publish_queue_item_schedules_both_tasks(self):
+class TestCrawlPublishEnqueuesJobs:
+    def test_publish_queue_item_enqueues_both_jobs(self, job_backend):
         tok = _make_token(user_id="uploader-123")
         with patch("app.core.deps.get_supabase") as ms, \
              patch("app.services.crawl_service.publish_queue_item", return_value=MOCK_CHAPTER_RESPONSE), \
-             patch("app.services.embedding_service.embed_chapter") as mock_embed, \
-             patch("app.services.character_service.extract_characters") as mock_extract:
+             patch("app.services.embedding_service.embed_chapter") as mock_embed:
             ms.return_value = _make_user_supabase_mock(MOCK_UPLOADER)
             r = client.post(
                 "/api/v1/crawl/queue/queue-item-1/publish",
                 headers={"Authorization": f"Bearer {tok}"},
             )
         assert r.status_code == 201
-        assert mock_embed.call_count == 1
-        assert mock_extract.call_count == 1
+        jobs = sorted(job_backend.jobs.values(), key=lambda j: j["job_type"])
+        assert [j["job_type"] for j in jobs] == ["compute_relationships", "embed_chapter", "extract_characters"]
+        assert jobs[1]["payload"] == {"chapter_id": "chapter-uuid-1", "novel_id": "novel-uuid-1"}
+        mock_embed.assert_not_called()   # runs in the job worker, not the request
 
 
 # ── Unit: get_qdrant client ───────────────────────────────────────────────────
@@ -415,3 +879,71 @@ class TestGetQdrantClient:
             result = qdrant_module.get_qdrant()
         qdrant_module.get_qdrant.cache_clear()
         assert result is mock_client
+
+    async def test_async_client_is_closed_on_shutdown(self):
+        import app.core.qdrant as qdrant_module
+        mock_client = MagicMock()
+        mock_client.close = AsyncMock()
+        qdrant_module.get_async_qdrant.cache_clear()
+        with patch.object(qdrant_module.settings, "qdrant_url", "http://localhost:6333"), \
+             patch("qdrant_client.AsyncQdrantClient", return_value=mock_client):
+            assert qdrant_module.get_async_qdrant() is mock_client
+            await qdrant_module.close_async_qdrant()
+        mock_client.close.assert_awaited_once()
+        assert qdrant_module.get_async_qdrant.cache_info().currsize == 0
+
+
+# ── Unit: shared collection mode ─────────────────────────────────────────────
+
+class TestSharedCollection:
+    def test_per_novel_mode_is_default(self):
+        from app.core.qdrant import collection_for, novel_filter
+        assert collection_for("n1") == "novel_n1"
+        assert novel_filter("n1") is None
+
+    def test_shared_mode_routes_to_shared_collection_with_novel_filter(self):
+        import app.core.qdrant as qdrant_module
+        with patch.object(qdrant_module.settings, "qdrant_collection_mode", "shared"):
+            assert qdrant_module.collection_for("n1") == qdrant_module.settings.qdrant_shared_collection
+            condition, = qdrant_module.novel_filter("n1").must
+        assert condition.key == "novel_id"
+        assert condition.match.value == "n1"
+
+    def test_ensure_collection_checks_qdrant_once(self):
+        from app.core.qdrant import ensure_collection
+        client = MagicMock()
+        client.collection_exists.return_value = False
+        ensure_collection(client, "novel_n1")
+        ensure_collection(client, "novel_n1")
+        client.collection_exists.assert_called_once_with("novel_n1")
+        client.create_collection.assert_called_once()
+        client.create_payload_index.assert_not_called()
+
+    def test_shared_collection_gets_payload_indexes(self):
+        import app.core.qdrant as qdrant_module
+        client = MagicMock()
+        client.collection_exists.return_value = True
+        qdrant_module.ensure_collection(client, qdrant_module.settings.qdrant_shared_collection)
+        client.create_collection.assert_not_called()
+        fields = {c.args[1] for c in client.create_payload_index.call_args_list}
+        assert fields == {"novel_id", "chapter_number"}
+
+    def test_migrate_copies_novel_collections(self):
+        from app.workers import qdrant_migrate
+        client = MagicMock()
+        client.collection_exists.return_value = True
+        cols = [MagicMock(), MagicMock(), MagicMock()]
+        for col, name in zip(cols, ["novel_a", "novel_chunks", "other"]):
+            col.name = name
+        client.get_collections.return_value.collections = cols
+        page1 = [MagicMock(id="p1", vector=[0.1], payload={"novel_id": "a"})]
+        page2 = [MagicMock(id="p2", vector=[0.2], payload={"novel_id": "a"})]
+        client.scroll.side_effect = [(page1, "p2"), (page2, None)]
+
+        copied = qdrant_migrate.migrate(client, delete_source=True)
+
+        assert copied == {"novel_a": 2}
+        assert client.upsert.call_count == 2
+        assert all(c.kwargs["collection_name"] == "novel_chunks" for c in client.upsert.call_args_list)
+        assert client.upsert.call_args_list[1].kwargs["points"][0].id == "p2"
+        client.delete_collection.assert_called_once_with("novel_a")
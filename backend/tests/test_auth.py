@@ -1,6 +1,8 @@
 """Tests for JWT auth middleware and /auth/me endpoint."""
 from unittest.mock import MagicMock, patch
 
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -41,6 +43,20 @@ MOCK_USER = {
 }
 
 
+def _users_supabase(user: dict | None) -> MagicMock:
+    mock_client = MagicMock()
+    mock_client.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value.data = user
+    return mock_client
+
+
+@pytest.fixture(autouse=True)
+def profile_supabase():
+    """/auth/me reads the full profile through user_service."""
+    sb = _users_supabase(MOCK_USER)
+    with patch("app.services.user_service.get_supabase", return_value=sb):
+        yield sb
+
+
 class TestHealthEndpoint:
     def test_health_returns_ok(self):
         response = client.get("/api/v1/health")
@@ -90,6 +106,120 @@ class TestAuthMiddleware:
         assert response.status_code == 403
 
 
+class TestPrincipalCache:
+    def _users_mock(self, user: dict) -> MagicMock:
+        mock_result = MagicMock()
+        mock_result.data = user
+        mock_client = MagicMock()
+        mock_client.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = mock_result
+        return mock_client
+
+    def test_user_row_is_loaded_once_per_ttl(self):
+        token = make_valid_token()
+        sb = self._users_mock(MOCK_USER)
+        with patch("app.core.deps.get_supabase", return_value=sb):
+            for _ in range(3):
+                assert client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+        assert sb.table.return_value.select.call_count == 1
+
+    def test_ban_invalidates_cached_principal(self):
+        from app.services import admin_service
+        token = make_valid_token()
+        with patch("app.core.deps.get_supabase", return_value=self._users_mock(MOCK_USER)):
+            assert client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+        admin_sb = MagicMock()
+        admin_sb.table.return_value.update.return_value.eq.return_value.execute.return_value.data = [MOCK_USER]
+        with patch("app.services.admin_service.get_supabase", return_value=admin_sb):
+            admin_service.ban_user("test-user-uuid", None)
+
+        banned = {**MOCK_USER, "is_banned": True, "ban_until": None}
+        with patch("app.core.deps.get_supabase", return_value=self._users_mock(banned)):
+            assert client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+    async def test_ban_is_seen_on_same_replica_with_l2(self):
+        from collections import Counter
+
+        from fastapi.security import HTTPAuthorizationCredentials
+
+        from app.core import shared_cache
+        from app.core.deps import get_current_user
+        from app.services import admin_service
+        from tests.test_shared_cache import FakeAsyncRedis
+
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=make_valid_token())
+        with patch("app.core.shared_cache.get_async_redis", return_value=FakeAsyncRedis()), \
+             patch.object(shared_cache, "_generations", {}), \
+             patch.object(shared_cache, "_outbox", []), \
+             patch.object(shared_cache, "_pending", Counter()):
+            with patch("app.core.deps.get_supabase", return_value=self._users_mock(MOCK_USER)):
+                assert (await get_current_user(credentials))["id"] == "test-user-uuid"
+
+            admin_sb = MagicMock()
+            admin_sb.table.return_value.update.return_value.eq.return_value.execute.return_value.data = [MOCK_USER]
+            with patch("app.services.admin_service.get_supabase", return_value=admin_sb):
+                admin_service.ban_user("test-user-uuid", None)
+
+            banned = {**MOCK_USER, "is_banned": True, "ban_until": None}
+            with patch("app.core.deps.get_supabase", return_value=self._users_mock(banned)), \
+                 pytest.raises(HTTPException) as exc_info:
+                await get_current_user(credentials)
+        assert exc_info.value.status_code == 403
+
+    def test_token_issued_after_load_rereads_user(self):
+        import time
+
+        from jose import jwt
+
+        from app.core.config import settings
+        old = jwt.encode({"sub": "test-user-uuid", "iat": int(time.time()) - 60},
+                         settings.supabase_jwt_secret, algorithm="HS256")
+        fresh = jwt.encode({"sub": "test-user-uuid", "iat": int(time.time()) + 5},
+                           settings.supabase_jwt_secret, algorithm="HS256")
+        sb = self._users_mock(MOCK_USER)
+        with patch("app.core.deps.get_supabase", return_value=sb):
+            client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {old}"})
+            client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {old}"})
+            client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {fresh}"})
+        assert sb.table.return_value.select.call_count == 2
+
+    def test_principal_caches_only_authorization_columns(self):
+        token = make_valid_token()
+        sb = self._users_mock(MOCK_USER)
+        with patch("app.core.deps.get_supabase", return_value=sb):
+            client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
+        columns = sb.table.return_value.select.call_args.args[0]
+        assert "daily_nominations" not in columns
+        assert {"id", "role", "is_banned", "ban_until", "vip_tier", "vip_expires_at"} <= {
+            c.strip() for c in columns.split(",")
+        }
+
+    def test_me_reads_counters_fresh_while_principal_is_cached(self, profile_supabase):
+        token = make_valid_token()
+        with patch("app.core.deps.get_supabase", return_value=self._users_mock(MOCK_USER)):
+            assert client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}).json()[
+                "daily_nominations"] == 0
+            profile_supabase.table.return_value.select.return_value.eq.return_value.single.return_value \
+                .execute.return_value.data = {**MOCK_USER, "daily_nominations": 2, "chapters_read": 7}
+            data = client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}).json()
+        assert data["daily_nominations"] == 2
+        assert data["chapters_read"] == 7
+
+    def test_expired_token_rejected_even_when_memoized(self):
+        import time
+
+        from jose import jwt
+
+        from app.core.config import settings
+        from app.core.security import decode_jwt
+        token = jwt.encode({"sub": "u", "exp": int(time.time()) + 60},
+                           settings.supabase_jwt_secret, algorithm="HS256")
+        assert decode_jwt(token)["sub"] == "u"
+        with patch("app.core.security.time.time", return_value=time.time() + 120):
+            with pytest.raises(ValueError):
+                decode_jwt(token)
+
+
 class TestUserEndpoints:
     def test_get_user_not_found(self):
         mock_result = MagicMock()
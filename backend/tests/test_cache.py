@@ -0,0 +1,89 @@
+"""Tests for the in-process TTL/LRU cache and the catalog caching built on it."""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.cache import TTLCache
+
+
+class TestTTLCache:
+    def test_lru_evicts_least_recently_used(self):
+        c = TTLCache("t", maxsize=2, ttl=60)
+        c.set("a", 1)
+        c.set("b", 2)
+        assert c.get("a") == 1          # "a" is now most recent
+        c.set("c", 3)
+        assert c.get("b") is None
+        assert c.get("a") == 1 and c.get("c") == 3
+        assert c.stats()["evictions"] == 1
+
+    def test_entries_expire_after_ttl(self):
+        c = TTLCache("t", maxsize=10, ttl=60)
+        with patch("app.core.cache.time.monotonic", return_value=1000.0):
+            c.set("a", 1, ttl=5)
+        with patch("app.core.cache.time.monotonic", return_value=1004.0):
+            assert c.get("a") == 1
+        with patch("app.core.cache.time.monotonic", return_value=1006.0):
+            assert c.get("a") is None
+        assert c.stats()["hits"] == 1
+        assert c.stats()["misses"] == 1
+
+    async def test_concurrent_misses_share_one_load(self):
+        c = TTLCache("t", maxsize=10, ttl=60)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(c.get_or_load("k", loader) for _ in range(20)))
+        assert results == ["value"] * 20
+        assert calls == 1
+        assert await c.get_or_load("k", loader) == "value"
+        assert calls == 1
+
+    async def test_loader_error_is_not_cached(self):
+        c = TTLCache("t", maxsize=10, ttl=60)
+        failing = AsyncMock(side_effect=RuntimeError("db down"))
+        for _ in range(2):
+            try:
+                await c.get_or_load("k", failing)
+            except RuntimeError:
+                pass
+        assert failing.await_count == 2
+        assert c.stats()["size"] == 0
+
+    async def test_invalidation_during_load_discards_result(self):
+        c = TTLCache("t", maxsize=10, ttl=60)
+
+        async def loader():
+            c.invalidate("k")        # a write lands while the read is in flight
+            return "stale"
+
+        assert await c.get_or_load("k", loader) == "stale"
+        assert c.get("k") is None
+
+
+class TestCatalogCache:
+    async def test_featured_is_cached_until_pin(self):
+        from app.services import admin_service, novel_service
+        rows = MagicMock()
+        rows.data = []
+        sb = MagicMock()
+        sb.table.return_value.select.return_value.eq.return_value.eq.return_value \
+            .order.return_value.execute = AsyncMock(return_value=rows)
+        with patch("app.services.novel_service.get_async_supabase", return_value=sb):
+            await novel_service.get_featured_novels()
+            await novel_service.get_featured_novels()
+            assert sb.table.call_count == 1
+
+            pinned = MagicMock()
+            pinned.data = [{"id": "novel-1", "is_pinned": True}]
+            admin_sb = MagicMock()
+            admin_sb.table.return_value.update.return_value.eq.return_value.execute.return_value = pinned
+            with patch("app.services.admin_service.get_supabase", return_value=admin_sb):
+                admin_service.pin_novel("novel-1")
+
+            await novel_service.get_featured_novels()
+            assert sb.table.call_count == 2
@@ -1,6 +1,7 @@
 """Tests for chapters API endpoints."""
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
@@ -45,7 +46,7 @@ MOCK_READING_PROGRESS = {
     "user_id": "reader-uuid",
     "novel_id": NOVEL_ID,
     "last_chapter_read": CHAPTER_NUM,
-    "chapters_read_list": [CHAPTER_NUM],
+    "chapters_read_count": 1,
     "updated_at": "2026-01-01T12:00:00+00:00",
 }
 
@@ -150,6 +151,53 @@ class TestGetChapter:
         assert r.status_code == 403
 
 
+def _make_reader_rpc_mock(payload):
+    r = MagicMock()
+    r.data = payload
+    c = MagicMock()
+    c.rpc.return_value.execute = AsyncMock(return_value=r)
+    return c
+
+
+class TestChapterReaderService:
+    async def test_nav_comes_from_single_rpc(self):
+        """get_chapter_with_nav issues one get_chapter_reader call and hides the uploader id."""
+        from app.services import chapter_service
+        payload = {**MOCK_CHAPTER_CONTENT, "prev_chapter": 4, "next_chapter": 7,
+                   "novel_uploader_id": "uploader-uuid"}
+        sb = _make_reader_rpc_mock(payload)
+        with patch("app.services.chapter_service.get_async_supabase", return_value=sb):
+            result = await chapter_service.get_chapter_with_nav(NOVEL_ID, 5, None)
+        sb.rpc.assert_called_once_with(
+            "get_chapter_reader", {"p_novel_id": NOVEL_ID, "p_chapter_number": 5}
+        )
+        sb.table.assert_not_called()
+        assert result["prev_chapter"] == 4 and result["next_chapter"] == 7
+        assert "novel_uploader_id" not in result
+
+    async def test_missing_chapter_raises_404(self):
+        from app.services import chapter_service
+        sb = _make_reader_rpc_mock(None)
+        with patch("app.services.chapter_service.get_async_supabase", return_value=sb):
+            with pytest.raises(HTTPException) as exc:
+                await chapter_service.get_chapter_with_nav(NOVEL_ID, 9999, None)
+        assert exc.value.status_code == 404
+
+    async def test_scheduled_chapter_readable_by_uploader(self):
+        """Early-access gate uses the uploader id returned by the RPC, no extra query."""
+        from app.services import chapter_service
+        payload = {**MOCK_CHAPTER_CONTENT, "publish_at": "2999-01-01T00:00:00+00:00",
+                   "novel_uploader_id": "uploader-uuid"}
+        sb = _make_reader_rpc_mock(payload)
+        with patch("app.services.chapter_service.get_async_supabase", return_value=sb):
+            result = await chapter_service.get_chapter_with_nav(NOVEL_ID, 1, MOCK_USER_UPLOADER)
+            with pytest.raises(HTTPException) as exc:
+                await chapter_service.get_chapter_with_nav(NOVEL_ID, 1, MOCK_USER_READER)
+        assert result["id"] == MOCK_CHAPTER_CONTENT["id"]
+        assert exc.value.status_code == 403
+        sb.table.assert_not_called()
+
+
 class TestUpdateChapter:
     def test_update_chapter_no_auth_gets_401(self):
         """Test 8: PATCH /novels/{id}/chapters/{num} without auth returns 401."""
@@ -173,6 +221,40 @@ class TestUpdateChapter:
         assert r.status_code == 200
         assert r.json()["title"] == "Updated Title"
 
+    def _patch(self, tok: str, before: dict, after: dict, body: dict):
+        with patch("app.core.deps.get_supabase", return_value=_make_user_supabase_mock(MOCK_USER_UPLOADER)), \
+             patch("app.services.chapter_service.get_chapter", return_value=before), \
+             patch("app.services.chapter_service.update_chapter", return_value=after):
+            return client.patch(
+                f"/api/v1/novels/{NOVEL_ID}/chapters/{CHAPTER_NUM}",
+                json=body,
+                headers={"Authorization": f"Bearer {tok}"},
+            )
+
+    def test_content_edit_on_published_chapter_reembeds(self, job_backend):
+        """Editing a live chapter's text queues embed_chapter only."""
+        before = {**MOCK_CHAPTER_LIST_ITEM, "content": "Old text."}
+        after = {**before, "content": "New text."}
+        r = self._patch(make_token(user_id="uploader-uuid"), before, after, {"content": "New text."})
+        assert r.status_code == 200
+        jobs = list(job_backend.jobs.values())
+        assert [job["job_type"] for job in jobs] == ["embed_chapter"]
+        assert jobs[0]["idempotency_key"] == f"embed_chapter:{MOCK_CHAPTER_LIST_ITEM['id']}"
+
+    def test_title_edit_does_not_reembed(self, job_backend):
+        before = {**MOCK_CHAPTER_LIST_ITEM, "content": "Old text."}
+        after = {**before, "title": "Updated Title"}
+        r = self._patch(make_token(user_id="uploader-uuid"), before, after, {"title": "Updated Title"})
+        assert r.status_code == 200
+        assert job_backend.jobs == {}
+
+    def test_content_edit_on_draft_does_not_reembed(self, job_backend):
+        before = {**MOCK_CHAPTER_LIST_ITEM, "status": "draft", "content": "Old text."}
+        after = {**before, "content": "New text."}
+        r = self._patch(make_token(user_id="uploader-uuid"), before, after, {"content": "New text."})
+        assert r.status_code == 200
+        assert job_backend.jobs == {}
+
 
 class TestDeleteChapter:
     def test_delete_chapter_404_for_missing(self):
@@ -218,7 +300,20 @@ class TestMarkRead:
         assert r.status_code == 200
         data = r.json()
         assert data["last_chapter_read"] == CHAPTER_NUM
-        assert CHAPTER_NUM in data["chapters_read_list"]
+        assert data["chapters_read_count"] == 1
+
+    def test_mark_read_negative_chapter_gets_422(self):
+        """A negative chapter number is rejected before the service is called."""
+        tok = make_token(user_id="reader-uuid", role="reader")
+        with patch("app.core.deps.get_supabase") as ms, \
+             patch("app.services.chapter_service.mark_chapter_read") as mr:
+            ms.return_value = _make_user_supabase_mock(MOCK_USER_READER)
+            r = client.post(
+                f"/api/v1/novels/{NOVEL_ID}/chapters/-1/read",
+                headers={"Authorization": f"Bearer {tok}"},
+            )
+        assert r.status_code == 422
+        mr.assert_not_called()
 
 
 class TestUserLibrary:
@@ -233,7 +328,7 @@ class TestUserLibrary:
             {
                 "novel_id": NOVEL_ID,
                 "last_chapter_read": 5,
-                "chapters_read_list": [1, 2, 3, 4, 5],
+                "chapters_read_count": 5,
                 "updated_at": "2026-01-10T12:00:00+00:00",
                 "novel": {
                     "id": NOVEL_ID,
@@ -256,3 +351,56 @@ class TestUserLibrary:
         assert len(data) == 1
         assert data[0]["novel"]["title"] == "Test Novel Title"
         assert data[0]["last_chapter_read"] == 5
+
+
+class TestReadingProgressBitmap:
+    def test_codec_round_trip_matches_postgres_bit_order(self):
+        """Chapter n is bit n % 8 of byte n // 8, LSB first (Postgres set_bit order)."""
+        from app.services import chapter_service
+        bitmap = chapter_service.encode_read_bitmap({0, 1, 2, 9, 10, 11, 40})
+        assert bitmap[0] == 0b0000_0111
+        assert bitmap[1] == 0b0000_1110
+        assert chapter_service.bitmap_has_chapter(bitmap, 40)
+        assert not chapter_service.bitmap_has_chapter(bitmap, 3)
+        assert not chapter_service.bitmap_has_chapter(bitmap, 10_000)
+        assert chapter_service.bitmap_to_ranges(bitmap) == [[0, 2], [9, 11], [40, 40]]
+        assert chapter_service.decode_read_bitmap("\\x" + bitmap.hex()) == bitmap
+
+    async def test_mark_read_counts_only_first_reads(self):
+        """mark_chapter_read makes one RPC and buffers a view only when is_new."""
+        from app.services import chapter_service
+        for is_new, expected_calls in ((True, 1), (False, 0)):
+            sb = _make_reader_rpc_mock({**MOCK_READING_PROGRESS, "is_new": is_new})
+            with patch("app.services.chapter_service.get_async_supabase", return_value=sb), \
+                 patch("app.services.view_counter_service.record_read") as rec:
+                result = await chapter_service.mark_chapter_read(NOVEL_ID, CHAPTER_NUM, "reader-uuid")
+            sb.rpc.assert_called_once_with("record_chapter_read", {
+                "p_user_id": "reader-uuid", "p_novel_id": NOVEL_ID, "p_chapter_number": CHAPTER_NUM,
+            })
+            sb.table.assert_not_called()
+            assert rec.call_count == expected_calls
+            assert "is_new" not in result
+
+    async def test_mark_read_of_missing_chapter_is_404(self):
+        """record_chapter_read returns NULL for unpublished chapters; no view is counted."""
+        from fastapi import HTTPException
+
+        from app.services import chapter_service
+        sb = _make_reader_rpc_mock(None)
+        with patch("app.services.chapter_service.get_async_supabase", return_value=sb), \
+             patch("app.services.view_counter_service.record_read") as rec:
+            with pytest.raises(HTTPException) as exc:
+                await chapter_service.mark_chapter_read(NOVEL_ID, 2147483647, "reader-uuid")
+        assert exc.value.status_code == 404
+        rec.assert_not_called()
+
+    def test_progress_endpoint_returns_ranges(self):
+        """GET /novels/{id}/progress returns read chapters as ranges, not a list."""
+        tok = make_token(user_id="reader-uuid", role="reader")
+        detail = {**MOCK_READING_PROGRESS, "chapters_read_ranges": [[1, 3]]}
+        with patch("app.core.deps.get_supabase") as ms, \
+             patch("app.services.chapter_service.get_reading_progress", return_value=detail):
+            ms.return_value = _make_user_supabase_mock(MOCK_USER_READER)
+            r = client.get(f"/api/v1/novels/{NOVEL_ID}/progress", headers={"Authorization": f"Bearer {tok}"})
+        assert r.status_code == 200
+        assert r.json()["chapters_read_ranges"] == [[1, 3]]
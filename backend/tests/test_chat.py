@@ -1,5 +1,5 @@
 """Tests for M17 Chat with Characters (RAG) — service and API layers."""
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
@@ -52,6 +52,22 @@ MOCK_SESSION = {
 MOCK_EMBEDDING_VECTOR = [0.01] * 768
 
 
+async def _astream(chunks):
+    """Stands in for the chunks gemini.stream_generate yields."""
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(stream) -> list[str]:
+    return [event async for event in stream]
+
+
+def _async_qdrant() -> MagicMock:
+    qdrant = MagicMock()
+    qdrant.search = AsyncMock(return_value=[])
+    return qdrant
+
+
 def _make_token(user_id: str = USER_ID) -> str:
     from jose import jwt
     from app.core.config import settings
@@ -360,221 +376,158 @@ class TestVipGate:
 # ---------------------------------------------------------------------------
 
 class TestRagPipeline:
-    def _make_full_sb(self, progress: int = 5) -> MagicMock:
-        """Mock Supabase client for stream_message flow."""
+    @staticmethod
+    def _make_full_sb(progress: int | None = 5, session: dict | None = MOCK_SESSION) -> MagicMock:
+        """Async Supabase mock for stream_message flow, one query chain per table."""
+        tables = {name: MagicMock() for name in ("chat_sessions", "characters", "reading_progress")}
         sb = MagicMock()
+        sb.table.side_effect = lambda name: tables[name]
+        sb.tables = tables
 
         # session fetch
-        sb.table("chat_sessions").select("*").eq("id", SESSION_ID).eq(
-            "user_id", USER_ID
-        ).maybe_single().execute.return_value = MagicMock(data=MOCK_SESSION)
-
+        tables["chat_sessions"].select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute = \
+            AsyncMock(return_value=MagicMock(data=session))
         # character fetch
-        sb.table("characters").select("name, description, traits").eq(
-            "id", CHARACTER_ID
-        ).maybe_single().execute.return_value = MagicMock(data=MOCK_CHARACTER)
-
+        tables["characters"].select.return_value.eq.return_value.maybe_single.return_value.execute = \
+            AsyncMock(return_value=MagicMock(data=MOCK_CHARACTER))
         # reading progress
-        sb.table("reading_progress").select("last_chapter_read").eq(
-            "user_id", USER_ID
-        ).eq("novel_id", NOVEL_ID).maybe_single().execute.return_value = MagicMock(
-            data={"last_chapter_read": progress}
-        )
-
-        # novel_embeddings chunks
-        sb.table("novel_embeddings").select("content_preview").in_(
-            "vector_id", MagicMock()
-        ).execute.return_value = MagicMock(
-            data=[{"content_preview": "Đoạn văn liên quan..."}]
-        )
-
+        tables["reading_progress"].select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute = \
+            AsyncMock(return_value=MagicMock(data=None if progress is None else {"last_chapter_read": progress}))
         # chat_sessions update
-        sb.table("chat_sessions").update(MagicMock()).eq(
-            "id", SESSION_ID
-        ).execute.return_value = MagicMock(data=[MOCK_SESSION])
-
+        tables["chat_sessions"].update.return_value.eq.return_value.execute = \
+            AsyncMock(return_value=MagicMock(data=[MOCK_SESSION]))
         return sb
 
-    def test_skips_qdrant_when_not_configured(self):
+    async def test_skips_qdrant_when_not_configured(self):
         """stream_message yields tokens even when Qdrant is unconfigured."""
         from app.services.chat_service import stream_message
 
         mock_gemini_response = [MagicMock(text="Tôi "), MagicMock(text="là "), MagicMock(text="Lý Minh.")]
-        sb = MagicMock()
-        # all DB calls return valid mocks
-        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_SESSION
-        )
-        sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_CHARACTER
-        )
+        sb = self._make_full_sb()
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=None), \
-             patch("app.services.chat_service.get_supabase", return_value=sb), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION):
+             patch("app.services.chat_service.get_async_qdrant", return_value=None), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = ""
 
-            with patch("google.generativeai.GenerativeModel") as MockModel:
-                mock_model_instance = MagicMock()
-                MockModel.return_value = mock_model_instance
-                mock_model_instance.generate_content.return_value = iter(mock_gemini_response)
-
-                with patch("google.generativeai.configure"):
-                    chunks = list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+            with patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream(mock_gemini_response)):
+                chunks = await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
         assert any("data: " in c for c in chunks)
         assert chunks[-1] == "data: [DONE]\n\n"
 
-    def test_yields_error_when_session_not_found(self):
+    async def test_yields_error_when_session_not_found(self):
         """stream_message yields [ERROR] when session doesn't belong to user."""
         from app.services.chat_service import stream_message
 
-        with patch("app.services.chat_service.get_session", return_value=None):
-            chunks = list(stream_message(SESSION_ID, "wrong-user", "Xin chào"))
+        sb = self._make_full_sb(session=None)
+        with patch("app.services.chat_service.get_async_supabase", return_value=sb):
+            chunks = await _collect(stream_message(SESSION_ID, "wrong-user", "Xin chào"))
 
         assert len(chunks) == 1
         assert "[ERROR]" in chunks[0]
 
-    def test_yields_error_when_gemini_not_configured(self):
+    async def test_yields_error_when_gemini_not_configured(self):
         """stream_message yields [ERROR] when AI service not configured."""
         from app.services.chat_service import stream_message
 
-        sb = MagicMock()
-        sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_CHARACTER
-        )
+        sb = self._make_full_sb()
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=None), \
-             patch("app.services.chat_service.get_supabase", return_value=sb), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION):
+             patch("app.services.chat_service.get_async_qdrant", return_value=None), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = ""
             s.qdrant_url = ""
-            chunks = list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+            chunks = await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
         assert any("[ERROR]" in c for c in chunks)
 
-    def test_yields_done_at_end_on_success(self):
+    async def test_yields_done_at_end_on_success(self):
         """stream_message ends with [DONE] on successful generation."""
         from app.services.chat_service import stream_message
 
         mock_chunks = [MagicMock(text="Tôi"), MagicMock(text=" là"), MagicMock(text=" Lý Minh.")]
 
-        sb = MagicMock()
+        sb = self._make_full_sb()
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=None), \
-             patch("app.services.chat_service.get_supabase", return_value=sb), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION):
+             patch("app.services.chat_service.get_async_qdrant", return_value=None), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = ""
 
-            # character fetch
-            sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-                data=MOCK_CHARACTER
-            )
-            # reading progress
-            sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-                data={"last_chapter_read": 3}
-            )
 
-            with patch("google.generativeai.GenerativeModel") as MockModel, \
-                 patch("google.generativeai.configure"):
-                MockModel.return_value.generate_content.return_value = iter(mock_chunks)
-                tokens = list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+            with patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream(mock_chunks)):
+                tokens = await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
         assert tokens[-1] == "data: [DONE]\n\n"
 
-    def test_gemini_exception_yields_error_event(self):
+    async def test_gemini_exception_yields_error_event(self):
         """Gemini failure yields [ERROR] and doesn't raise."""
         from app.services.chat_service import stream_message
 
-        sb = MagicMock()
-        sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_CHARACTER
-        )
-        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data={"last_chapter_read": 5}
-        )
+        sb = self._make_full_sb()
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=None), \
-             patch("app.services.chat_service.get_supabase", return_value=sb), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION):
+             patch("app.services.chat_service.get_async_qdrant", return_value=None), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = ""
 
-            with patch("google.generativeai.GenerativeModel") as MockModel, \
-                 patch("google.generativeai.configure"):
-                MockModel.return_value.generate_content.side_effect = RuntimeError("API quota exceeded")
-                tokens = list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+            with patch("app.services.chat_service.stream_generate", side_effect=RuntimeError("API quota exceeded")):
+                tokens = await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
         assert any("[ERROR]" in t for t in tokens)
 
-    def test_qdrant_search_uses_retrieval_query_task_type(self):
+    async def test_qdrant_search_uses_retrieval_query_task_type(self):
         """Unit: Gemini embed is called with RETRIEVAL_QUERY task type."""
         from app.services.chat_service import stream_message
 
-        mock_qdrant = MagicMock()
+        mock_qdrant = _async_qdrant()
         mock_qdrant.search.return_value = []
 
-        sb = MagicMock()
-        sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_CHARACTER
-        )
-        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data={"last_chapter_read": 5}
-        )
+        sb = self._make_full_sb()
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=mock_qdrant), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION), \
-             patch("app.services.chat_service.get_supabase", return_value=sb):
+             patch("app.services.chat_service.get_async_qdrant", return_value=mock_qdrant), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = "http://localhost:6333"
 
-            with patch("google.generativeai.embed_content") as mock_embed, \
-                 patch("google.generativeai.GenerativeModel") as MockModel, \
-                 patch("google.generativeai.configure"):
+            with patch("google.generativeai.embed_content_async") as mock_embed, \
+                 patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream([MagicMock(text="Test")])):
                 mock_embed.return_value = {"embedding": MOCK_EMBEDDING_VECTOR}
-                MockModel.return_value.generate_content.return_value = iter([MagicMock(text="Test")])
 
-                list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+                await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
         mock_embed.assert_called_once()
         call_kwargs = mock_embed.call_args.kwargs
         assert call_kwargs.get("task_type") == "RETRIEVAL_QUERY"
 
-    def test_qdrant_search_filters_by_user_reading_progress(self):
+    async def test_qdrant_search_filters_by_user_reading_progress(self):
         """Unit: Qdrant search is called with chapter_number lte = user_progress."""
         from qdrant_client.models import FieldCondition, Filter, Range
         from app.services.chat_service import stream_message
 
-        mock_qdrant = MagicMock()
+        mock_qdrant = _async_qdrant()
         mock_qdrant.search.return_value = []
 
-        sb = MagicMock()
-        sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_CHARACTER
-        )
-        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data={"last_chapter_read": 7}  # user has read up to chapter 7
-        )
+        sb = self._make_full_sb(progress=7)
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=mock_qdrant), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION), \
-             patch("app.services.chat_service.get_supabase", return_value=sb):
+             patch("app.services.chat_service.get_async_qdrant", return_value=mock_qdrant), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = "http://localhost:6333"
 
-            with patch("google.generativeai.embed_content", return_value={"embedding": MOCK_EMBEDDING_VECTOR}), \
-                 patch("google.generativeai.GenerativeModel") as MockModel, \
-                 patch("google.generativeai.configure"):
-                MockModel.return_value.generate_content.return_value = iter([MagicMock(text="ok")])
-                list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+            with patch("google.generativeai.embed_content_async", return_value={"embedding": MOCK_EMBEDDING_VECTOR}), \
+                 patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream([MagicMock(text="ok")])):
+                await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
         mock_qdrant.search.assert_called_once()
         search_kwargs = mock_qdrant.search.call_args.kwargs
@@ -588,99 +541,130 @@ class TestRagPipeline:
         assert condition.key == "chapter_number"
         assert condition.range.lte == 7
 
-    def test_zero_reading_progress_filters_chapter_zero(self):
+    async def test_context_comes_from_hit_payload_text(self):
+        """Unit: chunk text in the Qdrant payload is used as-is — no novel_embeddings lookup."""
+        from app.services.chat_service import stream_message
+
+        mock_qdrant = _async_qdrant()
+        mock_qdrant.search.return_value = [
+            MagicMock(id="p1", payload={"text": "Lý Minh rút kiếm khỏi vỏ."}),
+            MagicMock(id="p2", payload={"text": "Sư phụ gật đầu."}),
+        ]
+
+        sb = self._make_full_sb(progress=7)
+
+        with patch("app.services.chat_service.settings") as s, \
+             patch("app.services.chat_service.get_async_qdrant", return_value=mock_qdrant), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
+            s.gemini_api_key = "fake-key"
+            s.qdrant_url = "http://localhost:6333"
+
+            with patch("google.generativeai.embed_content_async", return_value={"embedding": MOCK_EMBEDDING_VECTOR}), \
+                 patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream([MagicMock(text="ok")])) as mock_stream:
+                await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+
+        prompt = mock_stream.call_args.args[1]
+        assert "Lý Minh rút kiếm khỏi vỏ.\n---\nSư phụ gật đầu." in prompt
+        assert "novel_embeddings" not in [c.args[0] for c in sb.table.call_args_list]
+
+    async def test_shared_collection_search_also_filters_by_novel(self):
+        """Unit: in shared collection mode the search adds a novel_id match."""
+        from app.core import qdrant as qdrant_module
+        from app.services.chat_service import stream_message
+
+        mock_qdrant = _async_qdrant()
+        mock_qdrant.search.return_value = []
+
+        sb = self._make_full_sb(progress=7)
+
+        with patch("app.services.chat_service.settings") as s, \
+             patch.object(qdrant_module.settings, "qdrant_collection_mode", "shared"), \
+             patch("app.services.chat_service.get_async_qdrant", return_value=mock_qdrant), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
+            s.gemini_api_key = "fake-key"
+            s.qdrant_url = "http://localhost:6333"
+
+            with patch("google.generativeai.embed_content_async", return_value={"embedding": MOCK_EMBEDDING_VECTOR}), \
+                 patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream([MagicMock(text="ok")])):
+                await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+
+        search_kwargs = mock_qdrant.search.call_args.kwargs
+        assert search_kwargs["collection_name"] == qdrant_module.settings.qdrant_shared_collection
+        chapter_cond, novel_cond = search_kwargs["query_filter"].must
+        assert chapter_cond.range.lte == 7
+        assert novel_cond.key == "novel_id"
+        assert novel_cond.match.value == MOCK_CHARACTER["novel_id"]
+
+    async def test_zero_reading_progress_filters_chapter_zero(self):
         """Unit: user with no reading progress → chapter_number <= 0 filter."""
         from app.services.chat_service import stream_message
 
-        mock_qdrant = MagicMock()
+        mock_qdrant = _async_qdrant()
         mock_qdrant.search.return_value = []
 
-        sb = MagicMock()
-        sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_CHARACTER
-        )
-        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=None  # no reading progress record
-        )
+        sb = self._make_full_sb(progress=None)
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=mock_qdrant), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION), \
-             patch("app.services.chat_service.get_supabase", return_value=sb):
+             patch("app.services.chat_service.get_async_qdrant", return_value=mock_qdrant), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = "http://localhost:6333"
 
-            with patch("google.generativeai.embed_content", return_value={"embedding": MOCK_EMBEDDING_VECTOR}), \
-                 patch("google.generativeai.GenerativeModel") as MockModel, \
-                 patch("google.generativeai.configure"):
-                MockModel.return_value.generate_content.return_value = iter([MagicMock(text="ok")])
-                list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+            with patch("google.generativeai.embed_content_async", return_value={"embedding": MOCK_EMBEDDING_VECTOR}), \
+                 patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream([MagicMock(text="ok")])):
+                await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
         mock_qdrant.search.assert_called_once()
         search_kwargs = mock_qdrant.search.call_args.kwargs
         condition = search_kwargs["query_filter"].must[0]
         assert condition.range.lte == 0
 
-    def test_messages_persisted_after_stream(self):
+    async def test_messages_persisted_after_stream(self):
         """Unit: chat_sessions.messages updated with user + assistant messages."""
         from app.services.chat_service import stream_message
 
-        sb = MagicMock()
-        sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_CHARACTER
-        )
-        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data={"last_chapter_read": 3}
-        )
-        sb.table.return_value.update.return_value.eq.return_value.execute.return_value = MagicMock(data=[])
+        sb = self._make_full_sb(progress=3)
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=None), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION), \
-             patch("app.services.chat_service.get_supabase", return_value=sb):
+             patch("app.services.chat_service.get_async_qdrant", return_value=None), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = ""
 
-            with patch("google.generativeai.GenerativeModel") as MockModel, \
-                 patch("google.generativeai.configure"):
-                MockModel.return_value.generate_content.return_value = iter([MagicMock(text="Tôi là Lý Minh.")])
-                list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+            with patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream([MagicMock(text="Tôi là Lý Minh.")])):
+                await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
-        # Verify update was called (persisting messages)
-        sb.table.assert_any_call("chat_sessions")
+        # Verify update was awaited (persisting messages)
+        update = sb.tables["chat_sessions"].update
+        update.return_value.eq.return_value.execute.assert_awaited_once()
+        assert [m["role"] for m in update.call_args.args[0]["messages"]][-2:] == ["user", "assistant"]
 
-    def test_qdrant_search_returns_empty_still_calls_gemini(self):
+    async def test_qdrant_search_returns_empty_still_calls_gemini(self):
         """Qdrant returning 0 results → Gemini still called with empty context."""
         from app.services.chat_service import stream_message
 
-        mock_qdrant = MagicMock()
+        mock_qdrant = _async_qdrant()
         mock_qdrant.search.return_value = []  # no relevant chunks
 
-        sb = MagicMock()
-        sb.table.return_value.select.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data=MOCK_CHARACTER
-        )
-        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
-            data={"last_chapter_read": 5}
-        )
+        sb = self._make_full_sb()
 
         with patch("app.services.chat_service.settings") as s, \
-             patch("app.services.chat_service.get_qdrant", return_value=mock_qdrant), \
-             patch("app.services.chat_service.get_session", return_value=MOCK_SESSION), \
-             patch("app.services.chat_service.get_supabase", return_value=sb):
+             patch("app.services.chat_service.get_async_qdrant", return_value=mock_qdrant), \
+             patch("app.services.chat_service.get_async_supabase", return_value=sb):
             s.gemini_api_key = "fake-key"
             s.qdrant_url = "http://localhost:6333"
 
-            with patch("google.generativeai.embed_content", return_value={"embedding": MOCK_EMBEDDING_VECTOR}), \
-                 patch("google.generativeai.GenerativeModel") as MockModel, \
-                 patch("google.generativeai.configure"):
-                mock_gen = MagicMock()
-                mock_gen.generate_content.return_value = iter([MagicMock(text="Response.")])
-                MockModel.return_value = mock_gen
-                tokens = list(stream_message(SESSION_ID, USER_ID, "Xin chào"))
+            with patch("google.generativeai.embed_content_async", return_value={"embedding": MOCK_EMBEDDING_VECTOR}), \
+                 patch("app.services.chat_service.stream_generate",
+                       side_effect=lambda model, prompt: _astream([MagicMock(text="Response.")])) as mock_stream:
+                tokens = await _collect(stream_message(SESSION_ID, USER_ID, "Xin chào"))
 
         # Gemini was called
-        mock_gen.generate_content.assert_called_once()
+        mock_stream.assert_called_once()
         assert tokens[-1] == "data: [DONE]\n\n"
 
 
@@ -0,0 +1,251 @@
+"""Tests for the durable job queue (app/workers/job_queue.py)."""
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.workers import job_queue
+from app.workers.job_queue import JobType, Worker
+
+client = TestClient(app)
+
+MOCK_ADMIN = {
+    "id": "admin-1", "username": "admin", "avatar_url": None, "bio": None,
+    "social_links": [], "donate_url": None, "role": "admin", "is_banned": False,
+    "ban_until": None, "chapters_read": 0, "level": 0, "daily_nominations": 0,
+    "nominations_reset_at": None, "vip_tier": "none", "vip_expires_at": None,
+    "created_at": "2026-01-01T00:00:00+00:00",
+}
+
+
+def _make_token(user_id: str) -> str:
+    from jose import jwt
+
+    from app.core.config import settings
+    return jwt.encode({"sub": user_id, "role": "authenticated"}, settings.supabase_jwt_secret, algorithm="HS256")
+
+
+def _deps_supabase(user: dict) -> MagicMock:
+    sb = MagicMock()
+    sb.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data=user)
+    return sb
+
+
+def _job_types(concurrency: int = 2, max_attempts: int = 3) -> dict:
+    return {"test_job": JobType("tests.test_job_queue:handler", concurrency, max_attempts)}
+
+
+async def _async_result(data):
+    return MagicMock(data=data)
+
+
+async def _drain(worker: Worker) -> None:
+    while worker._tasks:
+        await asyncio.gather(*list(worker._tasks))
+
+
+class TestEnqueue:
+    async def test_enqueue_returns_queued_job(self, job_backend):
+        job = await job_queue.enqueue("embed_chapter", {"chapter_id": "c1", "novel_id": "n1"})
+        assert job["status"] == "queued"
+        assert job["max_attempts"] == job_queue.JOB_TYPES["embed_chapter"].max_attempts
+        assert job_backend.jobs[job["id"]]["payload"] == {"chapter_id": "c1", "novel_id": "n1"}
+
+    async def test_idempotency_key_collapses_queued_duplicates(self, job_backend):
+        first = await job_queue.enqueue("embed_chapter", {"chapter_id": "c1", "novel_id": "n1"}, "embed_chapter:c1")
+        second = await job_queue.enqueue("embed_chapter", {"chapter_id": "c1", "novel_id": "n1"}, "embed_chapter:c1")
+        assert first["id"] == second["id"]
+        assert len(job_backend.jobs) == 1
+
+    async def test_idempotency_key_allows_new_job_once_running(self, job_backend):
+        first = await job_queue.enqueue("embed_chapter", {"chapter_id": "c1", "novel_id": "n1"}, "embed_chapter:c1")
+        await job_backend.claim("w", "embed_chapter", 1, 60)
+        second = await job_queue.enqueue("embed_chapter", {"chapter_id": "c1", "novel_id": "n1"}, "embed_chapter:c1")
+        assert first["id"] != second["id"]
+
+    async def test_unknown_job_type_rejected(self):
+        with pytest.raises(ValueError):
+            await job_queue.enqueue("nope", {})
+
+    async def test_postgres_backend_calls_enqueue_rpc(self):
+        sb = MagicMock()
+        sb.rpc.return_value.execute = MagicMock(side_effect=lambda: _async_result({"id": "j1"}))
+        with patch("app.workers.job_queue.get_async_supabase", return_value=sb):
+            job = await job_queue._PostgresBackend().enqueue("embed_chapter", {"chapter_id": "c1"}, "k", 5, 0)
+        assert job == {"id": "j1"}
+        name, params = sb.rpc.call_args.args
+        assert name == "enqueue_job"
+        assert params["p_idempotency_key"] == "k"
+        assert params["p_max_attempts"] == 5
+
+
+handler = MagicMock()   # resolved by the worker as "tests.test_job_queue:handler"
+
+
+class TestWorker:
+    def setup_method(self):
+        handler.reset_mock(side_effect=True)
+        job_queue._resolve_handler.cache_clear()
+
+    async def _enqueue(self, backend, payload=None, max_attempts=3):
+        return await backend.enqueue("test_job", payload or {"x": 1}, None, max_attempts, 0)
+
+    async def test_successful_job_is_marked_succeeded(self, job_backend):
+        job = await self._enqueue(job_backend)
+        with patch.object(job_queue, "JOB_TYPES", _job_types()):
+            worker = Worker()
+            assert await worker.poll() == 1
+            await _drain(worker)
+        handler.assert_called_once_with(x=1)
+        stored = job_backend.jobs[job["id"]]
+        assert stored["status"] == "succeeded"
+        assert stored["attempts"] == 1
+        assert stored["finished_at"]
+
+    async def test_failed_job_is_requeued_with_backoff(self, job_backend):
+        handler.side_effect = RuntimeError("boom")
+        job = await self._enqueue(job_backend)
+        with patch.object(job_queue, "JOB_TYPES", _job_types()):
+            worker = Worker()
+            await worker.poll()
+            await _drain(worker)
+            stored = job_backend.jobs[job["id"]]
+            assert stored["status"] == "queued"
+            assert stored["last_error"] == "RuntimeError: boom"
+            assert datetime.fromisoformat(stored["run_after"]) > datetime.now(timezone.utc)
+            assert await worker.poll() == 0   # not due yet
+
+    async def test_retry_folds_into_job_queued_with_same_key(self, job_backend):
+        handler.side_effect = RuntimeError("boom")
+        running = await job_backend.enqueue("test_job", {"x": 1}, "test_job:n1", 3, 0)
+        with patch.object(job_queue, "JOB_TYPES", _job_types()):
+            worker = Worker()
+            await worker.poll()
+            queued = await job_backend.enqueue("test_job", {"x": 1}, "test_job:n1", 3, 0)
+            await _drain(worker)
+        stored = job_backend.jobs[running["id"]]
+        assert stored["status"] == "failed"
+        assert queued["id"] in stored["last_error"]
+        assert job_backend.jobs[queued["id"]]["status"] == "queued"
+        assert job_backend.jobs[queued["id"]]["last_error"] == "RuntimeError: boom"
+
+    async def test_requeue_onto_a_queued_key_is_rejected(self, job_backend):
+        running = await job_backend.enqueue("test_job", {"x": 1}, "test_job:n1", 3, 0)
+        await job_backend.claim("w", "test_job", 1, 60)
+        await job_backend.enqueue("test_job", {"x": 1}, "test_job:n1", 3, 0)
+        with pytest.raises(ValueError):
+            await job_backend.update(running["id"], "w", {"status": "queued"})
+        assert job_backend.jobs[running["id"]]["status"] == "running"
+
+    async def test_postgres_backend_retries_through_rpc(self):
+        sb = MagicMock()
+        sb.rpc.return_value.execute = MagicMock(side_effect=lambda: _async_result("j2"))
+        with patch("app.workers.job_queue.get_async_supabase", return_value=sb):
+            next_id = await job_queue._PostgresBackend().retry("j1", "w", "RuntimeError: boom", 12.6)
+        assert next_id == "j2"
+        sb.rpc.assert_called_once_with("retry_job", {
+            "p_job_id": "j1", "p_worker": "w", "p_error": "RuntimeError: boom", "p_delay_seconds": 13,
+        })
+
+    async def test_job_fails_after_max_attempts(self, job_backend):
+        handler.side_effect = RuntimeError("boom")
+        job = await self._enqueue(job_backend, max_attempts=2)
+        with patch.object(job_queue, "JOB_TYPES", _job_types()):
+            worker = Worker()
+            for _ in range(2):
+                job_backend.jobs[job["id"]]["run_after"] = datetime.now(timezone.utc).isoformat()
+                await worker.poll()
+                await _drain(worker)
+        stored = job_backend.jobs[job["id"]]
+        assert stored["status"] == "failed"
+        assert stored["attempts"] == 2
+        assert handler.call_count == 2
+
+    async def test_concurrency_limit_per_job_type(self, job_backend):
+        release = threading.Event()
+        handler.side_effect = lambda **_: release.wait(5)
+        for i in range(5):
+            await self._enqueue(job_backend, {"i": i})
+        with patch.object(job_queue, "JOB_TYPES", _job_types(concurrency=2)):
+            worker = Worker()
+            assert await worker.poll() == 2
+            assert await worker.poll() == 0
+            release.set()
+            await _drain(worker)
+            assert await worker.poll() == 2
+
+    async def test_expired_lease_is_reclaimed(self, job_backend):
+        job = await self._enqueue(job_backend)
+        await job_backend.claim("dead-worker", "test_job", 1, 60)
+        job_backend.jobs[job["id"]]["locked_until"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+        with patch.object(job_queue, "JOB_TYPES", _job_types()):
+            worker = Worker()
+            assert await worker.poll() == 1
+            await _drain(worker)
+        stored = job_backend.jobs[job["id"]]
+        assert stored["status"] == "succeeded"
+        assert stored["attempts"] == 2
+
+    async def test_reclaimed_job_past_max_attempts_is_failed_without_running(self, job_backend):
+        job = await self._enqueue(job_backend, max_attempts=1)
+        await job_backend.claim("dead-worker", "test_job", 1, 60)
+        job_backend.jobs[job["id"]]["locked_until"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+        with patch.object(job_queue, "JOB_TYPES", _job_types()):
+            worker = Worker()
+            await worker.poll()
+            await _drain(worker)
+        handler.assert_not_called()
+        assert job_backend.jobs[job["id"]]["status"] == "failed"
+
+    async def test_stale_worker_cannot_overwrite_reclaimed_job(self, job_backend):
+        job = await self._enqueue(job_backend)
+        await job_backend.claim("old-worker", "test_job", 1, 60)
+        job_backend.jobs[job["id"]]["locked_by"] = "new-worker"
+        await job_backend.update(job["id"], "old-worker", {"status": "succeeded"})
+        assert job_backend.jobs[job["id"]]["status"] == "running"
+
+    async def test_renew_leases_extends_in_flight_jobs(self, job_backend):
+        release = threading.Event()
+        handler.side_effect = lambda **_: release.wait(5)
+        job = await self._enqueue(job_backend)
+        with patch.object(job_queue, "JOB_TYPES", _job_types()):
+            worker = Worker()
+            await worker.poll()
+            before = job_backend.jobs[job["id"]]["locked_until"]
+            with patch.object(job_queue.settings, "job_lease_seconds", 3600):
+                await worker._renew_leases()
+            assert job_backend.jobs[job["id"]]["locked_until"] > before
+            release.set()
+            await _drain(worker)
+
+    def test_retry_delay_grows_and_is_capped(self):
+        with patch.object(job_queue.settings, "job_retry_base_seconds", 10.0), \
+             patch.object(job_queue.settings, "job_retry_max_seconds", 60.0):
+            assert 5 <= job_queue.retry_delay(1) <= 10
+            assert 20 <= job_queue.retry_delay(3) <= 40
+            assert job_queue.retry_delay(10) <= 60
+
+
+class TestJobRoutes:
+    def test_admin_lists_jobs(self, job_backend):
+        asyncio.run(job_backend.enqueue("embed_chapter", {"chapter_id": "c1", "novel_id": "n1"}, None, 5, 0))
+        with patch("app.core.deps.get_supabase", return_value=_deps_supabase(MOCK_ADMIN)):
+            r = client.get("/api/v1/admin/jobs?status=queued",
+                           headers={"Authorization": f"Bearer {_make_token('admin-1')}"})
+        assert r.status_code == 200
+        assert [j["job_type"] for j in r.json()] == ["embed_chapter"]
+
+    def test_admin_gets_job_status(self, job_backend):
+        job = asyncio.run(job_backend.enqueue("compute_timeline", {"novel_id": "n1"}, None, 2, 0))
+        with patch("app.core.deps.get_supabase", return_value=_deps_supabase(MOCK_ADMIN)):
+            r = client.get(f"/api/v1/admin/jobs/{job['id']}",
+                           headers={"Authorization": f"Bearer {_make_token('admin-1')}"})
+            missing = client.get("/api/v1/admin/jobs/unknown",
+                                 headers={"Authorization": f"Bearer {_make_token('admin-1')}"})
+        assert r.status_code == 200
+        assert r.json()["status"] == "queued"
+        assert missing.status_code == 404
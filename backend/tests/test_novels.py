@@ -1,6 +1,8 @@
 """Tests for novels API endpoints."""
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -56,7 +58,8 @@ class TestListNovels:
     def test_list_with_filters_passes_params(self):
         with patch("app.services.novel_service.get_novels", return_value={"items": [], "next_cursor": None}) as m:
             client.get("/api/v1/novels?q=test&status=completed&tag=tu-tien&sort=total_views")
-        m.assert_called_once_with(q="test", tag_slug="tu-tien", status="completed", sort="total_views", cursor=None, limit=20)
+        m.assert_called_once_with(q="test", tag_slugs=["tu-tien"], tag_mode="all", status="completed",
+                                  sort="total_views", cursor=None, limit=20)
 
     def test_list_invalid_sort_returns_422(self):
         assert client.get("/api/v1/novels?sort=invalid_field").status_code == 422
@@ -204,3 +207,130 @@ class TestDeleteNovel:
             ms.return_value = _make_user_supabase_mock(MOCK_USER_UPLOADER)
             r = client.delete("/api/v1/novels/x", headers={"Authorization": f"Bearer {tok}"})
         assert r.status_code == 404
+
+
+def _make_search_rpc_mock(rows):
+    r = MagicMock()
+    r.data = rows
+    c = MagicMock()
+    c.rpc.return_value.execute = AsyncMock(return_value=r)
+    return c
+
+
+class TestNovelSearchService:
+    async def test_search_uses_ranked_rpc_and_relevance_cursor(self):
+        from app.services import novel_service
+        rows = [
+            {**MOCK_NOVEL_LIST_ITEM, "id": f"novel-{i}", "sort_key": f"0.{9 - i}00000"}
+            for i in range(3)
+        ]
+        sb = _make_search_rpc_mock(rows)
+        with patch("app.services.novel_service.get_async_supabase", return_value=sb):
+            page = await novel_service.get_novels(q="Đấu Phá", limit=2)
+        fn, params = sb.rpc.call_args.args
+        assert fn == "search_novels"
+        assert params["p_query"] == "Đấu Phá" and params["p_sort"] == "relevance"
+        assert params["p_limit"] == 3 and params["p_after_id"] is None
+        sb.table.assert_not_called()
+        assert [n["id"] for n in page["items"]] == ["novel-0", "novel-1"]
+        assert all("sort_key" not in n for n in page["items"])
+
+        sb = _make_search_rpc_mock([])
+        with patch("app.services.novel_service.get_async_supabase", return_value=sb):
+            await novel_service.get_novels(q="Đấu Phá", cursor=page["next_cursor"], limit=2)
+        params = sb.rpc.call_args.args[1]
+        assert params["p_after_key"] == "0.800000" and params["p_after_id"] == "novel-1"
+
+    async def test_cursor_from_another_sort_is_rejected(self):
+        from app.services import novel_service
+        cursor = novel_service._encode_cursor("total_views", "120", "novel-1")
+        with pytest.raises(HTTPException) as exc:
+            await novel_service.get_novels(q="dau pha", sort="relevance", cursor=cursor)
+        assert exc.value.status_code == 400
+
+
+class TestNovelCursor:
+    def _list_mock(self, rows):
+        r = MagicMock()
+        r.data = rows
+        query = MagicMock()
+        for method in ("select", "eq", "lte", "or_", "order", "limit"):
+            getattr(query, method).return_value = query
+        query.execute = AsyncMock(return_value=r)
+        sb = MagicMock()
+        sb.table.return_value = query
+        return sb, query
+
+    async def test_cursor_carries_the_active_sort_key(self):
+        from app.services import novel_service
+        rows = [{**MOCK_NOVEL_LIST_ITEM, "id": f"novel-{i}", "total_views": 500 - i, "novel_tags": []}
+                for i in range(3)]
+        sb, _ = self._list_mock(rows)
+        with patch("app.services.novel_service.get_async_supabase", return_value=sb):
+            page = await novel_service.get_novels(sort="total_views", limit=2)
+
+        sb, query = self._list_mock([])
+        with patch("app.services.novel_service.get_async_supabase", return_value=sb):
+            await novel_service.get_novels(sort="total_views", cursor=page["next_cursor"], limit=2)
+        query.lte.assert_called_once_with("total_views", 499)
+        query.or_.assert_called_once_with('total_views.lt."499",and(total_views.eq."499",id.lt."novel-1")')
+
+    async def test_legacy_updated_at_cursor_still_decodes(self):
+        import base64
+        import json
+
+        from app.services import novel_service
+        legacy = base64.b64encode(json.dumps(
+            {"updated_at": "2026-01-01T00:00:00+00:00", "id": "novel-9"}).encode()).decode()
+        assert novel_service._decode_cursor(legacy, "updated_at") == ("2026-01-01T00:00:00+00:00", "novel-9")
+        with pytest.raises(HTTPException):
+            novel_service._decode_cursor(legacy, "avg_rating")
+        with pytest.raises(HTTPException):
+            novel_service._decode_cursor("not-base64!", "updated_at")
+
+
+class TestNovelTagFilter:
+    def _list_mock(self, rows):
+        r = MagicMock()
+        r.data = rows
+        query = MagicMock()
+        for method in ("select", "eq", "in_", "lte", "or_", "order", "limit"):
+            getattr(query, method).return_value = query
+        query.execute = AsyncMock(return_value=r)
+        sb = MagicMock()
+        sb.table.return_value = query
+        return sb, query
+
+    async def test_all_mode_adds_one_inner_embed_per_tag(self):
+        from app.services import novel_service
+        row = {**MOCK_NOVEL_LIST_ITEM, "novel_tags": [], "tf0": [{}], "tf1": [{}]}
+        sb, query = self._list_mock([row])
+        with patch("app.services.novel_service.get_async_supabase", return_value=sb):
+            page = await novel_service.get_novels(tag_slugs=["tu-tien", "do-thi"])
+        sb.table.assert_called_once_with("novels")      # no tag / novel_tags round trips
+        select_str = query.select.call_args.args[0]
+        assert "tf0:novel_tags!inner(tags!inner(slug))" in select_str
+        assert "tf1:novel_tags!inner(tags!inner(slug))" in select_str
+        query.eq.assert_any_call("tf0.tags.slug", "tu-tien")
+        query.eq.assert_any_call("tf1.tags.slug", "do-thi")
+        assert "tf0" not in page["items"][0] and "tf1" not in page["items"][0]
+
+    async def test_any_mode_uses_single_in_filter(self):
+        from app.services import novel_service
+        sb, query = self._list_mock([])
+        with patch("app.services.novel_service.get_async_supabase", return_value=sb):
+            await novel_service.get_novels(tag_slugs=["tu-tien", "do-thi"], tag_mode="any")
+        query.in_.assert_called_once_with("tf0.tags.slug", ["tu-tien", "do-thi"])
+        assert "tf1:" not in query.select.call_args.args[0]
+
+    async def test_too_many_tags_rejected(self):
+        from app.services import novel_service
+        with pytest.raises(HTTPException) as exc:
+            await novel_service.get_novels(tag_slugs=[f"t{i}" for i in range(6)])
+        assert exc.value.status_code == 422
+
+    def test_repeated_tag_params_reach_service(self):
+        with patch("app.services.novel_service.get_novels", return_value={"items": [], "next_cursor": None}) as m:
+            client.get("/api/v1/novels?tag=tu-tien&tag=do-thi&tag_mode=any")
+        assert m.call_args.kwargs["tag_slugs"] == ["tu-tien", "do-thi"]
+        assert m.call_args.kwargs["tag_mode"] == "any"
@@ -1,38 +1,85 @@
 """Tests for rate limiting middleware."""
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from fastapi.testclient import TestClient
 
+from app.core import rate_limit
 from app.main import app
 
 client = TestClient(app)
 
 
 class TestRateLimit:
-    def test_rate_limit_skipped_without_redis(self):
-        """Rate limiter should be a no-op when Redis is not configured."""
-        with patch("app.core.rate_limit.get_redis", return_value=None):
-            r = client.get("/api/v1/health")
-        assert r.status_code == 200
-
     def test_rate_limit_allows_under_limit(self):
         """Rate limiter should allow requests under the limit."""
-        mock_redis = MagicMock()
-        mock_pipeline = MagicMock()
-        mock_redis.pipeline.return_value = mock_pipeline
-        mock_pipeline.execute.return_value = [None, None, 50, None]  # count=50 < 100
-        with patch("app.core.rate_limit.get_redis", return_value=mock_redis):
+        for _ in range(rate_limit.RATE_LIMIT):
             r = client.get("/api/v1/health")
-        assert r.status_code == 200
+            assert r.status_code == 200
 
     def test_rate_limit_blocks_over_limit(self):
         """Rate limiter should return 429 when limit exceeded."""
-        mock_redis = MagicMock()
-        mock_pipeline = MagicMock()
-        mock_redis.pipeline.return_value = mock_pipeline
-        mock_pipeline.execute.return_value = [None, None, 101, None]  # count=101 > 100
-        with patch("app.core.rate_limit.get_redis", return_value=mock_redis):
-            r = client.get("/api/v1/health")
+        for _ in range(rate_limit.RATE_LIMIT):
+            client.get("/api/v1/health")
+        r = client.get("/api/v1/health")
         assert r.status_code == 429
         assert "Rate limit" in r.json()["detail"]
-        assert r.headers.get("Retry-After") == "60"
+        assert int(r.headers["Retry-After"]) >= 1
+
+    def test_no_redis_round_trip_per_request(self):
+        """The decision is local; Redis is only touched by the background sync."""
+        redis = MagicMock()
+        with patch("app.core.rate_limit.get_async_redis", return_value=redis):
+            for _ in range(5):
+                assert client.get("/api/v1/health").status_code == 200
+        redis.pipeline.assert_not_called()
+
+    def test_tokens_refill_over_time(self):
+        with patch("app.core.rate_limit.time.monotonic", return_value=1000.0):
+            for _ in range(rate_limit.RATE_LIMIT):
+                assert rate_limit.consume("ip:1.2.3.4", 1) == 0
+            assert rate_limit.consume("ip:1.2.3.4", 1) > 0
+        with patch("app.core.rate_limit.time.monotonic", return_value=1000.0 + rate_limit.WINDOW / 10):
+            assert rate_limit.consume("ip:1.2.3.4", 1) == 0
+
+    def test_route_costs(self):
+        assert rate_limit.route_cost("GET", "/api/v1/novels") == 1
+        assert rate_limit.route_cost("POST", "/api/v1/ai/novels/n1/qa") == 10
+        assert rate_limit.route_cost("POST", "/api/v1/chat/sessions/s1/message") == 10
+        assert rate_limit.route_cost("POST", "/api/v1/tts/chapters/c1") == 20
+        assert rate_limit.route_cost("GET", "/api/v1/ai/novels/n1/timeline") == 3
+
+    def test_expensive_routes_drain_budget_faster(self):
+        for _ in range(rate_limit.RATE_LIMIT // 10):
+            assert rate_limit.consume("u:a", 10) == 0
+        assert rate_limit.consume("u:a", 10) > 0
+        assert rate_limit.consume("u:b", 10) == 0
+
+
+class TestRateLimitSync:
+    async def test_sync_batches_keys_and_deducts_other_replicas(self):
+        rate_limit.consume("u:a", 10)
+        rate_limit.consume("u:b", 1)
+        pipe = MagicMock()
+        # u:a's window counter now holds 10 of ours + 50 spent on other replicas
+        pipe.exec = AsyncMock(return_value=[60, True, 1, True])
+        redis = MagicMock()
+        redis.pipeline.return_value = pipe
+        with patch("app.core.rate_limit.get_async_redis", return_value=redis):
+            await rate_limit.sync()
+
+        redis.pipeline.assert_called_once()
+        assert pipe.incrby.call_count == 2
+        a, b = rate_limit._buckets["u:a"], rate_limit._buckets["u:b"]
+        assert a.pending == 0 and b.pending == 0
+        assert a.tokens <= rate_limit.RATE_LIMIT - 60 + 1
+        assert b.tokens >= rate_limit.RATE_LIMIT - 1
+
+    async def test_sync_failure_keeps_pending(self):
+        rate_limit.consume("u:a", 5)
+        pipe = MagicMock()
+        pipe.exec = AsyncMock(side_effect=RuntimeError("redis down"))
+        redis = MagicMock()
+        redis.pipeline.return_value = pipe
+        with patch("app.core.rate_limit.get_async_redis", return_value=redis):
+            await rate_limit.sync()
+        assert rate_limit._buckets["u:a"].pending == 5
@@ -0,0 +1,179 @@
+"""Tests for the Redis L2 tier and cross-replica invalidation."""
+from collections import Counter
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core import shared_cache
+from app.core.cache import TTLCache
+
+
+class FakeAsyncRedis:
+    """Just enough of upstash_redis.asyncio.Redis for the shared cache."""
+
+    def __init__(self):
+        self.kv: dict[str, str] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    async def get(self, key):
+        return self.kv.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.kv[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.kv.pop(key, None)
+
+    async def incr(self, key):
+        self.kv[key] = str(int(self.kv.get(key, 0)) + 1)
+        return int(self.kv[key])
+
+    async def mget(self, *keys):
+        return [self.kv.get(k) for k in keys]
+
+    async def zadd(self, key, scores):
+        self.zsets.setdefault(key, {}).update(scores)
+
+    async def zrangebyscore(self, key, lo, hi):
+        lo_val = float(lo.lstrip("("))
+        members = self.zsets.get(key, {})
+        return [m for m, s in sorted(members.items(), key=lambda kv: kv[1]) if s > lo_val]
+
+    async def eval(self, script, keys=None, args=None):
+        assert script == shared_cache._APPEND_LOG_SCRIPT
+        seq_key, log_key = keys
+        seq = await self.incr(seq_key)
+        await self.zadd(log_key, {f"[{seq},{args[0]}]": seq})
+        return seq
+
+    async def zremrangebyscore(self, key, lo, hi):
+        members = self.zsets.get(key, {})
+        for m in [m for m, s in members.items() if lo <= s <= hi]:
+            del members[m]
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self._calls.append((name, args, kwargs))
+
+    async def exec(self):
+        return [await getattr(self._redis, name)(*a, **kw) for name, a, kw in self._calls]
+
+
+@pytest.fixture
+def redis():
+    fake = FakeAsyncRedis()
+    with patch("app.core.shared_cache.get_async_redis", return_value=fake), \
+         patch.object(shared_cache, "_generations", {}), \
+         patch.object(shared_cache, "_outbox", []), \
+         patch.object(shared_cache, "_pending", Counter()), \
+         patch.object(shared_cache, "_last_seq", None), \
+         patch.object(shared_cache, "_instance_id", "replica-a"):
+        yield fake
+
+
+def _shared(name="novel_detail"):
+    cache = TTLCache(name, maxsize=10, ttl=60, shared=True)
+    return cache, patch("app.core.cache.shared_caches", return_value={name: cache})
+
+
+class TestSharedCache:
+    async def test_l2_hit_skips_loader(self, redis):
+        cache, _ = _shared()
+        loader = AsyncMock(return_value={"id": "n1", "title": "T"})
+        assert await cache.get_or_load("n1", loader) == {"id": "n1", "title": "T"}
+        cache.clear(propagate=False)      # e.g. a freshly started replica
+        assert await cache.get_or_load("n1", loader) == {"id": "n1", "title": "T"}
+        assert loader.await_count == 1
+        assert cache.stats()["l2_hits"] == 1
+
+    async def test_set_shared_writes_through_to_l2(self, redis):
+        cache, _ = _shared()
+        await cache.set_shared("n1", [[1.0, 0.0], "answer"])
+        cache.clear(propagate=False)      # another replica's empty L1
+        assert await cache.get_shared("n1") == [[1.0, 0.0], "answer"]
+        assert cache.get("n1") == [[1.0, 0.0], "answer"]
+        assert await cache.get_shared("n2", "default") == "default"
+        assert cache.stats()["l2_hits"] == 1
+
+    async def test_invalidation_reaches_other_replicas(self, redis):
+        cache, registry = _shared()
+        with registry:
+            await shared_cache.sync()                 # join the log
+            redis.kv["cache:novel_detail:0:n1"] = '"old"'
+            cache.invalidate("n1")                    # replica-a writes ...
+            await shared_cache._push_outbox(redis)    # ... and pushes before anyone pulls
+            assert "cache:novel_detail:0:n1" not in redis.kv
+
+            cache.set("n1", "old")                    # replica-b still holds a copy
+            with patch.object(shared_cache, "_instance_id", "replica-b"):
+                await shared_cache.sync()
+            assert cache.get("n1") is None
+
+    async def test_entry_landing_after_a_pull_is_not_skipped(self, redis):
+        cache, registry = _shared()
+        with registry:
+            await shared_cache.sync()                 # join the log at 0
+            cache.set("n1", "old")
+            seq = await redis.incr(shared_cache._SEQ_KEY)   # a writer took seq 1 ...
+            await shared_cache.sync()                 # ... we pull before its entry lands ...
+            entry = shared_cache._dumps([seq, "replica-b", "novel_detail", "n1"])
+            await redis.zadd(shared_cache._LOG_KEY, {entry: seq})
+            await shared_cache.sync()                 # ... and still apply it
+            assert cache.get("n1") is None
+
+    async def test_invalidate_then_get_on_same_replica_skips_stale_l2(self, redis):
+        cache, registry = _shared()
+        with registry:
+            await cache.get_or_load("n1", AsyncMock(return_value="old"))
+            cache.invalidate("n1")                    # not pushed to Redis yet
+            assert "cache:novel_detail:0:n1" in redis.kv
+            assert await cache.get_or_load("n1", AsyncMock(return_value="new")) == "new"
+
+            await shared_cache.sync()
+            assert "cache:novel_detail:0:n1" not in redis.kv
+            assert cache.get("n1") == "new"
+            cache.clear(propagate=False)
+            assert await cache.get_or_load("n1", AsyncMock(return_value="newer")) == "newer"
+
+    async def test_clear_then_get_on_same_replica_skips_stale_l2(self, redis):
+        cache, registry = _shared()
+        with registry:
+            await cache.get_or_load("n1", AsyncMock(return_value="old"))
+            cache.clear()
+            assert await cache.get_or_load("n1", AsyncMock(return_value="new")) == "new"
+
+    async def test_failed_push_keeps_skipping_l2(self, redis):
+        cache, registry = _shared()
+        with registry:
+            await cache.get_or_load("n1", AsyncMock(return_value="old"))
+            cache.invalidate("n1")
+            with patch.object(redis, "delete", AsyncMock(side_effect=RuntimeError("down"))):
+                await shared_cache.sync()
+            cache.clear(propagate=False)
+            assert await cache.get_or_load("n1", AsyncMock(return_value="new")) == "new"
+
+    async def test_clear_bumps_generation(self, redis):
+        cache, registry = _shared()
+        with registry:
+            await cache.get_or_load("n1", AsyncMock(return_value="v"))
+            assert "cache:novel_detail:0:n1" in redis.kv
+            cache.clear()
+            await shared_cache.sync()
+            loader = AsyncMock(return_value="v2")
+            assert await cache.get_or_load("n1", loader) == "v2"
+            assert "cache:novel_detail:1:n1" in redis.kv
+
+    async def test_redis_errors_fall_back_to_loader(self, redis):
+        cache, _ = _shared()
+        with patch.object(redis, "get", AsyncMock(side_effect=RuntimeError("down"))), \
+             patch.object(redis, "set", AsyncMock(side_effect=RuntimeError("down"))):
+            assert await cache.get_or_load("n1", AsyncMock(return_value="v")) == "v"
@@ -1,6 +1,10 @@
 """Tests for M19 Story Intelligence Dashboard — service and API layers."""
-from unittest.mock import MagicMock, patch
+import asyncio
+import json
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -84,8 +88,8 @@ def _deps_supabase(user_data: dict):
 
 
 class TestGetRelationships:
-    def test_not_started_triggers_compute_returns_202(self):
-        """First call when graph not started → triggers background task, returns 202 pending."""
+    def test_not_started_triggers_compute_returns_202(self, job_backend):
+        """First call when graph not started → enqueues compute job, returns 202 pending."""
         compute_mock = MagicMock()
         with (
             patch("app.core.deps.get_supabase", return_value=_deps_supabase(MOCK_VIP_MAX)),
@@ -96,6 +100,9 @@ class TestGetRelationships:
             r = client.get(f"/api/v1/ai/novels/{NOVEL_ID}/relationships", headers=AUTH_HEADERS)
         assert r.status_code == 202
         assert r.json()["status"] == "pending"
+        [job] = job_backend.jobs.values()
+        assert job["job_type"] == "compute_relationships"
+        assert job["idempotency_key"] == f"compute_relationships:{NOVEL_ID}"
 
     def test_pending_returns_202_without_retriggering(self):
         """When graph is pending → return 202, do NOT enqueue another background task."""
@@ -253,6 +260,106 @@ class TestQA:
         assert "[ERROR]" in r.text
 
 
+# ---------------------------------------------------------------------------
+# TestQAAnswerCache (service-level)
+# ---------------------------------------------------------------------------
+
+async def _astream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestQAAnswerCache:
+    async def _ask(self, question: str, vector: list[float], answer_tokens: list[str] | None = None,
+                   context: list[str] | None = None, stream=None):
+        from app.services import story_intelligence_service as svc
+
+        qdrant = MagicMock()
+        qdrant.search = AsyncMock(return_value=[])
+        with patch.object(svc, "settings") as s, \
+             patch.object(svc, "get_async_qdrant", return_value=qdrant), \
+             patch.object(svc, "get_supabase", return_value=MagicMock()), \
+             patch.object(svc, "embed_query", return_value=vector), \
+             patch.object(svc, "chunk_texts", return_value=["Lý Minh là sư huynh."] if context is None else context), \
+             patch("google.generativeai.configure"), \
+             patch.object(svc, "stream_generate", side_effect=lambda model, prompt: stream or _astream(
+                 [MagicMock(text=t) for t in (answer_tokens or ["Lý Minh ", "là\nsư huynh."])]
+             )) as generate:
+            s.gemini_api_key = "fake-key"
+            s.qdrant_url = "http://localhost:6333"
+            s.qa_answer_cache_similarity = 0.95
+            s.qa_answer_cache_per_novel = 2
+            events = [event async for event in svc.stream_qa(NOVEL_ID, question)]
+        return events, qdrant, generate
+
+    async def test_similar_question_replays_cached_answer(self):
+        await self._ask("Lý Minh là ai?", [1.0, 0.0, 0.0])
+        events, qdrant, generate = await self._ask("Lý Minh là ai vậy?", [0.99, 0.05, 0.0])
+
+        assert events == ["data: Lý Minh là\\nsư huynh.\n\n", "data: [DONE]\n\n"]
+        qdrant.search.assert_not_called()
+        generate.assert_not_called()
+
+    async def test_dissimilar_question_is_generated(self):
+        await self._ask("Lý Minh là ai?", [1.0, 0.0, 0.0])
+        _, qdrant, generate = await self._ask("Ai là sư phụ?", [0.0, 1.0, 0.0], ["Trương Tam."])
+        qdrant.search.assert_called_once()
+        generate.assert_called_once()
+
+    async def test_answer_without_context_is_not_cached(self):
+        from app.services import story_intelligence_service as svc
+
+        await self._ask("Lý Minh là ai?", [1.0, 0.0, 0.0], context=[])
+        assert svc._qa_answer_cache.get(NOVEL_ID) is None
+
+    async def test_failed_generation_is_not_cached(self):
+        from app.services import story_intelligence_service as svc
+
+        async def broken():
+            yield MagicMock(text="Lý Minh ")
+            raise RuntimeError("stream reset")
+
+        events, _, _ = await self._ask("Lý Minh là ai?", [1.0, 0.0, 0.0], stream=broken())
+        assert events[-1] == "data: [ERROR] AI generation failed\n\n"
+        assert svc._qa_answer_cache.get(NOVEL_ID) is None
+
+    async def test_answers_are_per_novel_and_bounded(self):
+        from app.services import story_intelligence_service as svc
+
+        for i, vector in enumerate(([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])):
+            await self._ask(f"q{i}", vector)
+        assert len(svc._qa_answer_cache.get(NOVEL_ID)) == 2
+        assert svc._qa_answer_cache.get("other-novel") is None
+
+    async def test_answer_is_replayed_on_another_replica(self):
+        from collections import Counter
+
+        from app.core import shared_cache
+        from app.services import story_intelligence_service as svc
+        from tests.test_shared_cache import FakeAsyncRedis
+
+        with patch("app.core.shared_cache.get_async_redis", return_value=FakeAsyncRedis()), \
+             patch.object(shared_cache, "_generations", {}), \
+             patch.object(shared_cache, "_outbox", []), \
+             patch.object(shared_cache, "_pending", Counter()):
+            await self._ask("Lý Minh là ai?", [1.0, 0.0, 0.0])
+            svc._qa_answer_cache.clear(propagate=False)   # another replica's empty L1
+            events, qdrant, generate = await self._ask("Lý Minh là ai vậy?", [0.99, 0.05, 0.0])
+
+        assert events == ["data: Lý Minh là\\nsư huynh.\n\n", "data: [DONE]\n\n"]
+        generate.assert_not_called()
+
+    async def test_embedding_new_chapters_invalidates_answers(self):
+        from app.services import story_intelligence_service as svc
+        from app.services.embedding_service import _plan_chapter, _write_plans
+
+        await self._ask("Lý Minh là ai?", [1.0, 0.0, 0.0])
+        plan = _plan_chapter({"id": "c1", "chapter_number": 1, "content": "Chương mới."}, [])
+        _write_plans(MagicMock(), MagicMock(), "novel_x", NOVEL_ID, [plan], [[0.1]])
+
+        assert svc._qa_answer_cache.get(NOVEL_ID) is None
+
+
 # ---------------------------------------------------------------------------
 # TestArcSummary
 # ---------------------------------------------------------------------------
@@ -263,7 +370,7 @@ class TestArcSummary:
         """GET /arc-summary with valid range → 200 with summary."""
         with (
             patch("app.core.deps.get_supabase", return_value=_deps_supabase(MOCK_VIP_MAX)),
-            patch("app.api.v1.story_intelligence.svc.get_arc_summary", return_value=MOCK_ARC_SUMMARY),
+            patch("app.api.v1.story_intelligence.svc.get_arc_summary", new_callable=AsyncMock, return_value=MOCK_ARC_SUMMARY),
         ):
             r = client.get(
                 f"/api/v1/ai/novels/{NOVEL_ID}/arc-summary?start_chapter=1&end_chapter=5",
@@ -297,7 +404,9 @@ class TestArcSummary:
         """When Storage cache exists, get_arc_summary is called but Gemini is not."""
         with (
             patch("app.core.deps.get_supabase", return_value=_deps_supabase(MOCK_VIP_MAX)),
-            patch("app.api.v1.story_intelligence.svc.get_arc_summary", return_value=MOCK_ARC_SUMMARY) as mock_svc,
+            patch(
+                "app.api.v1.story_intelligence.svc.get_arc_summary", new_callable=AsyncMock, return_value=MOCK_ARC_SUMMARY
+            ) as mock_svc,
         ):
             r = client.get(
                 f"/api/v1/ai/novels/{NOVEL_ID}/arc-summary?start_chapter=1&end_chapter=5",
@@ -306,6 +415,249 @@ class TestArcSummary:
         assert r.status_code == 200
         mock_svc.assert_called_once_with(NOVEL_ID, 1, 5)
 
+    def test_stream_returns_event_stream(self):
+        async def fake_stream(*args):
+            yield "data: Tóm tắt\n\n"
+            yield "data: [DONE]\n\n"
+
+        with (
+            patch("app.core.deps.get_supabase", return_value=_deps_supabase(MOCK_VIP_MAX)),
+            patch("app.api.v1.story_intelligence.svc.stream_arc_summary", side_effect=fake_stream) as mock_svc,
+        ):
+            r = client.get(
+                f"/api/v1/ai/novels/{NOVEL_ID}/arc-summary/stream?start_chapter=1&end_chapter=5",
+                headers=AUTH_HEADERS,
+            )
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        assert r.text.endswith("data: [DONE]\n\n")
+        mock_svc.assert_called_once_with(NOVEL_ID, 1, 5)
+
+    def test_stream_start_greater_than_end_returns_422(self):
+        with patch("app.core.deps.get_supabase", return_value=_deps_supabase(MOCK_VIP_MAX)):
+            r = client.get(
+                f"/api/v1/ai/novels/{NOVEL_ID}/arc-summary/stream?start_chapter=10&end_chapter=5",
+                headers=AUTH_HEADERS,
+            )
+        assert r.status_code == 422
+
+
+class _ArcQuery:
+    """Just enough of the PostgREST query builder for the arc-summary chapter queries."""
+
+    def __init__(self, chapters: dict):
+        self.chapters = chapters
+        self.filters = []
+        self.limit_n = None
+
+    def select(self, columns):
+        self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def order(self, column):
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda n: n > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda n: n >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda n: n <= value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda n: n in values)
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def execute(self):
+        rows = []
+        for number in sorted(self.chapters):
+            if all(f(number) for f in self.filters):
+                content, updated_at = self.chapters[number]
+                row = {"chapter_number": number, "content": content, "updated_at": updated_at}
+                rows.append({c: row[c] for c in self.columns})
+        return MagicMock(data=rows[:self.limit_n])
+
+
+class TestArcSummaryTree:
+    @staticmethod
+    def _store(count: int):
+        chapters = {n: (f"Nội dung chương {n}.", "2026-01-01") for n in range(1, count + 1)}
+        files: dict[str, bytes] = {}
+        sb = MagicMock()
+        sb.table.side_effect = lambda name: _ArcQuery(chapters)
+        bucket = sb.storage.from_.return_value
+        bucket.download.side_effect = lambda path: files[path]
+        bucket.upload.side_effect = lambda path, file, file_options: files.__setitem__(path, file)
+        return sb, chapters, files
+
+    @staticmethod
+    def _model(prompts: list[str], delay: float = 0.0):
+        """Blocks go through generate_content; the final range call streams in two chunks."""
+        def reply(prompt):
+            prompts.append(prompt)
+            return MagicMock(text=f"tóm tắt {prompt.split(chr(10))[0]}")
+
+        async def stream(prompt, stream=False):
+            prompts.append(prompt)
+
+            async def chunks():
+                for text in ("tóm tắt ", prompt.split(chr(10))[0]):
+                    await asyncio.sleep(delay)
+                    yield MagicMock(text=text)
+            return chunks()
+
+        model = MagicMock()
+        model.generate_content.side_effect = reply
+        model.generate_content_async.side_effect = stream
+        return model
+
+    @contextmanager
+    def _patched(self, sb, model):
+        from app.services import story_intelligence_service as svc_module
+
+        with (
+            patch.object(svc_module, "get_supabase", return_value=sb),
+            patch.object(svc_module.settings, "gemini_api_key", "test-key"),
+            patch("google.generativeai.configure"),
+            patch("google.generativeai.GenerativeModel", return_value=model),
+        ):
+            yield svc_module
+
+    async def _summarize(self, sb, start, end):
+        prompts: list[str] = []
+        with self._patched(sb, self._model(prompts)) as svc_module:
+            result = await svc_module.get_arc_summary(NOVEL_ID, start, end)
+        return result, prompts
+
+    def test_range_decomposes_into_aligned_blocks(self):
+        from app.services.story_intelligence_service import _arc_nodes
+
+        assert _arc_nodes(1, 1000) == [(3, 0)]
+        assert _arc_nodes(3, 125) == (
+            [(0, n) for n in range(2, 10)]
+            + [(1, n) for n in range(1, 10)]
+            + [(1, 10), (1, 11)]
+            + [(0, n) for n in range(120, 125)]
+        )
+
+    async def test_blocks_are_reused_across_ranges(self):
+        sb, _, _ = self._store(25)
+
+        result, prompts = await self._summarize(sb, 1, 25)
+        assert result["start_chapter"] == 1 and result["end_chapter"] == 25
+        assert len(prompts) == 3   # blocks 1–10 and 11–20, then the range with chapters 21–25
+        assert "Nội dung chương 21." in prompts[-1] and "Nội dung chương 5." not in prompts[-1]
+
+        _, prompts = await self._summarize(sb, 11, 23)
+        assert len(prompts) == 1   # block 11–20 is cached
+        assert "Nội dung chương 11." not in prompts[0]
+
+        _, prompts = await self._summarize(sb, 1, 10)
+        assert prompts == []       # exactly one cached block
+
+    async def test_every_chapter_reaches_a_long_arc(self):
+        sb, _, _ = self._store(120)
+
+        _, prompts = await self._summarize(sb, 1, 120)
+
+        sent = "".join(prompts)
+        assert all(f"Nội dung chương {n}." in sent for n in range(1, 121))
+        # 12 level-1 blocks, the level-2 block 1–100, then the range
+        assert len(prompts) == 14
+
+    async def test_long_chapter_is_summarised_in_pieces_not_truncated(self):
+        from app.core.config import settings
+
+        sb, chapters, _ = self._store(10)
+        chapters[3] = ("\n".join(f"Đoạn {k} của chương 3." for k in range(20)), "2026-01-01")
+
+        with patch.object(settings, "arc_summary_prompt_chars", 200):
+            _, prompts = await self._summarize(sb, 1, 10)
+
+        pieces = [prompt for prompt in prompts if prompt.startswith("Tóm tắt phần")]
+        assert len(pieces) == 3 and all(len(prompt) < 400 for prompt in pieces)
+        assert "Đoạn 19 của chương 3." in pieces[-1]   # the end of the chapter is not cut off
+        block = prompts[-1]
+        assert "Nội dung chương 10." in block and "Đoạn 0 của chương 3." not in block
+        assert block.count("tóm tắt Tóm tắt phần") == len(pieces)
+
+    async def test_edited_chapter_rebuilds_its_block(self):
+        sb, chapters, _ = self._store(20)
+        await self._summarize(sb, 1, 20)
+
+        chapters[5] = ("Nội dung mới.", "2026-02-01")
+        _, prompts = await self._summarize(sb, 1, 20)
+
+        assert len(prompts) == 2   # block 1–10 again, then the range; 11–20 still cached
+        assert "Nội dung mới." in prompts[0]
+
+    async def test_unwritten_tail_is_not_cached_as_a_block(self):
+        sb, _, files = self._store(15)
+
+        await self._summarize(sb, 1, 20)
+
+        assert not any(path.endswith("/1-1.json") for path in files)
+        assert any(path.endswith("/1-0.json") for path in files)
+
+    async def test_concurrent_requests_share_one_generation(self):
+        from app.services.story_intelligence_service import _arc_flights
+
+        sb, _, files = self._store(25)
+        prompts: list[str] = []
+        with self._patched(sb, self._model(prompts, delay=0.01)) as svc_module:
+            async def stream():
+                return [event async for event in svc_module.stream_arc_summary(NOVEL_ID, 1, 25)]
+
+            results = await asyncio.gather(
+                svc_module.get_arc_summary(NOVEL_ID, 1, 25),
+                svc_module.get_arc_summary(NOVEL_ID, 1, 25),
+                stream(),
+            )
+
+        assert len(prompts) == 3   # two blocks and one final generation, not three
+        assert results[0] == results[1]
+        assert results[0]["summary"].startswith("tóm tắt Tóm tắt nội dung từ chương 1 đến chương 25")
+        assert results[2][-1] == "data: [DONE]\n\n"
+        assert "".join(e[len("data: "):-2] for e in results[2][:-1]).strip() == results[0]["summary"]
+        assert json.loads(files[f"{NOVEL_ID}/1-25.json"])["summary"] == results[0]["summary"]
+        assert _arc_flights == {}
+
+    async def test_late_follower_gets_chunks_already_streamed(self):
+        from app.services.story_intelligence_service import _ArcFlight
+
+        flight = _ArcFlight()
+        await flight.publish("một ")
+        follower = flight.follow()
+        assert await follower.__anext__() == "một "
+        await flight.publish("hai")
+        await flight.finish()
+        assert [chunk async for chunk in follower] == ["hai"]
+
+    async def test_errors_reach_every_waiter(self):
+        sb, _, _ = self._store(0)
+        with self._patched(sb, self._model([])) as svc_module:
+            results = await asyncio.gather(
+                svc_module.get_arc_summary(NOVEL_ID, 1, 5),
+                svc_module.get_arc_summary(NOVEL_ID, 1, 5),
+                return_exceptions=True,
+            )
+            events = [event async for event in svc_module.stream_arc_summary(NOVEL_ID, 1, 5)]
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert events == ["data: [ERROR] No chapters found in range 1–5\n\n"]
+
 
 # ---------------------------------------------------------------------------
 # TestComputeTasks (service-level unit tests)
@@ -314,44 +666,230 @@ class TestArcSummary:
 
 class TestComputeTasks:
     def test_compute_relationships_marks_failed_when_no_gemini(self):
-        """compute_relationships_task marks failed when gemini_api_key is empty."""
+        """Without a roster to match against, an empty gemini_api_key marks the graph failed."""
         from app.services import story_intelligence_service as svc_module
 
+        sb = self._relationship_sb({"status": "pending"}, [])
         with (
             patch.object(svc_module, "_mark_relationships_failed") as mock_fail,
+            patch("app.services.story_intelligence_service.get_supabase", return_value=sb),
             patch("app.services.story_intelligence_service.settings") as mock_settings,
         ):
             mock_settings.gemini_api_key = ""
             svc_module.compute_relationships_task(NOVEL_ID)
 
         mock_fail.assert_called_once_with(NOVEL_ID)
-
-    def test_compute_relationships_stores_graph_on_success(self):
-        """compute_relationships_task stores status=ready with nodes/edges on success."""
-        from app.services import story_intelligence_service as svc_module
-
-        mock_sb = MagicMock()
-        mock_sb.table.return_value.select.return_value.eq.return_value.eq.return_value.order.return_value.execute.return_value = MagicMock(
-            data=[{"chapter_number": 1, "content": "Alice meets Bob."}]
+        sb.rpc.assert_not_called()
+
+    @staticmethod
+    def _relationship_sb(graph, due_pages, previous=None, orphaned=None, stored=None, applied=True, roster=()):
+        """Supabase mock for compute_relationships_task; records apply_relationship_pairs calls."""
+        sb = MagicMock()
+        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.maybe_single.return_value.execute.return_value = MagicMock(
+            data={"relationship_graph": graph}
+        )
+        sb.table.return_value.select.return_value.eq.return_value.execute.return_value = MagicMock(
+            data=[{"name": name} for name in roster]
         )
+        sb.table.return_value.select.return_value.eq.return_value.eq.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(
+            count=sum(len(page) for page in due_pages) + len(stored or [])
+        )
+        sb.table.return_value.select.return_value.in_.return_value.execute.return_value = MagicMock(data=previous or [])
+        sb.table.return_value.select.return_value.eq.return_value.gt.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(
+            data=stored or []
+        )
+        pages = list(due_pages)
+        sb.applied = []
+
+        def rpc(name, params):
+            result = MagicMock()
+            if name == "relationship_chapters_due":
+                data = pages.pop(0) if pages else []
+            elif name == "relationship_pairs_orphaned":
+                data = orphaned or []
+            elif name == "adopt_relationship_roster":
+                data = 0
+            else:
+                sb.applied.append(params)
+                data = applied
+            result.execute.return_value = MagicMock(data=data)
+            return result
+
+        sb.rpc.side_effect = rpc
+        return sb
+
+    def _run_relationships(self, sb, replies):
+        """Runs the task; `replies` maps chapter content to Gemini's reply (calls run in parallel)."""
+        from app.services import story_intelligence_service as svc_module
 
         mock_model = MagicMock()
-        mock_model.generate_content.return_value = MagicMock(text='[["Alice","Bob"]]')
-
+        mock_model.generate_content.side_effect = lambda prompt: MagicMock(
+            text=next(reply for content, reply in replies.items() if content in prompt)
+        )
         with (
-            patch("app.services.story_intelligence_service.get_supabase", return_value=mock_sb),
+            patch("app.services.story_intelligence_service.get_supabase", return_value=sb),
             patch("app.services.story_intelligence_service.settings") as mock_settings,
             patch("google.generativeai.configure"),
             patch("google.generativeai.GenerativeModel", return_value=mock_model),
         ):
             mock_settings.gemini_api_key = "test-key"
+            mock_settings.relationship_page_size = 2
+            mock_settings.relationship_window_paragraphs = 2
             svc_module.compute_relationships_task(NOVEL_ID)
+        return mock_model
 
-        update_call = mock_sb.table.return_value.update.call_args
-        stored = update_call[0][0]["relationship_graph"]
-        assert stored["status"] == "ready"
-        assert len(stored["nodes"]) == 2
-        assert len(stored["edges"]) == 1
+    @staticmethod
+    def _weights(graph: dict) -> dict:
+        return {(e["source"], e["target"]): e["weight"] for e in graph["edges"]}
+
+    def test_compute_relationships_stores_graph_on_success(self):
+        """A first build pages through due chapters, then marks the graph ready."""
+        chapters = [
+            {"id": "c1", "chapter_number": 1, "content": "Alice meets Bob."},
+            {"id": "c2", "chapter_number": 2, "content": "Bob meets Carol."},
+            {"id": "c3", "chapter_number": 3, "content": "Alice and Bob again."},
+        ]
+        sb = self._relationship_sb({"status": "pending"}, [chapters[:2], chapters[2:]])
+
+        model = self._run_relationships(sb, {
+            "Alice meets Bob.": '[["Alice","Bob"]]',
+            "Bob meets Carol.": '[["Carol","Bob"]]',
+            "Alice and Bob again.": '[["Bob","Alice"]]',
+        })
+
+        assert model.generate_content.call_count == 3
+        assert [len(call["p_rows"]) for call in sb.applied] == [2, 1, 0]
+        assert [call["p_expected_version"] for call in sb.applied] == [0, 1, 2]
+        assert [call["p_graph"]["status"] for call in sb.applied] == ["pending", "pending", "ready"]
+        assert [(call["p_graph"].get("processed"), call["p_graph"].get("total")) for call in sb.applied] == [
+            (2, 3), (3, 3), (None, None),
+        ]
+        stored = sb.applied[-1]["p_graph"]
+        assert self._weights(stored) == {("Alice", "Bob"): 2, ("Bob", "Carol"): 1}
+        assert len(stored["nodes"]) == 3
+        assert {row["chapter_id"]: row["pairs"] for row in sb.applied[0]["p_rows"]}["c1"] == [["Alice", "Bob"]]
+
+    def test_compute_relationships_merges_only_changed_chapters(self):
+        """A ready graph gets the delta of the due chapter: old pairs out, new pairs in."""
+        graph = {
+            "status": "ready", "version": 4, "nodes": [],
+            "edges": [{"source": "Bob", "target": "Alice", "weight": 2}],
+        }
+        sb = self._relationship_sb(
+            graph,
+            [[{"id": "c2", "chapter_number": 2, "content": "Alice meets Carol."}]],
+            previous=[{"chapter_id": "c2", "pairs": [["Alice", "Bob"]]}],
+        )
+
+        model = self._run_relationships(sb, {"Alice meets Carol.": '[["Alice","Carol"]]'})
+
+        model.generate_content.assert_called_once()
+        [call] = sb.applied
+        assert call["p_expected_version"] == 4
+        assert call["p_graph"]["status"] == "ready"
+        assert self._weights(call["p_graph"]) == {("Alice", "Bob"): 1, ("Alice", "Carol"): 1}
+
+    def test_compute_relationships_subtracts_deleted_chapters(self):
+        graph = {"status": "ready", "version": 1, "edges": [{"source": "Alice", "target": "Bob", "weight": 1}]}
+        sb = self._relationship_sb(graph, [[]], orphaned=[{"chapter_id": "c9", "pairs": [["Alice", "Bob"]]}])
+
+        model = self._run_relationships(sb, {})
+
+        model.generate_content.assert_not_called()
+        [call] = sb.applied
+        assert call["p_delete_ids"] == ["c9"]
+        assert call["p_graph"]["edges"] == []
+
+    def test_compute_relationships_rebuilds_from_stored_rows(self):
+        """A failed graph is rebuilt from chapter rows without asking Gemini again."""
+        sb = self._relationship_sb(
+            {"status": "failed"}, [[]],
+            stored=[{"chapter_number": 1, "pairs": [["Alice", "Bob"], ["Alice", "Bob"]]}],
+        )
+
+        model = self._run_relationships(sb, {})
+
+        model.generate_content.assert_not_called()
+        [call] = sb.applied
+        assert call["p_graph"]["status"] == "ready"
+        assert self._weights(call["p_graph"]) == {("Alice", "Bob"): 2}
+
+    def test_compute_relationships_pages_include_chapter_zero(self):
+        """Both the stored-row rebuild and the due-chapter scan start before chapter 0."""
+        sb = self._relationship_sb(
+            {"status": "failed"},
+            [[{"id": "c0", "chapter_number": 0, "content": "Alice meets Bob."}]],
+            stored=[{"chapter_number": 0, "pairs": []}],
+        )
+
+        self._run_relationships(sb, {"Alice meets Bob.": '[["Alice","Bob"]]'})
+
+        stored = sb.table.return_value.select.return_value.eq.return_value
+        stored.gt.assert_called_once_with("chapter_number", -1)
+        due = [call for call in sb.rpc.call_args_list if call.args[0] == "relationship_chapters_due"]
+        assert due[0].args[1]["p_after_number"] == -1
+        assert sb.applied[0]["p_rows"][0]["chapter_number"] == 0
+
+    def test_compute_relationships_skips_unrequested_graph(self):
+        sb = self._relationship_sb(None, [])
+        model = self._run_relationships(sb, {})
+        model.generate_content.assert_not_called()
+        sb.rpc.assert_not_called()
+
+    def test_compute_relationships_conflict_is_retried_not_failed(self):
+        from app.services import story_intelligence_service as svc_module
+
+        graph = {"status": "ready", "version": 1, "edges": []}
+        sb = self._relationship_sb(
+            graph, [[{"id": "c1", "chapter_number": 1, "content": "Alice meets Bob."}]], applied=False
+        )
+        with patch.object(svc_module, "_mark_relationships_failed") as mock_fail, \
+             pytest.raises(svc_module._GraphConflict):
+            self._run_relationships(sb, {"Alice meets Bob.": '[["Alice","Bob"]]'})
+        mock_fail.assert_not_called()
+
+    def test_compute_relationships_counts_locally_with_roster(self):
+        """With a character roster, pairs are co-occurrence counts and Gemini is not called."""
+        chapter = {
+            "id": "c1", "chapter_number": 1,
+            "content": "Alice gặp Bob.\nBob rời đi.\nCarol đến.\n\nDave ở một mình.",
+        }
+        sb = self._relationship_sb({"status": "pending"}, [[chapter]], roster=["Bob", "Alice", "Carol", "Dave"])
+
+        model = self._run_relationships(sb, {})
+
+        model.generate_content.assert_not_called()
+        row = sb.applied[0]["p_rows"][0]
+        assert row["pairs"] == [["Alice", "Bob", 2], ["Bob", "Carol", 1], ["Carol", "Dave", 1]]
+        assert row["roster_hash"] is not None
+        due = [call for call in sb.rpc.call_args_list if call.args[0] == "relationship_chapters_due"]
+        assert due[0].args[1]["p_roster_hash"] == row["roster_hash"]
+        [adopt] = [call for call in sb.rpc.call_args_list if call.args[0] == "adopt_relationship_roster"]
+        assert adopt.args[1] == {
+            "p_novel_id": NOVEL_ID,
+            "p_roster_hash": row["roster_hash"],
+            "p_names": ["Alice", "Bob", "Carol", "Dave"],
+        }
+        assert sb.rpc.call_args_list.index(adopt) < sb.rpc.call_args_list.index(due[0])
+        assert self._weights(sb.applied[-1]["p_graph"]) == {
+            ("Alice", "Bob"): 2, ("Bob", "Carol"): 1, ("Carol", "Dave"): 1,
+        }
+
+    def test_compute_relationships_replaces_gemini_pairs_with_counts(self):
+        """A chapter previously sent to Gemini is re-counted once a roster exists."""
+        graph = {"status": "ready", "version": 2, "edges": [{"source": "Alice", "target": "Bob", "weight": 1}]}
+        sb = self._relationship_sb(
+            graph,
+            [[{"id": "c1", "chapter_number": 1, "content": "Alice và Bob. Bob và Alice."}]],
+            previous=[{"chapter_id": "c1", "pairs": [["Alice", "Bob"]]}],
+            roster=["Alice", "Bob"],
+        )
+
+        self._run_relationships(sb, {})
+
+        [call] = sb.applied
+        assert self._weights(call["p_graph"]) == {("Alice", "Bob"): 1}
+        assert call["p_rows"][0]["pairs"] == [["Alice", "Bob", 1]]
 
     def test_compute_timeline_marks_failed_when_no_gemini(self):
         """compute_timeline_task marks failed when gemini_api_key is empty."""
@@ -386,11 +924,13 @@ class TestComputeTasks:
 
         with (
             patch("app.services.story_intelligence_service.get_supabase", return_value=mock_sb),
+            patch("app.services.story_intelligence_service.get_timeline", return_value=MOCK_TIMELINE_PENDING),
             patch("app.services.story_intelligence_service.settings") as mock_settings,
             patch("google.generativeai.configure"),
             patch("google.generativeai.GenerativeModel", return_value=mock_model),
         ):
             mock_settings.gemini_api_key = "test-key"
+            mock_settings.timeline_progress_every = 20
             svc_module.compute_timeline_task(NOVEL_ID)
 
         update_call = mock_sb.table.return_value.update.call_args
@@ -399,6 +939,41 @@ class TestComputeTasks:
         assert len(stored["events"]) == 2
         assert stored["events"][0]["chapter_number"] == 1
 
+    def test_compute_timeline_resumes_and_reports_progress(self):
+        """A retried run keeps the saved events, sends only the rest and saves processed/total."""
+        from app.services import story_intelligence_service as svc_module
+
+        mock_sb = MagicMock()
+        mock_sb.table.return_value.select.return_value.eq.return_value.eq.return_value.order.return_value.execute.return_value = MagicMock(
+            data=[{"chapter_number": n, "content": f"Nội dung chương {n}."} for n in (1, 2, 3)]
+        )
+        partial = {
+            "status": "pending", "processed": 1, "total": 3,
+            "events": [{"chapter_number": 1, "event_summary": "Sự kiện 1."}],
+        }
+        mock_model = MagicMock()
+        mock_model.generate_content.side_effect = lambda prompt: MagicMock(
+            text="Sự kiện 2." if "chương 2" in prompt else "Sự kiện 3."
+        )
+
+        with (
+            patch("app.services.story_intelligence_service.get_supabase", return_value=mock_sb),
+            patch("app.services.story_intelligence_service.get_timeline", return_value=partial),
+            patch("app.services.story_intelligence_service.settings") as mock_settings,
+            patch("google.generativeai.configure"),
+            patch("google.generativeai.GenerativeModel", return_value=mock_model),
+        ):
+            mock_settings.gemini_api_key = "test-key"
+            mock_settings.timeline_progress_every = 1
+            svc_module.compute_timeline_task(NOVEL_ID)
+
+        assert mock_model.generate_content.call_count == 2
+        saved = [c.args[0]["arc_timeline"] for c in mock_sb.table.return_value.update.call_args_list]
+        assert [(t["status"], t.get("processed"), t.get("total")) for t in saved] == [
+            ("pending", 1, 3), ("pending", 2, 3), ("ready", None, None),
+        ]
+        assert [e["event_summary"] for e in saved[-1]["events"]] == ["Sự kiện 1.", "Sự kiện 2.", "Sự kiện 3."]
+
 
 # ---------------------------------------------------------------------------
 # TestVipGate
@@ -421,3 +996,50 @@ class TestVipGate:
         ):
             r = client.get(f"/api/v1/ai/novels/{NOVEL_ID}/relationships", headers=AUTH_HEADERS)
         assert r.status_code != 403
+
+
+# ---------------------------------------------------------------------------
+# TestCooccurrence
+# ---------------------------------------------------------------------------
+
+
+class TestCooccurrence:
+    def test_matcher_finds_whole_words_case_insensitively(self):
+        from app.core.cooccurrence import NameMatcher
+
+        matcher = NameMatcher(["Minh", "Lan"])
+        assert matcher.find("minh và LAN gặp Minhh, Lanh và Minh.") == ["Minh", "Lan", "Minh"]
+
+    def test_matcher_prefers_longest_name(self):
+        from app.core.cooccurrence import NameMatcher
+
+        matcher = NameMatcher(["Minh", "Lý Minh", "Lý"])
+        assert matcher.find("Lý Minh nói với Minh rằng Lý đã đi.") == ["Lý Minh", "Minh", "Lý"]
+
+    def test_matcher_falls_back_to_suffix_name_at_word_boundary(self):
+        from app.core.cooccurrence import NameMatcher
+
+        matcher = NameMatcher(["an", "Lan"])
+        assert matcher.find("Xlan, an") == ["an"]
+
+    def test_empty_matcher(self):
+        from app.core.cooccurrence import NameMatcher
+
+        assert not NameMatcher(["", "  "])
+        assert NameMatcher([" ", "An"]).find("An") == ["An"]
+
+    def test_count_pairs_respects_window(self):
+        from app.core.cooccurrence import NameMatcher, count_pairs
+
+        matcher = NameMatcher(["A", "B", "C"])
+        content = "<p>A</p><p>filler</p><p>B</p><p>C</p>"
+        assert count_pairs(matcher, content, window=1) == []
+        assert count_pairs(matcher, content, window=2) == [["B", "C", 1]]
+        assert count_pairs(matcher, content, window=3) == [["A", "B", 1], ["B", "C", 1]]
+
+    def test_count_pairs_counts_each_paragraph_once(self):
+        from app.core.cooccurrence import NameMatcher, count_pairs
+
+        matcher = NameMatcher(["A", "B"])
+        assert count_pairs(matcher, "A B A B\nA\nB", window=1) == [["A", "B", 1]]
+        assert count_pairs(matcher, "A B A B\nA\nB", window=2) == [["A", "B", 3]]
@@ -126,8 +126,8 @@ class TestGetNarration:
 
 
 class TestRequestNarration:
-    def test_vip_max_gets_202_for_new_narration(self):
-        """POST with VIP Max creates new narration, returns 202."""
+    def test_vip_max_gets_202_for_new_narration(self, job_backend):
+        """POST with VIP Max creates new narration, returns 202 and enqueues generation."""
         with (
             patch("app.core.deps.get_supabase", return_value=_deps_supabase(MOCK_VIP_MAX)),
             patch(
@@ -140,6 +140,9 @@ class TestRequestNarration:
         assert r.status_code == 202
         body = r.json()
         assert body["status"] == "pending"
+        [job] = job_backend.jobs.values()
+        assert job["job_type"] == "generate_narration"
+        assert job["payload"] == {"chapter_id": CHAPTER_ID}
 
     def test_reader_gets_403(self):
         """POST with reader role → 403."""
@@ -0,0 +1,69 @@
+"""Tests for the write-behind view counter buffer."""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services import view_counter_service
+
+
+@pytest.fixture(autouse=True)
+def _empty_buffer():
+    view_counter_service._chapter_views.clear()
+    view_counter_service._user_reads.clear()
+    yield
+    view_counter_service._chapter_views.clear()
+    view_counter_service._user_reads.clear()
+
+
+def _rpc_mock(side_effect=None):
+    sb = MagicMock()
+    sb.rpc.return_value.execute = AsyncMock(side_effect=side_effect)
+    return sb
+
+
+class TestViewCounterBuffer:
+    async def test_flush_aggregates_reads_into_one_rpc(self):
+        view_counter_service.record_read("novel-1", 1, "user-a")
+        view_counter_service.record_read("novel-1", 1, "user-b")
+        view_counter_service.record_read("novel-1", 2, "user-a")
+        sb = _rpc_mock()
+        with patch("app.services.view_counter_service.get_async_supabase", return_value=sb):
+            await view_counter_service.flush()
+
+        sb.rpc.assert_called_once()
+        fn, params = sb.rpc.call_args.args
+        assert fn == "apply_read_counters"
+        views = {(d["novel_id"], d["chapter_number"]): d["delta"] for d in params["p_chapter_views"]}
+        reads = {d["user_id"]: d["delta"] for d in params["p_user_reads"]}
+        assert views == {("novel-1", 1): 2, ("novel-1", 2): 1}
+        assert reads == {"user-a": 2, "user-b": 1}
+        assert view_counter_service.pending_count() == 0
+
+    async def test_failed_flush_requeues_deltas(self):
+        view_counter_service.record_read("novel-1", 1, "user-a")
+        failing = _rpc_mock(side_effect=RuntimeError("db down"))
+        with patch("app.services.view_counter_service.get_async_supabase", return_value=failing):
+            await view_counter_service.flush()
+        view_counter_service.record_read("novel-1", 1, "user-a")
+
+        sb = _rpc_mock()
+        with patch("app.services.view_counter_service.get_async_supabase", return_value=sb):
+            await view_counter_service.flush()
+        params = sb.rpc.call_args.args[1]
+        assert params["p_chapter_views"][0]["delta"] == 2
+        assert params["p_user_reads"][0]["delta"] == 2
+
+    async def test_stop_drains_buffer(self):
+        sb = _rpc_mock()
+        with patch("app.services.view_counter_service.get_async_supabase", return_value=sb):
+            view_counter_service.start()
+            view_counter_service.record_read("novel-1", 3, "user-a")
+            await view_counter_service.stop()
+        sb.rpc.assert_called_once()
+        assert view_counter_service.pending_count() == 0
+
+    async def test_flush_without_pending_is_noop(self):
+        sb = _rpc_mock()
+        with patch("app.services.view_counter_service.get_async_supabase", return_value=sb):
+            await view_counter_service.flush()
+        sb.rpc.assert_not_called()
@@ -40,6 +40,7 @@ const STATUS_OPTIONS = [
 ];
 
 const SORT_OPTIONS = [
+  { label: "Liên quan nhất", value: "relevance" },
   { label: "Mới cập nhật", value: "updated_at" },
   { label: "Lượt xem", value: "total_views" },
   { label: "Đánh giá", value: "avg_rating" },
@@ -57,7 +58,9 @@ interface BrowsePageProps {
 
 export default async function BrowsePage({ searchParams }: BrowsePageProps) {
   const params = await searchParams;
-  const { q = "", tag = "", status = "", sort = "updated_at", cursor = "" } = params;
+  const { q = "", tag = "", status = "", cursor = "" } = params;
+  const sort = params.sort || (q ? "relevance" : "updated_at");
+  const sortOptions = SORT_OPTIONS.filter((opt) => q || opt.value !== "relevance");
 
   const queryParams = new URLSearchParams();
   if (q) queryParams.set("q", q);
@@ -127,7 +130,7 @@ export default async function BrowsePage({ searchParams }: BrowsePageProps) {
               Sắp xếp
             </h3>
             <ul className="space-y-1">
-              {SORT_OPTIONS.map((opt) => (
+              {sortOptions.map((opt) => (
                 <li key={opt.value}>
                   <Link
                     href={buildUrl({ sort: opt.value, cursor: "" })}
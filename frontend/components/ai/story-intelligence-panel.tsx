@@ -370,7 +370,12 @@ export function StoryIntelligencePanel({ novelId }: StoryIntelligencePanelProps)
             {relationships?.status === "pending" && (
               <div className="flex items-center gap-2 py-6 text-sm text-muted-foreground">
                 <Loader2 className="h-4 w-4 animate-spin" />
-                <span>Đang phân tích nhân vật... (có thể mất vài phút)</span>
+                <span>
+                  Đang phân tích nhân vật...{" "}
+                  {relationships.total
+                    ? `(${relationships.processed ?? 0}/${relationships.total} chương)`
+                    : "(có thể mất vài phút)"}
+                </span>
               </div>
             )}
             {relationships?.status === "ready" && relationships.nodes.length === 0 && (
@@ -412,7 +417,12 @@ export function StoryIntelligencePanel({ novelId }: StoryIntelligencePanelProps)
             {timeline?.status === "pending" && (
               <div className="flex items-center gap-2 py-6 text-sm text-muted-foreground">
                 <Loader2 className="h-4 w-4 animate-spin" />
-                <span>Đang tạo dòng thời gian... (có thể mất vài phút)</span>
+                <span>
+                  Đang tạo dòng thời gian...{" "}
+                  {timeline.total
+                    ? `(${timeline.processed ?? 0}/${timeline.total} chương)`
+                    : "(có thể mất vài phút)"}
+                </span>
               </div>
             )}
             {timeline?.status === "ready" && timeline.events.length === 0 && (
@@ -82,11 +82,15 @@ export interface RelationshipGraphResponse {
   status: "not_started" | "pending" | "ready" | "failed";
   nodes: RelationshipNode[];
   edges: RelationshipEdge[];
+  processed?: number | null; // chapters done while pending
+  total?: number | null;
 }
 
 export interface TimelineResponse {
   status: "not_started" | "pending" | "ready" | "failed";
   events: TimelineEvent[];
+  processed?: number | null; // chapters done while pending
+  total?: number | null;
 }
 
 export interface ArcSummaryResponse {
@@ -23,14 +23,19 @@ export interface ReadingProgress {
   user_id: string;
   novel_id: string;
   last_chapter_read: number;
-  chapters_read_list: number[];
+  chapters_read_count: number;
   updated_at: string;
 }
 
+export interface ReadingProgressDetail extends ReadingProgress {
+  /** Inclusive [first, last] runs of read chapter numbers. */
+  chapters_read_ranges: [number, number][];
+}
+
 export interface LibraryItem {
   novel_id: string;
   last_chapter_read: number;
-  chapters_read_list: number[];
+  chapters_read_count: number;
   updated_at: string;
   novel: {
     id: string;
@@ -0,0 +1,50 @@
+-- ============================================================
+-- Migration 016: Chapter reader in one round trip
+-- get_chapter_reader() returns the chapter row, prev/next published
+-- chapter numbers, the novel title and uploader in a single call.
+-- ============================================================
+
+-- ── Index: published chapters per novel ──────────────────────
+-- prev/next lookups are a single descent of this index (O(log N)),
+-- instead of downloading every chapter_number of the novel.
+
+CREATE INDEX IF NOT EXISTS chapters_published_nav_idx
+    ON public.chapters (novel_id, chapter_number)
+    WHERE status = 'published' AND is_deleted = FALSE;
+
+-- ── Function: get_chapter_reader ─────────────────────────────
+-- Returns NULL when the chapter does not exist (or is deleted).
+-- prev_chapter / next_chapter are only computed for published chapters,
+-- matching the navigation shown to readers.
+
+CREATE OR REPLACE FUNCTION public.get_chapter_reader(
+    p_novel_id       UUID,
+    p_chapter_number INTEGER
+)
+RETURNS JSONB LANGUAGE sql STABLE AS $$
+    SELECT to_jsonb(c) || jsonb_build_object(
+        'prev_chapter', CASE WHEN c.status = 'published' THEN (
+            SELECT p.chapter_number FROM public.chapters p
+            WHERE p.novel_id = c.novel_id
+              AND p.chapter_number < c.chapter_number
+              AND p.status = 'published' AND p.is_deleted = FALSE
+            ORDER BY p.chapter_number DESC
+            LIMIT 1
+        ) END,
+        'next_chapter', CASE WHEN c.status = 'published' THEN (
+            SELECT n.chapter_number FROM public.chapters n
+            WHERE n.novel_id = c.novel_id
+              AND n.chapter_number > c.chapter_number
+              AND n.status = 'published' AND n.is_deleted = FALSE
+            ORDER BY n.chapter_number ASC
+            LIMIT 1
+        ) END,
+        'novel_title', nv.title,
+        'novel_uploader_id', nv.uploader_id
+    )
+    FROM public.chapters c
+    LEFT JOIN public.novels nv ON nv.id = c.novel_id
+    WHERE c.novel_id = p_novel_id
+      AND c.chapter_number = p_chapter_number
+      AND c.is_deleted = FALSE;
+$$;
@@ -0,0 +1,56 @@
+-- ============================================================
+-- Migration 017: Write-behind read counters
+-- The API buffers chapter reads in memory and flushes them every few
+-- seconds through apply_read_counters(), which applies every delta as
+-- an atomic increment (no read-modify-write, no lost updates).
+-- ============================================================
+
+-- ── Function: reader_level ───────────────────────────────────
+-- Mirrors app/core/constants.LEVEL_THRESHOLDS (levels 0-9).
+
+CREATE OR REPLACE FUNCTION public.reader_level(p_chapters_read INTEGER)
+RETURNS INTEGER LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT LEAST(9, GREATEST(0, (
+        SELECT COUNT(*)::INTEGER - 1
+        FROM unnest(ARRAY[0, 100, 500, 2000, 5000, 10000, 30000, 50000, 70000, 100000]) AS t
+        WHERE p_chapters_read >= t
+    )))
+$$;
+
+-- ── Function: apply_read_counters ────────────────────────────
+-- p_chapter_views: [{"novel_id": uuid, "chapter_number": int, "delta": int}, ...]
+-- p_user_reads:    [{"user_id": uuid, "delta": int}, ...]
+-- novels.total_views receives the sum of the chapter deltas that matched
+-- an existing chapter, so views of unknown chapters are not counted.
+
+CREATE OR REPLACE FUNCTION public.apply_read_counters(
+    p_chapter_views JSONB,
+    p_user_reads    JSONB
+)
+RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    WITH deltas AS (
+        SELECT * FROM jsonb_to_recordset(p_chapter_views)
+            AS d(novel_id UUID, chapter_number INTEGER, delta INTEGER)
+    ),
+    bumped AS (
+        UPDATE public.chapters c
+        SET views = c.views + deltas.delta
+        FROM deltas
+        WHERE c.novel_id = deltas.novel_id
+          AND c.chapter_number = deltas.chapter_number
+          AND c.is_deleted = FALSE
+        RETURNING c.novel_id, deltas.delta
+    )
+    UPDATE public.novels n
+    SET total_views = n.total_views + per_novel.delta
+    FROM (SELECT novel_id, SUM(delta)::INTEGER AS delta FROM bumped GROUP BY novel_id) AS per_novel
+    WHERE n.id = per_novel.novel_id;
+
+    UPDATE public.users u
+    SET chapters_read = u.chapters_read + d.delta,
+        level         = public.reader_level(u.chapters_read + d.delta)
+    FROM jsonb_to_recordset(p_user_reads) AS d(user_id UUID, delta INTEGER)
+    WHERE u.id = d.user_id;
+END;
+$$;
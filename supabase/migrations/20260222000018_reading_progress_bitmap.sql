@@ -0,0 +1,106 @@
+-- ============================================================
+-- Migration 018: Compact reading progress
+-- Replaces reading_progress.chapters_read_list (INTEGER[] that the API
+-- downloaded, appended to and re-uploaded on every page turn) with a
+-- bitmap (bit n = chapter n read) plus a maintained count.
+-- record_chapter_read() sets a single bit server-side, so a read sends
+-- three scalars instead of the whole list.
+-- ============================================================
+
+ALTER TABLE public.reading_progress
+    ADD COLUMN IF NOT EXISTS chapters_read_bitmap BYTEA   NOT NULL DEFAULT '\x'::BYTEA,
+    ADD COLUMN IF NOT EXISTS chapters_read_count  INTEGER NOT NULL DEFAULT 0;
+
+-- ── Function: chapter_bitmap_set ─────────────────────────────
+-- Returns p_bitmap with bit p_chapter_number set, growing it as needed.
+-- Bit numbering follows get_bit/set_bit on BYTEA: byte n / 8, bit n % 8
+-- counted from the least significant bit (same as the Python codec in
+-- app/services/chapter_service.py).
+
+CREATE OR REPLACE FUNCTION public.chapter_bitmap_set(p_bitmap BYTEA, p_chapter_number INTEGER)
+RETURNS BYTEA LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    v_needed INTEGER := p_chapter_number / 8 + 1;
+BEGIN
+    IF p_chapter_number < 0 THEN
+        RAISE EXCEPTION 'chapter_number must be >= 0, got %', p_chapter_number;
+    END IF;
+    IF length(p_bitmap) < v_needed THEN
+        p_bitmap := p_bitmap || decode(repeat('00', v_needed - length(p_bitmap)), 'hex');
+    END IF;
+    RETURN set_bit(p_bitmap, p_chapter_number, 1);
+END;
+$$;
+
+-- ── Backfill from the legacy array ───────────────────────────
+
+DO $$
+DECLARE
+    r   RECORD;
+    n   INTEGER;
+    bm  BYTEA;
+BEGIN
+    FOR r IN SELECT user_id, novel_id, chapters_read_list FROM public.reading_progress LOOP
+        bm := '\x'::BYTEA;
+        FOREACH n IN ARRAY r.chapters_read_list LOOP
+            IF n >= 0 THEN
+                bm := public.chapter_bitmap_set(bm, n);
+            END IF;
+        END LOOP;
+        UPDATE public.reading_progress
+        SET chapters_read_bitmap = bm,
+            chapters_read_count  = (SELECT COUNT(DISTINCT x) FROM unnest(r.chapters_read_list) AS x WHERE x >= 0)
+        WHERE user_id = r.user_id AND novel_id = r.novel_id;
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE public.reading_progress DROP COLUMN IF EXISTS chapters_read_list;
+
+-- ── Function: record_chapter_read ────────────────────────────
+-- Upserts the progress row and marks one chapter as read.
+-- Returns the progress summary plus is_new (first read of this chapter).
+
+CREATE OR REPLACE FUNCTION public.record_chapter_read(
+    p_user_id        UUID,
+    p_novel_id       UUID,
+    p_chapter_number INTEGER
+)
+RETURNS JSONB LANGUAGE plpgsql AS $$
+DECLARE
+    v_bitmap BYTEA;
+    v_is_new BOOLEAN;
+    v_row    public.reading_progress;
+BEGIN
+    INSERT INTO public.reading_progress (user_id, novel_id)
+    VALUES (p_user_id, p_novel_id)
+    ON CONFLICT (user_id, novel_id) DO NOTHING;
+
+    SELECT chapters_read_bitmap INTO v_bitmap
+    FROM public.reading_progress
+    WHERE user_id = p_user_id AND novel_id = p_novel_id
+    FOR UPDATE;
+
+    v_is_new := p_chapter_number >= length(v_bitmap) * 8
+                OR get_bit(v_bitmap, p_chapter_number) = 0;
+
+    UPDATE public.reading_progress
+    SET chapters_read_bitmap = CASE WHEN v_is_new
+                                    THEN public.chapter_bitmap_set(v_bitmap, p_chapter_number)
+                                    ELSE chapters_read_bitmap END,
+        chapters_read_count  = chapters_read_count + v_is_new::INTEGER,
+        last_chapter_read    = GREATEST(last_chapter_read, p_chapter_number),
+        updated_at           = NOW()
+    WHERE user_id = p_user_id AND novel_id = p_novel_id
+    RETURNING * INTO v_row;
+
+    RETURN jsonb_build_object(
+        'user_id',             v_row.user_id,
+        'novel_id',            v_row.novel_id,
+        'last_chapter_read',   v_row.last_chapter_read,
+        'chapters_read_count', v_row.chapters_read_count,
+        'updated_at',          v_row.updated_at,
+        'is_new',              v_is_new
+    );
+END;
+$$;
@@ -0,0 +1,77 @@
+-- ============================================================
+-- Migration 019: Ranked catalog search
+-- Catalog search used ILIKE '%q%' on title (sequential scan, title only).
+-- search_novels() matches novels.search_vector through novels_search_idx
+-- (GIN) with a diacritic-insensitive prefix query, and pages with a
+-- (sort_key, id) keyset so relevance ordering has a stable cursor.
+-- ============================================================
+
+-- ── Function: novel_search_query ─────────────────────────────
+-- 'Đấu Phá thương' -> 'dau:* & pha:* & thuong:*'. Input is reduced to
+-- alphanumeric words first, so user text can never break to_tsquery syntax.
+-- Returns NULL when nothing searchable is left.
+
+CREATE OR REPLACE FUNCTION public.novel_search_query(p_query TEXT)
+RETURNS tsquery LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT to_tsquery('simple', string_agg(word || ':*', ' & '))
+    FROM regexp_split_to_table(lower(public.immutable_unaccent(coalesce(p_query, ''))), '[^[:alnum:]]+') AS word
+    WHERE word <> ''
+$$;
+
+-- ── Function: search_novels ──────────────────────────────────
+-- p_sort: 'relevance' | 'updated_at' | 'total_views' | 'avg_rating'.
+-- Every sort is mapped onto one NUMERIC sort_key (updated_at as epoch
+-- seconds, microsecond precision) so a single keyset covers all of them;
+-- relevance is rounded to 6 places so it survives the JSON round trip of
+-- the cursor exactly. Rows come back in order as a JSONB array, each with
+-- its tags and sort_key (as text, so epoch microseconds are not rounded
+-- through a float on the client).
+
+CREATE OR REPLACE FUNCTION public.search_novels(
+    p_query      TEXT,
+    p_sort       TEXT    DEFAULT 'relevance',
+    p_status     TEXT    DEFAULT NULL,
+    p_tag_slug   TEXT    DEFAULT NULL,
+    p_after_key  NUMERIC DEFAULT NULL,
+    p_after_id   UUID    DEFAULT NULL,
+    p_limit      INTEGER DEFAULT 20
+)
+RETURNS JSONB LANGUAGE sql STABLE AS $$
+    WITH matched AS (
+        SELECT n.*,
+               CASE p_sort
+                   WHEN 'updated_at'  THEN EXTRACT(EPOCH FROM n.updated_at)::NUMERIC
+                   WHEN 'total_views' THEN n.total_views::NUMERIC
+                   WHEN 'avg_rating'  THEN n.avg_rating::NUMERIC
+                   ELSE round(ts_rank_cd(n.search_vector, public.novel_search_query(p_query))::NUMERIC, 6)
+               END AS sort_key
+        FROM public.novels n
+        WHERE n.search_vector @@ public.novel_search_query(p_query)
+          AND n.is_deleted = FALSE
+          AND (p_status IS NULL OR n.status::TEXT = p_status)
+          AND (p_tag_slug IS NULL OR EXISTS (
+                SELECT 1 FROM public.novel_tags nt
+                JOIN public.tags t ON t.id = nt.tag_id
+                WHERE nt.novel_id = n.id AND t.slug = p_tag_slug))
+    ),
+    page AS (
+        SELECT * FROM matched
+        WHERE p_after_id IS NULL OR (sort_key, id) < (p_after_key, p_after_id)
+        ORDER BY sort_key DESC, id DESC
+        LIMIT p_limit
+    )
+    SELECT coalesce(jsonb_agg(
+        jsonb_build_object(
+            'id', p.id, 'title', p.title, 'original_title', p.original_title,
+            'author', p.author, 'cover_url', p.cover_url, 'status', p.status,
+            'uploader_id', p.uploader_id, 'total_chapters', p.total_chapters,
+            'total_views', p.total_views, 'avg_rating', p.avg_rating,
+            'rating_count', p.rating_count, 'is_pinned', p.is_pinned,
+            'updated_at', p.updated_at, 'sort_key', p.sort_key::TEXT,
+            'tags', (SELECT coalesce(jsonb_agg(jsonb_build_object('id', t.id, 'name', t.name, 'slug', t.slug)), '[]'::JSONB)
+                     FROM public.novel_tags nt JOIN public.tags t ON t.id = nt.tag_id
+                     WHERE nt.novel_id = p.id)
+        ) ORDER BY p.sort_key DESC, p.id DESC
+    ), '[]'::JSONB)
+    FROM page p
+$$;
@@ -0,0 +1,25 @@
+-- ============================================================
+-- Migration 020: Keyset indexes for catalog pagination
+-- get_novels pages with WHERE (sort_col, id) < (cursor_key, cursor_id)
+-- ORDER BY sort_col DESC, id DESC. One composite index per sort mode
+-- turns every page, however deep, into an index range scan.
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS novels_updated_keyset_idx
+    ON public.novels (updated_at DESC, id DESC) WHERE is_deleted = FALSE;
+
+CREATE INDEX IF NOT EXISTS novels_views_keyset_idx
+    ON public.novels (total_views DESC, id DESC) WHERE is_deleted = FALSE;
+
+CREATE INDEX IF NOT EXISTS novels_rating_keyset_idx
+    ON public.novels (avg_rating DESC, id DESC) WHERE is_deleted = FALSE;
+
+-- Status filter ("completed, most viewed") is the other common browse path.
+CREATE INDEX IF NOT EXISTS novels_status_views_keyset_idx
+    ON public.novels (status, total_views DESC, id DESC) WHERE is_deleted = FALSE;
+
+CREATE INDEX IF NOT EXISTS novels_status_updated_keyset_idx
+    ON public.novels (status, updated_at DESC, id DESC) WHERE is_deleted = FALSE;
+
+-- Superseded by novels_updated_keyset_idx.
+DROP INDEX IF EXISTS public.novels_updated_idx;
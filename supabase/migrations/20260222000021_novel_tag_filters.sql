@@ -0,0 +1,67 @@
+-- ============================================================
+-- Migration 021: Multi-tag filtering
+-- get_novels used to resolve a tag, download every novel_id carrying it
+-- and send them back as an in_() list. Browsing now filters with aliased
+-- !inner embeds on novel_tags (joined server-side); search_novels() gets
+-- the same AND/OR tag semantics through p_tag_slugs / p_tag_mode.
+-- ============================================================
+
+-- Reverse lookup (tag -> novels) for selective tag filters.
+CREATE INDEX IF NOT EXISTS novel_tags_tag_idx ON public.novel_tags (tag_id, novel_id);
+
+-- ── Function: search_novels (replaces the migration 019 signature) ──
+-- p_tag_slugs: NULL for no tag filter.
+-- p_tag_mode:  'all' = novel carries every slug, 'any' = at least one.
+
+DROP FUNCTION IF EXISTS public.search_novels(TEXT, TEXT, TEXT, TEXT, NUMERIC, UUID, INTEGER);
+
+CREATE OR REPLACE FUNCTION public.search_novels(
+    p_query      TEXT,
+    p_sort       TEXT    DEFAULT 'relevance',
+    p_status     TEXT    DEFAULT NULL,
+    p_tag_slugs  TEXT[]  DEFAULT NULL,
+    p_tag_mode   TEXT    DEFAULT 'all',
+    p_after_key  NUMERIC DEFAULT NULL,
+    p_after_id   UUID    DEFAULT NULL,
+    p_limit      INTEGER DEFAULT 20
+)
+RETURNS JSONB LANGUAGE sql STABLE AS $$
+    WITH matched AS (
+        SELECT n.*,
+               CASE p_sort
+                   WHEN 'updated_at'  THEN EXTRACT(EPOCH FROM n.updated_at)::NUMERIC
+                   WHEN 'total_views' THEN n.total_views::NUMERIC
+                   WHEN 'avg_rating'  THEN n.avg_rating::NUMERIC
+                   ELSE round(ts_rank_cd(n.search_vector, public.novel_search_query(p_query))::NUMERIC, 6)
+               END AS sort_key
+        FROM public.novels n
+        WHERE n.search_vector @@ public.novel_search_query(p_query)
+          AND n.is_deleted = FALSE
+          AND (p_status IS NULL OR n.status::TEXT = p_status)
+          AND (p_tag_slugs IS NULL OR (
+                SELECT COUNT(DISTINCT t.slug) FROM public.novel_tags nt
+                JOIN public.tags t ON t.id = nt.tag_id
+                WHERE nt.novel_id = n.id AND t.slug = ANY(p_tag_slugs)
+              ) >= CASE WHEN p_tag_mode = 'any' THEN 1 ELSE cardinality(p_tag_slugs) END)
+    ),
+    page AS (
+        SELECT * FROM matched
+        WHERE p_after_id IS NULL OR (sort_key, id) < (p_after_key, p_after_id)
+        ORDER BY sort_key DESC, id DESC
+        LIMIT p_limit
+    )
+    SELECT coalesce(jsonb_agg(
+        jsonb_build_object(
+            'id', p.id, 'title', p.title, 'original_title', p.original_title,
+            'author', p.author, 'cover_url', p.cover_url, 'status', p.status,
+            'uploader_id', p.uploader_id, 'total_chapters', p.total_chapters,
+            'total_views', p.total_views, 'avg_rating', p.avg_rating,
+            'rating_count', p.rating_count, 'is_pinned', p.is_pinned,
+            'updated_at', p.updated_at, 'sort_key', p.sort_key::TEXT,
+            'tags', (SELECT coalesce(jsonb_agg(jsonb_build_object('id', t.id, 'name', t.name, 'slug', t.slug)), '[]'::JSONB)
+                     FROM public.novel_tags nt JOIN public.tags t ON t.id = nt.tag_id
+                     WHERE nt.novel_id = p.id)
+        ) ORDER BY p.sort_key DESC, p.id DESC
+    ), '[]'::JSONB)
+    FROM page p
+$$;
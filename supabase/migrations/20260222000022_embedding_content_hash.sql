@@ -0,0 +1,12 @@
+-- ============================================================
+-- Migration 022: Content hashes for embedded chunks
+-- embed_chapter re-embedded every chunk on each republish and wrote new
+-- random Qdrant point IDs, orphaning the old points. Point IDs are now
+-- uuid5(chapter_id, chunk_index, content_hash), and the hash is kept here
+-- so unchanged chunks are skipped and stale points can be deleted.
+-- Rows written before this migration have no hash and are re-embedded
+-- once on the chapter's next publish.
+-- ============================================================
+
+ALTER TABLE public.novel_embeddings
+    ADD COLUMN IF NOT EXISTS content_hash TEXT;
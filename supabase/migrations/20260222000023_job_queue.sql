@@ -0,0 +1,115 @@
+-- ============================================================
+-- Migration 023: Durable job queue for AI pipelines
+-- Chapter embedding, character extraction, narration and the story
+-- intelligence computations ran as in-process BackgroundTasks: they shared
+-- the web worker's threadpool, were lost on restart and had no limits.
+-- They are now rows in public.jobs, claimed by a separate worker process
+-- (app/workers/job_worker.py) with FOR UPDATE SKIP LOCKED.
+-- A claimed job holds a lease (locked_until) that the worker renews; a
+-- job whose worker died is reclaimed once the lease expires.
+-- ============================================================
+
+-- ── Table: jobs ──────────────────────────────────────────────
+
+CREATE TABLE public.jobs (
+    id              UUID        PRIMARY KEY DEFAULT gen_random_uuid(),
+    job_type        TEXT        NOT NULL,
+    payload         JSONB       NOT NULL DEFAULT '{}'::JSONB,
+    status          TEXT        NOT NULL DEFAULT 'queued'
+                    CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    idempotency_key TEXT,
+    attempts        INTEGER     NOT NULL DEFAULT 0,
+    max_attempts    INTEGER     NOT NULL DEFAULT 3,
+    run_after       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_by       TEXT,
+    locked_until    TIMESTAMPTZ,
+    last_error      TEXT,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at      TIMESTAMPTZ,
+    finished_at     TIMESTAMPTZ
+);
+
+-- At most one queued job per key: re-enqueueing while one waits returns it.
+-- A running job does not block a new one, so an edit made mid-run is picked up.
+CREATE UNIQUE INDEX jobs_idempotency_idx
+    ON public.jobs (idempotency_key) WHERE status = 'queued';
+
+CREATE INDEX jobs_claim_idx
+    ON public.jobs (job_type, run_after) WHERE status = 'queued';
+
+CREATE INDEX jobs_lease_idx
+    ON public.jobs (job_type, locked_until) WHERE status = 'running';
+
+CREATE INDEX jobs_created_idx ON public.jobs (created_at DESC);
+
+ALTER TABLE public.jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "jobs_admin_read" ON public.jobs
+    FOR SELECT USING (
+        EXISTS (SELECT 1 FROM public.users WHERE id = auth.uid() AND role = 'admin')
+    );
+
+-- ── Function: enqueue_job ────────────────────────────────────
+-- Inserts a job, or returns the queued job that already holds
+-- p_idempotency_key. Loops in case that job is claimed in between.
+
+CREATE OR REPLACE FUNCTION public.enqueue_job(
+    p_job_type        TEXT,
+    p_payload         JSONB,
+    p_idempotency_key TEXT    DEFAULT NULL,
+    p_max_attempts    INTEGER DEFAULT 3,
+    p_delay_seconds   INTEGER DEFAULT 0
+)
+RETURNS JSONB LANGUAGE plpgsql AS $$
+DECLARE
+    v_job JSONB;
+BEGIN
+    LOOP
+        INSERT INTO public.jobs (job_type, payload, idempotency_key, max_attempts, run_after)
+        VALUES (p_job_type, p_payload, p_idempotency_key, p_max_attempts,
+                NOW() + make_interval(secs => p_delay_seconds))
+        ON CONFLICT (idempotency_key) WHERE status = 'queued' DO NOTHING
+        RETURNING to_jsonb(jobs.*) INTO v_job;
+
+        IF v_job IS NULL THEN
+            SELECT to_jsonb(j.*) INTO v_job
+            FROM public.jobs j
+            WHERE j.idempotency_key = p_idempotency_key AND j.status = 'queued';
+        END IF;
+
+        IF v_job IS NOT NULL THEN
+            RETURN v_job;
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- ── Function: claim_jobs ─────────────────────────────────────
+-- Leases up to p_limit runnable jobs of one type to p_worker: queued jobs
+-- that are due, plus running jobs whose lease has expired. attempts counts
+-- claims, so a job that keeps killing its worker still runs out of attempts.
+
+CREATE OR REPLACE FUNCTION public.claim_jobs(
+    p_worker        TEXT,
+    p_job_type      TEXT,
+    p_limit         INTEGER,
+    p_lease_seconds INTEGER
+)
+RETURNS SETOF public.jobs LANGUAGE sql AS $$
+    UPDATE public.jobs j
+    SET status       = 'running',
+        attempts     = j.attempts + 1,
+        locked_by    = p_worker,
+        locked_until = NOW() + make_interval(secs => p_lease_seconds),
+        started_at   = NOW()
+    WHERE j.id IN (
+        SELECT id FROM public.jobs
+        WHERE job_type = p_job_type
+          AND ((status = 'queued' AND run_after <= NOW())
+               OR (status = 'running' AND locked_until < NOW()))
+        ORDER BY run_after
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.*
+$$;
@@ -0,0 +1,34 @@
+-- ============================================================
+-- Migration 024: Novel-wide embedding backfill checkpoints
+-- An admin-triggered backfill (job type backfill_embeddings) embeds every
+-- published chapter of a novel page by page. One row per novel records
+-- how far it got, so a retried or re-triggered backfill resumes after
+-- last_chapter_number instead of starting over, and carries the progress,
+-- throughput and ETA shown to the admin.
+-- ============================================================
+
+-- ── Table: embedding_backfills ───────────────────────────────
+
+CREATE TABLE public.embedding_backfills (
+    novel_id            UUID        PRIMARY KEY REFERENCES public.novels(id) ON DELETE CASCADE,
+    status              TEXT        NOT NULL DEFAULT 'queued'
+                        CHECK (status IN ('queued', 'running', 'completed', 'failed')),
+    last_chapter_number INTEGER     NOT NULL DEFAULT 0,
+    chapters_done       INTEGER     NOT NULL DEFAULT 0,
+    chapters_total      INTEGER     NOT NULL DEFAULT 0,
+    chunks_embedded     INTEGER     NOT NULL DEFAULT 0,
+    chunks_skipped      INTEGER     NOT NULL DEFAULT 0,
+    chapters_per_minute NUMERIC(10, 2),
+    eta_seconds         INTEGER,
+    last_error          TEXT,
+    started_at          TIMESTAMPTZ,
+    updated_at          TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at         TIMESTAMPTZ
+);
+
+ALTER TABLE public.embedding_backfills ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "embedding_backfills_admin_read" ON public.embedding_backfills
+    FOR SELECT USING (
+        EXISTS (SELECT 1 FROM public.users WHERE id = auth.uid() AND role = 'admin')
+    );
@@ -0,0 +1,100 @@
+-- ============================================================
+-- Migration 025: Per-chapter character co-mentions
+-- compute_relationships_task re-read every chapter and asked Gemini about
+-- each one to rebuild novels.relationship_graph from scratch. The pairs
+-- extracted from a chapter are now kept here with the md5 of the content
+-- they came from, so a run only sends chapters that are new or changed
+-- and merges their edge deltas into the stored graph.
+-- relationship_graph carries a version; apply_relationship_pairs writes
+-- rows and graph in one transaction and only if the version still
+-- matches, so two overlapping runs cannot drop each other's deltas.
+-- ============================================================
+
+-- ── Table: chapter_relationship_pairs ────────────────────────
+
+CREATE TABLE public.chapter_relationship_pairs (
+    chapter_id     UUID        PRIMARY KEY REFERENCES public.chapters(id) ON DELETE CASCADE,
+    novel_id       UUID        NOT NULL REFERENCES public.novels(id) ON DELETE CASCADE,
+    chapter_number INTEGER     NOT NULL,
+    content_hash   TEXT        NOT NULL,               -- md5(chapters.content)
+    pairs          JSONB       NOT NULL DEFAULT '[]',  -- [["A", "B"], ...], names sorted within a pair
+    computed_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX chapter_relationship_pairs_novel_idx
+    ON public.chapter_relationship_pairs (novel_id, chapter_number);
+
+ALTER TABLE public.chapter_relationship_pairs ENABLE ROW LEVEL SECURITY;
+
+-- ── Function: relationship_chapters_due ──────────────────────
+-- Published chapters after p_after_number whose pairs are missing or were
+-- extracted from different content. Keyset-paged by chapter_number.
+
+CREATE OR REPLACE FUNCTION public.relationship_chapters_due(
+    p_novel_id     UUID,
+    p_after_number INTEGER,
+    p_limit        INTEGER
+)
+RETURNS TABLE (id UUID, chapter_number INTEGER, content TEXT) LANGUAGE sql STABLE AS $$
+    SELECT c.id, c.chapter_number, c.content
+    FROM public.chapters c
+    LEFT JOIN public.chapter_relationship_pairs p ON p.chapter_id = c.id
+    WHERE c.novel_id = p_novel_id
+      AND c.status = 'published'
+      AND NOT c.is_deleted
+      AND c.chapter_number > p_after_number
+      AND (p.chapter_id IS NULL OR p.content_hash <> md5(c.content))
+    ORDER BY c.chapter_number
+    LIMIT p_limit
+$$;
+
+-- ── Function: relationship_pairs_orphaned ────────────────────
+-- Pair rows whose chapter was deleted or unpublished since.
+
+CREATE OR REPLACE FUNCTION public.relationship_pairs_orphaned(p_novel_id UUID)
+RETURNS SETOF public.chapter_relationship_pairs LANGUAGE sql STABLE AS $$
+    SELECT p.*
+    FROM public.chapter_relationship_pairs p
+    JOIN public.chapters c ON c.id = p.chapter_id
+    WHERE p.novel_id = p_novel_id
+      AND (c.is_deleted OR c.status <> 'published')
+$$;
+
+-- ── Function: apply_relationship_pairs ───────────────────────
+-- Upserts p_rows, deletes p_delete_ids and stores p_graph, provided the
+-- stored graph is still at p_expected_version. Returns FALSE (writing
+-- nothing) when another run got there first.
+
+CREATE OR REPLACE FUNCTION public.apply_relationship_pairs(
+    p_novel_id         UUID,
+    p_expected_version INTEGER,
+    p_graph            JSONB,
+    p_rows             JSONB,
+    p_delete_ids       UUID[] DEFAULT '{}'
+)
+RETURNS BOOLEAN LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE public.novels
+    SET relationship_graph = p_graph
+    WHERE id = p_novel_id
+      AND COALESCE((relationship_graph->>'version')::INTEGER, 0) = p_expected_version;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    DELETE FROM public.chapter_relationship_pairs
+    WHERE novel_id = p_novel_id AND chapter_id = ANY(p_delete_ids);
+
+    INSERT INTO public.chapter_relationship_pairs (chapter_id, novel_id, chapter_number, content_hash, pairs)
+    SELECT r.chapter_id, p_novel_id, r.chapter_number, r.content_hash, r.pairs
+    FROM jsonb_to_recordset(p_rows)
+         AS r(chapter_id UUID, chapter_number INTEGER, content_hash TEXT, pairs JSONB)
+    ON CONFLICT (chapter_id) DO UPDATE
+    SET chapter_number = EXCLUDED.chapter_number,
+        content_hash   = EXCLUDED.content_hash,
+        pairs          = EXCLUDED.pairs,
+        computed_at    = NOW();
+
+    RETURN TRUE;
+END;
+$$;
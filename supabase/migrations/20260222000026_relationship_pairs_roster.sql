@@ -0,0 +1,83 @@
+-- ============================================================
+-- Migration 026: Roster-based relationship pairs
+-- Once a novel has a character roster, compute_relationships_task counts
+-- pairs locally (co-occurrence within a few paragraphs) instead of asking
+-- Gemini per chapter. Local counts depend on the roster they were matched
+-- against, so each row records its md5; a roster change makes every
+-- chapter due again. Gemini-extracted rows keep roster_hash NULL.
+-- ============================================================
+
+-- ── Table: chapter_relationship_pairs ────────────────────────
+
+ALTER TABLE public.chapter_relationship_pairs
+    ADD COLUMN roster_hash TEXT;   -- md5 of the sorted roster names; NULL for Gemini pairs
+
+COMMENT ON COLUMN public.chapter_relationship_pairs.pairs IS
+    '[["A", "B"], ...] from Gemini or [["A", "B", count], ...] from co-occurrence; names sorted within a pair';
+
+-- ── Function: relationship_chapters_due ──────────────────────
+-- Published chapters after p_after_number whose pairs are missing, were
+-- extracted from different content, or were counted against a different
+-- roster. Keyset-paged by chapter_number.
+
+DROP FUNCTION IF EXISTS public.relationship_chapters_due(UUID, INTEGER, INTEGER);
+
+CREATE OR REPLACE FUNCTION public.relationship_chapters_due(
+    p_novel_id     UUID,
+    p_after_number INTEGER,
+    p_limit        INTEGER,
+    p_roster_hash  TEXT DEFAULT NULL
+)
+RETURNS TABLE (id UUID, chapter_number INTEGER, content TEXT) LANGUAGE sql STABLE AS $$
+    SELECT c.id, c.chapter_number, c.content
+    FROM public.chapters c
+    LEFT JOIN public.chapter_relationship_pairs p ON p.chapter_id = c.id
+    WHERE c.novel_id = p_novel_id
+      AND c.status = 'published'
+      AND NOT c.is_deleted
+      AND c.chapter_number > p_after_number
+      AND (p.chapter_id IS NULL
+           OR p.content_hash <> md5(c.content)
+           OR p.roster_hash IS DISTINCT FROM p_roster_hash)
+    ORDER BY c.chapter_number
+    LIMIT p_limit
+$$;
+
+-- ── Function: apply_relationship_pairs ───────────────────────
+-- As in migration 025, now also storing each row's roster_hash.
+
+CREATE OR REPLACE FUNCTION public.apply_relationship_pairs(
+    p_novel_id         UUID,
+    p_expected_version INTEGER,
+    p_graph            JSONB,
+    p_rows             JSONB,
+    p_delete_ids       UUID[] DEFAULT '{}'
+)
+RETURNS BOOLEAN LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE public.novels
+    SET relationship_graph = p_graph
+    WHERE id = p_novel_id
+      AND COALESCE((relationship_graph->>'version')::INTEGER, 0) = p_expected_version;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    DELETE FROM public.chapter_relationship_pairs
+    WHERE novel_id = p_novel_id AND chapter_id = ANY(p_delete_ids);
+
+    INSERT INTO public.chapter_relationship_pairs
+        (chapter_id, novel_id, chapter_number, content_hash, roster_hash, pairs)
+    SELECT r.chapter_id, p_novel_id, r.chapter_number, r.content_hash, r.roster_hash, r.pairs
+    FROM jsonb_to_recordset(p_rows)
+         AS r(chapter_id UUID, chapter_number INTEGER, content_hash TEXT, roster_hash TEXT, pairs JSONB)
+    ON CONFLICT (chapter_id) DO UPDATE
+    SET chapter_number = EXCLUDED.chapter_number,
+        content_hash   = EXCLUDED.content_hash,
+        roster_hash    = EXCLUDED.roster_hash,
+        pairs          = EXCLUDED.pairs,
+        computed_at    = NOW();
+
+    RETURN TRUE;
+END;
+$$;
@@ -0,0 +1,65 @@
+-- ============================================================
+-- Migration 027: Only record reads of chapters that exist
+-- record_chapter_read trusted p_chapter_number: a read of chapter
+-- 2147483647 grew the bitmap to ~256 MB and bumped the counters, and a
+-- negative number failed in get_bit. It now returns NULL without touching
+-- reading_progress unless the chapter is published and not deleted.
+-- ============================================================
+
+-- ── Function: record_chapter_read ────────────────────────────
+-- As in migration 018, but NULL when (p_novel_id, p_chapter_number) is
+-- not a published, non-deleted chapter.
+
+CREATE OR REPLACE FUNCTION public.record_chapter_read(
+    p_user_id        UUID,
+    p_novel_id       UUID,
+    p_chapter_number INTEGER
+)
+RETURNS JSONB LANGUAGE plpgsql AS $$
+DECLARE
+    v_bitmap BYTEA;
+    v_is_new BOOLEAN;
+    v_row    public.reading_progress;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM public.chapters
+        WHERE novel_id = p_novel_id
+          AND chapter_number = p_chapter_number
+          AND status = 'published'
+          AND NOT is_deleted
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO public.reading_progress (user_id, novel_id)
+    VALUES (p_user_id, p_novel_id)
+    ON CONFLICT (user_id, novel_id) DO NOTHING;
+
+    SELECT chapters_read_bitmap INTO v_bitmap
+    FROM public.reading_progress
+    WHERE user_id = p_user_id AND novel_id = p_novel_id
+    FOR UPDATE;
+
+    v_is_new := p_chapter_number >= length(v_bitmap) * 8
+                OR get_bit(v_bitmap, p_chapter_number) = 0;
+
+    UPDATE public.reading_progress
+    SET chapters_read_bitmap = CASE WHEN v_is_new
+                                    THEN public.chapter_bitmap_set(v_bitmap, p_chapter_number)
+                                    ELSE chapters_read_bitmap END,
+        chapters_read_count  = chapters_read_count + v_is_new::INTEGER,
+        last_chapter_read    = GREATEST(last_chapter_read, p_chapter_number),
+        updated_at           = NOW()
+    WHERE user_id = p_user_id AND novel_id = p_novel_id
+    RETURNING * INTO v_row;
+
+    RETURN jsonb_build_object(
+        'user_id',             v_row.user_id,
+        'novel_id',            v_row.novel_id,
+        'last_chapter_read',   v_row.last_chapter_read,
+        'chapters_read_count', v_row.chapters_read_count,
+        'updated_at',          v_row.updated_at,
+        'is_new',              v_is_new
+    );
+END;
+$$;
@@ -0,0 +1,82 @@
+-- ============================================================
+-- Migration 028: Carry relationship pairs across roster changes
+-- Migration 026 made every chapter due again whenever the character
+-- roster changed. A chapter's co-occurrence counts can only change if its
+-- content mentions a name that was added or removed, so each roster a
+-- novel's rows were counted against is kept here, and
+-- adopt_relationship_roster moves rows that mention none of the changed
+-- names to the new roster without recounting them.
+-- ============================================================
+
+-- ── Table: relationship_rosters ──────────────────────────────
+
+CREATE TABLE public.relationship_rosters (
+    novel_id    UUID        NOT NULL REFERENCES public.novels(id) ON DELETE CASCADE,
+    roster_hash TEXT        NOT NULL,   -- md5 of the sorted names, as in chapter_relationship_pairs
+    names       TEXT[]      NOT NULL,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (novel_id, roster_hash)
+);
+
+ALTER TABLE public.relationship_rosters ENABLE ROW LEVEL SECURITY;
+
+-- ── Function: adopt_relationship_roster ──────────────────────
+-- Records p_names as the novel's current roster. Rows counted against an
+-- earlier recorded roster are moved to p_roster_hash when their content
+-- is unchanged and mentions none of the names that differ between the two
+-- rosters (a case-insensitive substring test, so it errs towards
+-- recounting). The remaining rows keep their old hash and are left to
+-- relationship_chapters_due. Rosters no row refers to any more are
+-- dropped. Returns the number of rows moved.
+
+CREATE OR REPLACE FUNCTION public.adopt_relationship_roster(
+    p_novel_id    UUID,
+    p_roster_hash TEXT,
+    p_names       TEXT[]
+)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_old   RECORD;
+    v_moved INTEGER := 0;
+    v_rows  INTEGER;
+BEGIN
+    INSERT INTO public.relationship_rosters (novel_id, roster_hash, names)
+    VALUES (p_novel_id, p_roster_hash, p_names)
+    ON CONFLICT (novel_id, roster_hash) DO NOTHING;
+
+    FOR v_old IN
+        SELECT r.roster_hash,
+               ARRAY(
+                   (SELECT lower(n) FROM unnest(r.names) AS n EXCEPT SELECT lower(n) FROM unnest(p_names) AS n)
+                   UNION
+                   (SELECT lower(n) FROM unnest(p_names) AS n EXCEPT SELECT lower(n) FROM unnest(r.names) AS n)
+               ) AS changed
+        FROM public.relationship_rosters r
+        WHERE r.novel_id = p_novel_id AND r.roster_hash <> p_roster_hash
+    LOOP
+        UPDATE public.chapter_relationship_pairs p
+        SET roster_hash = p_roster_hash
+        FROM public.chapters c
+        WHERE p.novel_id = p_novel_id
+          AND p.roster_hash = v_old.roster_hash
+          AND c.id = p.chapter_id
+          AND p.content_hash = md5(c.content)
+          AND NOT EXISTS (
+              SELECT 1 FROM unnest(v_old.changed) AS n
+              WHERE strpos(lower(c.content), n) > 0
+          );
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        v_moved := v_moved + v_rows;
+    END LOOP;
+
+    DELETE FROM public.relationship_rosters r
+    WHERE r.novel_id = p_novel_id
+      AND r.roster_hash <> p_roster_hash
+      AND NOT EXISTS (
+          SELECT 1 FROM public.chapter_relationship_pairs p
+          WHERE p.novel_id = p_novel_id AND p.roster_hash = r.roster_hash
+      );
+
+    RETURN v_moved;
+END;
+$$;
@@ -0,0 +1,16 @@
+-- ============================================================
+-- Migration 029: Backfill checkpoints start before chapter 0
+-- backfill_embeddings pages chapters with chapter_number greater than
+-- last_chapter_number, so the DEFAULT 0 from migration 024 skipped a
+-- chapter 0 (prologue). A run that has not written a page now starts at
+-- -1. Existing rows at 0 cannot have embedded chapter 0 and move too.
+-- ============================================================
+
+-- ── Table: embedding_backfills ───────────────────────────────
+
+ALTER TABLE public.embedding_backfills
+    ALTER COLUMN last_chapter_number SET DEFAULT -1;
+
+UPDATE public.embedding_backfills
+SET last_chapter_number = -1
+WHERE last_chapter_number = 0;
@@ -0,0 +1,68 @@
+-- ============================================================
+-- Migration 030: Retries respect the queued idempotency key
+-- A failed attempt was put back with status = 'queued' while it still
+-- held its idempotency_key. If the same key had been enqueued again while
+-- the job ran (compute_relationships:{novel_id} is re-enqueued by every
+-- publish), that UPDATE broke jobs_idempotency_idx and the job sat in
+-- 'running' until its lease expired.
+-- retry_job folds the failed attempt into the queued job instead: the
+-- queued job inherits last_error and the retried row is closed as failed.
+-- ============================================================
+
+-- ── Function: retry_job ──────────────────────────────────────
+-- Requeues p_job_id after a failed attempt by p_worker, or folds it into
+-- the queued job holding the same key. Returns the id of the job that
+-- will run next, or NULL when p_worker no longer holds the lease.
+-- Loops in case a job with the key is enqueued in between.
+
+CREATE OR REPLACE FUNCTION public.retry_job(
+    p_job_id        UUID,
+    p_worker        TEXT,
+    p_error         TEXT,
+    p_delay_seconds INTEGER
+)
+RETURNS UUID LANGUAGE plpgsql AS $$
+DECLARE
+    v_key    TEXT;
+    v_queued UUID;
+BEGIN
+    SELECT idempotency_key INTO v_key
+    FROM public.jobs
+    WHERE id = p_job_id AND locked_by = p_worker
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    LOOP
+        v_queued := NULL;
+        IF v_key IS NOT NULL THEN
+            UPDATE public.jobs
+            SET last_error = p_error
+            WHERE idempotency_key = v_key AND status = 'queued'
+            RETURNING id INTO v_queued;
+        END IF;
+
+        IF v_queued IS NOT NULL THEN
+            UPDATE public.jobs
+            SET status      = 'failed',
+                last_error  = p_error || ' (retry folded into job ' || v_queued || ')',
+                finished_at = NOW()
+            WHERE id = p_job_id;
+            RETURN v_queued;
+        END IF;
+
+        BEGIN
+            UPDATE public.jobs
+            SET status     = 'queued',
+                last_error = p_error,
+                run_after  = NOW() + make_interval(secs => p_delay_seconds)
+            WHERE id = p_job_id;
+            RETURN p_job_id;
+        EXCEPTION WHEN unique_violation THEN
+            -- enqueue_job inserted the key since we looked; fold into that job.
+        END;
+    END LOOP;
+END;
+$$;